@@ -115,7 +115,7 @@ def sidebar():
         <b>📦 品种库</b><br>
         {total} 个品种 / {groups} 组<br>
         支持分批扫描<br><br>
-        <b>💾 存储</b>: JSON 本地文件<br>
+        <b>💾 存储</b>: SQLite + JSON 本地文件<br>
         <b>📡 数据</b>: yfinance (免费)
         </div>
         """, unsafe_allow_html=True)
@@ -12,6 +12,7 @@ yfinance 交易所后缀对照：
   南非.JO     沙特.SR     以色列.TA 新西兰.NZ
   期货=F      外汇=X      加密-USD
 """
+from functools import lru_cache
 from typing import Dict, Tuple
 
 
@@ -39,23 +40,28 @@ _TV_MAP: Dict[str, str] = {
     "XRP-USD":"BINANCE:XRPUSDT",
 }
 
+# yfinance 后缀 → TradingView 交易所
+_TV_EXCH: Dict[str, str] = {
+    ".SS":"SSE",".SZ":"SZSE",".HK":"HKEX",".L":"LSE",".DE":"XETRA",
+    ".PA":"EURONEXT",".MI":"MIL",".MC":"BME",".SW":"SIX",".AS":"EURONEXT",
+    ".ST":"NASDAQ",".CO":"NASDAQ",".OL":"OSE",".HE":"NASDAQ",
+    ".T":"TSE",".KS":"KRX",".TW":"TWSE",".NS":"NSE",".BO":"BSE",
+    ".AX":"ASX",".SI":"SGX",".KL":"MYX",".BK":"SET",".JK":"IDX",
+    ".PS":"PSE",".TO":"TSX",".SA":"BMFBOVESPA",".MX":"BMV",
+    ".JO":"JSE",".SR":"TADAWUL",".TA":"TASE",".NZ":"NZX",
+}
+
+@lru_cache(maxsize=16384)
 def tv_symbol(ticker: str) -> str:
     if ticker in _TV_MAP:
         return _TV_MAP[ticker]
-    exch = {
-        ".SS":"SSE",".SZ":"SZSE",".HK":"HKEX",".L":"LSE",".DE":"XETRA",
-        ".PA":"EURONEXT",".MI":"MIL",".MC":"BME",".SW":"SIX",".AS":"EURONEXT",
-        ".ST":"NASDAQ",".CO":"NASDAQ",".OL":"OSE",".HE":"NASDAQ",
-        ".T":"TSE",".KS":"KRX",".TW":"TWSE",".NS":"NSE",".BO":"BSE",
-        ".AX":"ASX",".SI":"SGX",".KL":"MYX",".BK":"SET",".JK":"IDX",
-        ".PS":"PSE",".TO":"TSX",".SA":"BMFBOVESPA",".MX":"BMV",
-        ".JO":"JSE",".SR":"TADAWUL",".TA":"TASE",".NZ":"NZX",
-    }
-    for sfx, ex in exch.items():
-        if ticker.endswith(sfx):
-            return f"{ex}:{ticker[:ticker.rfind(sfx)]}"
+    base, dot, sfx = ticker.rpartition(".")
+    ex = _TV_EXCH.get(dot + sfx) if dot else None
+    if ex:
+        return f"{ex}:{base}"
     return ticker.replace("=X","").replace("-USD","").replace("=F","").replace("^","")
 
+@lru_cache(maxsize=16384)
 def tv_url(ticker: str) -> str:
     return f"https://www.tradingview.com/chart/?symbol={tv_symbol(ticker)}"
 
@@ -901,6 +907,17 @@ TIMEFRAMES: Dict[str, Tuple[str, str]] = {
     "Monthly": ("1mo", "10y"),
 }
 
+# 日内框架（yfinance；4H 由 1h 本地重采样），通过 cfg["timeframes"] 启用
+# period 只需覆盖 lookback=100 根的最大框架：4H ≈ 50 个交易日的 1h 数据
+INTRADAY_TIMEFRAMES: Dict[str, Tuple[str, str]] = {
+    "15m": ("15m", "30d"),
+    "1H":  ("1h",  "180d"),
+    "4H":  ("4h",  "180d"),
+}
+
+# 全部可选框架（框架名 → (interval, period)）
+TIMEFRAME_SPECS: Dict[str, Tuple[str, str]] = {**INTRADAY_TIMEFRAMES, **TIMEFRAMES}
+
 GROUP_NAMES = list(ASSET_GROUPS.keys())
 
 # 类别标签中文映射
@@ -0,0 +1,257 @@
+"""
+bar_cache.py — 本地 K 线缓存（增量追加）
+文件：
+  data_bars/<ticker>__<interval>.parquet       — OHLC 序列
+  data_bars/<ticker>__<interval>.parquet.json  — 元数据 {span, fetched_at}
+
+规则：
+  • 有效期内（按周期 TTL）直接读本地，不发网络请求
+  • 过期后只请求最后 _OVERLAP 根 K 线之后的数据并追加
+  • 重叠区收盘价不一致 → 说明发生了前复权回溯调整 → 整段重新下载
+  • 日内序列（span 以天计，如 "180d"）只保留最近 span 天，文件大小不随追加增长
+  • put_last_bar：用全市场行情（spot）直接改写 / 追加当日日线，并视为刚拉取
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+import urllib.parse
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+_BASE  = os.path.dirname(os.path.abspath(__file__))
+D_BARS = os.path.join(_BASE, "data_bars")
+
+# 各周期默认有效期（秒），可被 cfg["bar_cache_ttl"] 覆盖
+DEFAULT_TTL: Dict[str, int] = {
+    "1d":  4 * 3600,
+    "1wk": 12 * 3600,
+    "1mo": 24 * 3600,
+    "1h":  20 * 60,
+    "15m": 5 * 60,
+}
+
+_OVERLAP = 5      # 增量更新时回补的 K 线数（最后一根可能是未收盘K线）
+_ADJ_TOL = 1e-4   # 重叠区收盘价相对误差容忍度
+
+
+def _span_days(span: Optional[str]) -> int:
+    """回溯窗口天数："2y" → 730，"180d" → 180；无法识别返回 0。"""
+    s = (span or "").strip().lower()
+    try:
+        if s.endswith("y"):
+            return int(s[:-1]) * 365
+        if s.endswith("d"):
+            return int(s[:-1])
+    except ValueError:
+        pass
+    return 0
+
+
+# ── 路径 ─────────────────────────────────────────────────────────────
+def _path(ticker: str, interval: str, ext: str = ".parquet") -> str:
+    safe = urllib.parse.quote(ticker.strip().upper(), safe="")
+    return os.path.join(D_BARS, f"{safe}__{interval}{ext}")
+
+
+def sidecar_path(ticker: str, interval: str, ext: str) -> str:
+    """与 K 线文件同目录、同命名规则的附属文件路径（如 swing_state）。"""
+    return _path(ticker, interval, ext)
+
+
+def _load_meta(path: str) -> Dict:
+    try:
+        with open(path + ".json", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def _write_atomic(path: str, write) -> None:
+    # 临时文件名含线程号：同一进程内多个线程（日内循环与全量扫描等）可能同时写同一序列
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    write(tmp)
+    os.replace(tmp, path)
+
+
+# ── 读写 ─────────────────────────────────────────────────────────────
+def load(ticker: str, interval: str) -> Optional[pd.DataFrame]:
+    path = _path(ticker, interval)
+    try:
+        if os.path.exists(path):
+            df = pd.read_parquet(path)
+            return df if not df.empty else None
+    except Exception:
+        pass
+    return None
+
+
+def save(ticker: str, interval: str, df: pd.DataFrame,
+         span: Optional[str] = None) -> bool:
+    path = _path(ticker, interval)
+    try:
+        os.makedirs(D_BARS, exist_ok=True)
+        out = df[["Open", "High", "Low", "Close"]].astype("float64")
+        out.index = pd.DatetimeIndex(out.index, name="Date")
+        if span and span.lower().endswith("d") and len(out):
+            out = out[out.index >= out.index[-1] - pd.Timedelta(days=_span_days(span))]
+        _write_atomic(path, out.to_parquet)
+
+        meta = _load_meta(path)
+        if span and _span_days(span) >= _span_days(meta.get("span")):
+            meta["span"] = span
+        meta["fetched_at"] = time.time()
+
+        def _dump(p):
+            with open(p, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+        _write_atomic(path + ".json", _dump)
+        return True
+    except Exception:
+        return False
+
+
+def put_last_bar(ticker: str, interval: str, day,
+                 bar: Tuple[float, float, float, float],
+                 prev_close: Optional[float]) -> bool:
+    """
+    用行情快照 (Open, High, Low, Close) 更新 day 当日的 K 线（仅日线序列）：
+      • 缓存最后一根就是 day → 改写
+      • 缓存最后一根是 day 的上一个工作日 → 追加
+      • 其余情况（缓存落后多日、节假日行情与最后一根相同）→ 不动，返回 False
+    prev_close 为行情中的昨收，须与缓存中 day 前一根的收盘价一致（误差 _ADJ_TOL）；
+    不一致说明除权除息后前复权历史已变，标记过期交给 fetch_data 整段重新下载。
+    成功后视为刚拉取，有效期内 fetch_data 不再请求该序列。
+    """
+    if prev_close is None or not prev_close > 0:
+        return False                     # 无昨收无法校验复权，不更新
+    df = load(ticker, interval)
+    if df is None:
+        return False
+    try:
+        idx = df.index
+        last = idx[-1].tz_localize(None) if idx.tz is not None else idx[-1]
+        last, day = last.normalize(), pd.Timestamp(day).normalize()
+        row = [float(x) for x in bar]
+        if last == day:
+            if len(df) < 2:
+                return False
+            ref = float(df["Close"].iloc[-2])
+        elif last < day and np.busday_count(last.date(), day.date()) == 1:
+            ref = float(df["Close"].iloc[-1])
+        else:
+            return False
+        if abs(ref - prev_close) > _ADJ_TOL * abs(ref):
+            expire(ticker, interval)
+            return False
+        if last == day:
+            df = df.copy()
+            df.iloc[-1, [df.columns.get_loc(c) for c in ("Open", "High", "Low", "Close")]] = row
+        else:
+            prev = df.iloc[-1][["Open", "High", "Low", "Close"]].astype("float64").to_numpy()
+            if np.allclose(prev, row, rtol=_ADJ_TOL):
+                return False
+            ts = day.tz_localize(idx.tz) if idx.tz is not None else day
+            new = pd.DataFrame([row], index=pd.DatetimeIndex([ts]),
+                               columns=["Open", "High", "Low", "Close"])
+            df = pd.concat([df[["Open", "High", "Low", "Close"]], new])
+        return save(ticker, interval, df)
+    except Exception:
+        return False
+
+
+def tickers(interval: str) -> List[str]:
+    """已缓存指定周期序列的全部品种。"""
+    if not os.path.isdir(D_BARS):
+        return []
+    suffix = f"__{interval}.parquet"
+    return [urllib.parse.unquote(e.name[:-len(suffix)])
+            for e in os.scandir(D_BARS) if e.name.endswith(suffix)]
+
+
+# ── 有效期 / 覆盖范围 ────────────────────────────────────────────────
+def ttl_for(interval: str, cfg: Optional[Dict] = None) -> int:
+    ttl = {**DEFAULT_TTL, **((cfg or {}).get("bar_cache_ttl") or {})}
+    return int(ttl.get(interval, DEFAULT_TTL["1d"]))
+
+
+def age(ticker: str, interval: str) -> Optional[float]:
+    """距上次成功拉取的秒数；无缓存返回 None。"""
+    fetched = _load_meta(_path(ticker, interval)).get("fetched_at")
+    return time.time() - float(fetched) if fetched else None
+
+
+def is_fresh(ticker: str, interval: str, cfg: Optional[Dict] = None) -> bool:
+    a = age(ticker, interval)
+    return a is not None and a < ttl_for(interval, cfg)
+
+
+def expire(ticker: str, interval: str) -> bool:
+    """标记缓存过期：下次 fetch_data 做一次增量更新（已知缓存落后时使用）。"""
+    path = _path(ticker, interval)
+    meta = _load_meta(path)
+    if not meta.get("fetched_at"):
+        return False
+    meta["fetched_at"] = 0
+
+    def _dump(p):
+        with open(p, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+    try:
+        _write_atomic(path + ".json", _dump)
+        return True
+    except Exception:
+        return False
+
+
+def covers(ticker: str, interval: str, span: Optional[str]) -> bool:
+    """缓存是否按不短于 span 的回溯窗口拉取过。"""
+    cached = _load_meta(_path(ticker, interval)).get("span", "")
+    return _span_days(cached) >= _span_days(span)
+
+
+def overlap_start(cached: pd.DataFrame) -> pd.Timestamp:
+    """增量请求的起始日期（回补最后 _OVERLAP 根 K 线）。"""
+    return cached.index[max(0, len(cached) - _OVERLAP)]
+
+
+def merge(cached: pd.DataFrame, fresh: pd.DataFrame) -> Optional[pd.DataFrame]:
+    """
+    将增量数据追加到缓存。重叠区（不含缓存最后一根未收盘 K 线）收盘价
+    不一致时返回 None，调用方应整段重新下载。
+    """
+    common = cached.index[:-1].intersection(fresh.index)
+    if len(common) == 0:
+        return None
+    old = cached.loc[common, "Close"].astype("float64")
+    new = fresh.loc[common, "Close"].astype("float64")
+    rel = ((old - new).abs() / old.abs().clip(lower=1e-12)).max()
+    if rel > _ADJ_TOL:
+        return None
+    merged = pd.concat([cached[cached.index < fresh.index[0]], fresh])
+    merged = merged[~merged.index.duplicated(keep="last")].sort_index()
+    return merged
+
+
+# ── 统计 / 清理 ──────────────────────────────────────────────────────
+def stats() -> Dict:
+    files, size = 0, 0
+    if os.path.isdir(D_BARS):
+        for entry in os.scandir(D_BARS):
+            if entry.name.endswith(".parquet"):
+                files += 1
+            size += entry.stat().st_size
+    return {"series": files, "kb": size // 1024}
+
+
+def clear() -> bool:
+    try:
+        if os.path.isdir(D_BARS):
+            shutil.rmtree(D_BARS)
+        return True
+    except Exception:
+        return False
@@ -0,0 +1,313 @@
+"""
+datasource.py — 数据源访问层（限流 / 并发上限 / 退避重试）
+================================================================
+所有对外网络请求都经过 call(provider, fn, ...)：
+
+  provider     对应主机               默认限流
+  ──────────  ─────────────────────  ─────────────────────────
+  akshare      东方财富 Eastmoney     5 次/秒，突发 10，并发 4
+  yfinance     Yahoo Finance          10 次/秒，突发 20，并发 8
+  twelvedata   api.twelvedata.com     8 次/分钟，突发 8，并发 2
+
+  • 令牌桶限流：每个 provider 独立，线程安全
+  • 并发上限：同一 provider 同时在途请求数
+  • 429 / 连接错误：指数退避 + 随机抖动后重试
+  • 熔断：按 provider 统计滚动成功率 / 延迟，连续失败或失败率过高时
+    在冷却期内直接抛出 SourceUnavailable（不再等待超时），冷却结束后
+    放行一次探测请求，成功即恢复；route_order() 据此调整回退顺序
+
+扫描引擎在各数据源线程池中同步调用 call()，并发由线程池 + 并发上限控制。
+================================================================
+"""
+
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMITS: Dict[str, Dict[str, float]] = {
+    "akshare":    {"rate": 5.0,      "burst": 10, "concurrency": 4},
+    "yfinance":   {"rate": 10.0,     "burst": 20, "concurrency": 8},
+    "twelvedata": {"rate": 8 / 60.0, "burst": 8,  "concurrency": 2},
+}
+
+_BACKOFF_BASE = 1.0    # 秒
+_BACKOFF_MAX  = 30.0
+
+
+class RateLimited(Exception):
+    """数据源返回 429 / 限流信号时抛出，触发退避重试。"""
+
+
+class SourceUnavailable(Exception):
+    """数据源处于熔断冷却期，调用被直接拒绝。"""
+
+
+# 熔断默认参数，可被 cfg["breaker"] 覆盖
+DEFAULT_BREAKER: Dict[str, float] = {
+    "window":       50,     # 滚动窗口（最近 N 次调用）
+    "min_calls":    10,     # 窗口内至少这么多次调用才按失败率判断
+    "fail_rate":    0.5,    # 失败率阈值
+    "consecutive":  5,      # 连续失败次数阈值
+    "cooldown":     60,     # 首次冷却秒数，连续熔断时翻倍
+    "max_cooldown": 600,
+}
+
+
+# ════════════════════════════════════════════════════════════════════
+# 令牌桶
+# ════════════════════════════════════════════════════════════════════
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate   = max(float(rate), 1e-6)
+        self.burst  = max(float(burst), 1.0)
+        self._tokens = self.burst
+        self._ts     = time.monotonic()
+        self._lock   = threading.Lock()
+
+    def _reserve(self) -> float:
+        """取一个令牌，返回需要等待的秒数（令牌可透支，等待期内归还）。"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._ts) * self.rate)
+            self._ts = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self) -> None:
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+
+class _Provider:
+    def __init__(self, rate: float, burst: float, concurrency: int):
+        self.bucket = TokenBucket(rate, burst)
+        self.slots  = threading.BoundedSemaphore(max(1, int(concurrency)))
+
+
+_providers: Dict[str, _Provider] = {}
+_retries    = 3
+_cfg_lock   = threading.Lock()
+_applied: Optional[Dict] = None
+
+
+def configure(cfg: Optional[Dict] = None) -> None:
+    """按 cfg["rate_limits"] / cfg["fetch_retries"] 重建限流器（配置不变则跳过）。"""
+    global _retries, _applied
+    cfg    = cfg or {}
+    limits = {p: {**DEFAULT_LIMITS.get(p, {}), **v}
+              for p, v in {**DEFAULT_LIMITS, **(cfg.get("rate_limits") or {})}.items()}
+    wanted = {"limits": limits, "retries": int(cfg.get("fetch_retries", 3))}
+    _breaker.update({**DEFAULT_BREAKER, **(cfg.get("breaker") or {})})
+    with _cfg_lock:
+        if wanted == _applied:
+            return
+        _providers.clear()
+        for name, lim in limits.items():
+            _providers[name] = _Provider(lim.get("rate", 5.0), lim.get("burst", 10),
+                                         lim.get("concurrency", 4))
+        _retries = wanted["retries"]
+        _applied = wanted
+
+
+def _provider(name: str) -> _Provider:
+    if not _providers:
+        configure(None)
+    with _cfg_lock:
+        p = _providers.get(name)
+        if p is None:
+            lim = DEFAULT_LIMITS.get(name, DEFAULT_LIMITS["yfinance"])
+            p = _providers[name] = _Provider(lim["rate"], lim["burst"],
+                                             lim["concurrency"])
+        return p
+
+
+# ════════════════════════════════════════════════════════════════════
+# 健康统计 / 熔断
+# ════════════════════════════════════════════════════════════════════
+class _Health:
+    def __init__(self, window: int):
+        self.calls      = deque(maxlen=max(1, int(window)))   # (ok, latency)
+        self.consec     = 0
+        self.open_until = 0.0
+        self.cooldown   = 0.0
+        self.probing    = False
+        self.trips      = 0
+        self.last_error = ""
+        self.lock       = threading.Lock()
+
+
+_breaker: Dict[str, float] = dict(DEFAULT_BREAKER)
+_health: Dict[str, _Health] = {}
+_health_lock = threading.Lock()
+
+
+def _get_health(name: str) -> _Health:
+    h = _health.get(name)
+    if h is None:
+        with _health_lock:
+            h = _health.setdefault(name, _Health(_breaker["window"]))
+    return h
+
+
+def _allow(name: str) -> bool:
+    """熔断打开期间拒绝；冷却结束后只放行一个探测请求（半开）。"""
+    h = _get_health(name)
+    with h.lock:
+        if h.open_until == 0.0:
+            return True
+        if time.monotonic() < h.open_until or h.probing:
+            return False
+        h.probing = True
+        return True
+
+
+def _record(name: str, ok: bool, latency: float, err: str = "") -> None:
+    h = _get_health(name)
+    with h.lock:
+        h.calls.append((ok, latency))
+        if ok:
+            h.consec = 0
+            if h.open_until:
+                h.open_until, h.cooldown, h.probing = 0.0, 0.0, False
+            return
+        h.consec += 1
+        h.last_error = err[:200]
+        fails = sum(1 for c in h.calls if not c[0])
+        tripped = (h.probing
+                   or h.consec >= _breaker["consecutive"]
+                   or (len(h.calls) >= _breaker["min_calls"]
+                       and fails / len(h.calls) >= _breaker["fail_rate"]))
+        if tripped:
+            h.cooldown = min(_breaker["max_cooldown"],
+                             h.cooldown * 2 if h.cooldown else _breaker["cooldown"])
+            h.open_until = time.monotonic() + h.cooldown
+            h.probing = False
+            h.trips += 1
+            logger.warning(f"{name} 熔断 {h.cooldown:.0f}s：{h.last_error}")
+
+
+def _is_outage(e: Exception) -> bool:
+    """计入熔断的错误：网络 / 超时 / 限流 / 服务端返回非数据内容。"""
+    if _retryable(e):
+        return True
+    name = type(e).__name__
+    return name in ("SSLError", "ProxyError", "ChunkedEncodingError",
+                    "JSONDecodeError", "HTTPError", "TimeoutError",
+                    "ConnectionResetError", "ConnectionRefusedError")
+
+
+def is_outage(e: Exception) -> bool:
+    """来源故障（熔断中 / 网络 / 超时 / 限流），区别于接口明确报错或无数据。"""
+    return isinstance(e, SourceUnavailable) or _is_outage(e)
+
+
+def available(name: str) -> bool:
+    """provider 当前是否可用（未处于熔断冷却期）。"""
+    h = _get_health(name)
+    return h.open_until == 0.0 or time.monotonic() >= h.open_until
+
+
+def route_order(names: List[str]) -> List[str]:
+    """
+    按健康状况稳定排序：正常 → 降级（近期成功率 < 80%）→ 熔断中。
+    同一档内保持原有优先级。
+    """
+    def _rank(n: str) -> int:
+        if not available(n):
+            return 2
+        h = _get_health(n)
+        calls = list(h.calls)
+        if len(calls) >= _breaker["min_calls"]:
+            if sum(1 for c in calls if c[0]) / len(calls) < 0.8:
+                return 1
+        return 0
+    return sorted(names, key=_rank)
+
+
+def health_stats() -> Dict[str, Dict[str, Any]]:
+    """各 provider 的滚动统计，供设置页展示。"""
+    out = {}
+    now = time.monotonic()
+    for name in sorted(set(DEFAULT_LIMITS) | set(_health)):
+        h = _get_health(name)
+        with h.lock:
+            calls = list(h.calls)
+            lat = sorted(c[1] for c in calls if c[0])
+            state = ("open" if h.open_until and now < h.open_until else
+                     "half-open" if h.open_until else "closed")
+            out[name] = {
+                "state":        state,
+                "calls":        len(calls),
+                "success_rate": (sum(1 for c in calls if c[0]) / len(calls)) if calls else None,
+                "p50_ms":       int(lat[len(lat) // 2] * 1000) if lat else None,
+                "p95_ms":       int(lat[min(len(lat) - 1, int(len(lat) * 0.95))] * 1000) if lat else None,
+                "trips":        h.trips,
+                "retry_in_s":   max(0, int(h.open_until - now)) if state == "open" else 0,
+                "last_error":   h.last_error,
+            }
+    return out
+
+
+def reset_health(name: Optional[str] = None) -> None:
+    with _health_lock:
+        if name:
+            _health.pop(name, None)
+        else:
+            _health.clear()
+
+
+# ════════════════════════════════════════════════════════════════════
+# 重试判定
+# ════════════════════════════════════════════════════════════════════
+def _retryable(e: Exception) -> bool:
+    if isinstance(e, RateLimited):
+        return True
+    name = type(e).__name__
+    if "RateLimit" in name or name in ("ConnectionError", "Timeout",
+                                       "ReadTimeout", "ConnectTimeout",
+                                       "RemoteDisconnected"):
+        return True
+    msg = str(e)
+    return "429" in msg or "Too Many Requests" in msg
+
+
+def _backoff(attempt: int) -> float:
+    delay = min(_BACKOFF_MAX, _BACKOFF_BASE * (2 ** attempt))
+    return delay * random.uniform(0.5, 1.5)
+
+
+# ════════════════════════════════════════════════════════════════════
+# 同步调用
+# ════════════════════════════════════════════════════════════════════
+def call(provider: str, fn: Callable, *args, **kwargs) -> Any:
+    """
+    在 provider 的限流 / 并发约束下执行 fn(*args, **kwargs)。
+    可重试错误按抖动指数退避重试，其他异常原样抛出。
+    """
+    p = _provider(provider)
+    attempt = 0
+    while True:
+        if not _allow(provider):
+            raise SourceUnavailable(f"{provider} 熔断中")
+        p.bucket.acquire()
+        with p.slots:
+            t0 = time.monotonic()
+            try:
+                result = fn(*args, **kwargs)
+                _record(provider, True, time.monotonic() - t0)
+                return result
+            except Exception as e:
+                _record(provider, not _is_outage(e), time.monotonic() - t0, repr(e))
+                if not _retryable(e) or attempt >= _retries:
+                    raise
+                err = e
+        delay = _backoff(attempt)
+        logger.info(f"{provider} 限流/网络错误，{delay:.1f}s 后重试: {err}")
+        time.sleep(delay)
+        attempt += 1
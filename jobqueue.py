@@ -0,0 +1,333 @@
+"""
+jobqueue.py — 本地任务队列（SQLite，无需外部消息中间件）
+文件：
+  data_jobs.db  — work_units 表：一个扫描会话拆成多个工作单元
+
+流程：
+  协调者  submit()      创建会话（storage.begin_session）并拆分工作单元
+          wait()        轮询进度，全部完成后汇总计数并结束会话
+  worker  run_worker()  循环 claim() 领取单元 → scanner.scan_unit() → complete()
+
+租约：
+  • claim() 在事务中把单元标记为 leased，并写入 lease_owner / lease_expires
+  • worker 扫描过程中定期 renew() 续约；续约失败（已被他人接管）立即放弃该单元
+  • worker 进程/主机宕机 → 租约过期 → 其他 worker 重新领取
+  • 单元失败超过 max_attempts 次、或租约过期时已领取 max_attempts 次
+    （worker 进程反复崩溃）标记为 failed，会话保持 running；
+    队列会话没有检查点（会话行带 queue 标记，不出现在续扫列表中），
+    恢复方式是 requeue_failed() 后重新运行 worker，只重扫失败的单元
+  • worker 每次写库前强制续约一次，租约已被接管时不再写入
+
+多主机部署时各主机需共享同一目录（data_jobs.db / data_scanner.db / data_history/）。
+"""
+
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+
+import storage
+
+logger = logging.getLogger(__name__)
+
+_BASE  = os.path.dirname(os.path.abspath(__file__))
+F_JOBS = os.environ.get("STRX_JOBS_DB") or os.path.join(_BASE, "data_jobs.db")
+
+DEFAULT_LEASE_S  = 300     # 租约时长（秒）
+DEFAULT_UNIT     = 100     # 每个工作单元的品种数
+MAX_ATTEMPTS     = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS work_units (
+    unit_id       TEXT PRIMARY KEY,
+    session_id    TEXT    NOT NULL,
+    seq           INTEGER NOT NULL,
+    tickers       TEXT    NOT NULL,
+    status        TEXT    NOT NULL DEFAULT 'pending',
+    lease_owner   TEXT,
+    lease_expires REAL,
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    result        TEXT,
+    error         TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_units_claim ON work_units(status, lease_expires);
+CREATE INDEX IF NOT EXISTS ix_units_session ON work_units(session_id);
+"""
+
+_tls = threading.local()
+
+
+def _db() -> sqlite3.Connection:
+    conn = getattr(_tls, "conn", None)
+    if conn is not None and getattr(_tls, "path", None) == F_JOBS:
+        return conn
+    conn = sqlite3.connect(F_JOBS, timeout=30, isolation_level=None,
+                           check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    _tls.conn, _tls.path = conn, F_JOBS
+    return conn
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:4]}"
+
+
+def split_units(assets: Dict, unit_size: int = DEFAULT_UNIT) -> List[List[str]]:
+    tickers = list(assets)
+    n = max(1, int(unit_size))
+    return [tickers[i:i + n] for i in range(0, len(tickers), n)]
+
+
+# ════════════════════════════════════════════════════════════════════
+# 协调者
+# ════════════════════════════════════════════════════════════════════
+def submit(assets:    Dict,
+           cfg:       Optional[Dict] = None,
+           note:      str            = "queue",
+           units:     Optional[List[List[str]]] = None,
+           unit_size: int            = DEFAULT_UNIT) -> Optional[str]:
+    """创建会话并写入工作单元，返回 session_id；失败返回 None。"""
+    from scanner import new_session
+
+    cfg = cfg or storage.load_config()
+    units = [u for u in (units or split_units(assets, unit_size)) if u]
+    session_row, params = new_session(assets, cfg, note)
+    session_row.update({"units": len(units), "queue": True})
+    if not storage.begin_session(session_row, params):
+        return None
+    sid = session_row["session_id"]
+    try:
+        conn = _db()
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany(
+            "INSERT INTO work_units (unit_id, session_id, seq, tickers) "
+            "VALUES (?, ?, ?, ?)",
+            [(f"{sid}:{i}", sid, i, json.dumps(u)) for i, u in enumerate(units)])
+        conn.execute("COMMIT")
+        return sid
+    except Exception as e:
+        logger.warning(f"jobqueue.submit: {e}")
+        try: _db().execute("ROLLBACK")
+        except Exception: pass
+        return None
+
+
+def progress(session_id: str) -> Dict:
+    """{pending, leased, done, failed, total, totals{total_checks, inzone_count, triple_conf}}"""
+    out = {"pending": 0, "leased": 0, "done": 0, "failed": 0, "total": 0,
+           "totals": {"total_checks": 0, "inzone_count": 0, "triple_conf": 0}}
+    try:
+        rows = _db().execute(
+            "SELECT status, result FROM work_units WHERE session_id = ?",
+            (session_id,)).fetchall()
+    except Exception:
+        return out
+    for status, result in rows:
+        out[status] = out.get(status, 0) + 1
+        out["total"] += 1
+        if status == "done" and result:
+            r = json.loads(result)
+            for k in out["totals"]:
+                out["totals"][k] += int(r.get(k, 0))
+            for k in ("changed", "events"):          # 增量模式会话
+                if k in r:
+                    out["totals"][k] = out["totals"].get(k, 0) + int(r[k])
+    return out
+
+
+def wait(session_id:        str,
+         poll_s:            float              = 5.0,
+         timeout_s:         Optional[float]    = None,
+         progress_callback: Optional[Callable] = None) -> Dict:
+    """
+    等待所有单元结束。全部 done → 汇总计数并结束会话；
+    存在 failed 单元 → 会话保持 running，需 requeue_failed 后重新运行 worker
+    （队列会话不保存检查点，不能用 scanner.resume_scan 续扫）。
+    """
+    t0 = time.time()
+    while True:
+        p = progress(session_id)
+        finished = p["done"] + p["failed"]
+        if progress_callback and p["total"]:
+            progress_callback(finished / p["total"],
+                              f"📦 工作单元 {p['done']}/{p['total']} 完成"
+                              f"（进行中 {p['leased']}，失败 {p['failed']}）")
+        if p["total"] and finished >= p["total"]:
+            break
+        if timeout_s is not None and time.time() - t0 > timeout_s:
+            return p
+        time.sleep(poll_s)
+
+    if p["failed"] == 0:
+        ckpt = storage.load_checkpoint(session_id)
+        if ckpt is not None:
+            session_row = {**ckpt["session"], **p["totals"],
+                           "duration_ms": int((time.time() - t0) * 1000)}
+            storage.finish_session(session_row)
+    return p
+
+
+def requeue_failed(session_id: str) -> int:
+    """把 failed 单元重置为 pending，返回数量。"""
+    try:
+        cur = _db().execute(
+            "UPDATE work_units SET status = 'pending', attempts = 0, error = NULL, "
+            "lease_owner = NULL, lease_expires = NULL "
+            "WHERE session_id = ? AND status = 'failed'", (session_id,))
+        return cur.rowcount
+    except Exception:
+        return 0
+
+
+# ════════════════════════════════════════════════════════════════════
+# Worker
+# ════════════════════════════════════════════════════════════════════
+def claim(worker_id:    str,
+          lease_s:      float         = DEFAULT_LEASE_S,
+          session_id:   Optional[str] = None,
+          max_attempts: int           = MAX_ATTEMPTS) -> Optional[Dict]:
+    """
+    领取一个待处理或租约已过期的单元；没有可领取的返回 None。
+    租约过期且已领取 max_attempts 次的单元（worker 反复崩溃）在同一事务中
+    标记为 failed，不再重新分配。
+    """
+    now  = time.time()
+    conn = _db()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        scope, scope_args = "", []
+        if session_id:
+            scope, scope_args = " AND session_id = ?", [session_id]
+        conn.execute(
+            "UPDATE work_units SET status = 'failed', error = ?, "
+            "lease_owner = NULL, lease_expires = NULL "
+            "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?" + scope,
+            [f"租约过期 {max_attempts} 次（worker 异常退出）", now, max_attempts]
+            + scope_args)
+        sql = ("SELECT unit_id, session_id, tickers, attempts FROM work_units "
+               "WHERE (status = 'pending' OR "
+               "(status = 'leased' AND lease_expires < ? AND attempts < ?))" + scope)
+        args: list = [now, max_attempts] + scope_args
+        row = conn.execute(sql + " ORDER BY session_id, seq LIMIT 1", args).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        unit_id, sid, tickers, attempts = row
+        conn.execute(
+            "UPDATE work_units SET status = 'leased', lease_owner = ?, "
+            "lease_expires = ?, attempts = attempts + 1 WHERE unit_id = ?",
+            (worker_id, now + lease_s, unit_id))
+        conn.execute("COMMIT")
+        return {"unit_id": unit_id, "session_id": sid,
+                "tickers": json.loads(tickers), "attempts": attempts + 1}
+    except Exception as e:
+        logger.debug(f"jobqueue.claim: {e}")
+        try: conn.execute("ROLLBACK")
+        except Exception: pass
+        return None
+
+
+def renew(unit_id: str, worker_id: str, lease_s: float = DEFAULT_LEASE_S) -> bool:
+    """续约；单元已被他人接管或已结束时返回 False。"""
+    try:
+        cur = _db().execute(
+            "UPDATE work_units SET lease_expires = ? "
+            "WHERE unit_id = ? AND lease_owner = ? AND status = 'leased'",
+            (time.time() + lease_s, unit_id, worker_id))
+        return cur.rowcount == 1
+    except Exception:
+        return True   # 数据库暂时繁忙不视为丢失租约
+
+
+def complete(unit_id: str, worker_id: str, summary: Dict) -> bool:
+    try:
+        cur = _db().execute(
+            "UPDATE work_units SET status = 'done', result = ?, lease_expires = NULL "
+            "WHERE unit_id = ? AND lease_owner = ? AND status = 'leased'",
+            (json.dumps(summary), unit_id, worker_id))
+        return cur.rowcount == 1
+    except Exception:
+        return False
+
+
+def fail(unit_id: str, worker_id: str, error: str,
+         max_attempts: int = MAX_ATTEMPTS) -> None:
+    """释放单元：未超过重试次数回到 pending，否则标记 failed。"""
+    try:
+        _db().execute(
+            "UPDATE work_units SET status = CASE WHEN attempts >= ? "
+            "THEN 'failed' ELSE 'pending' END, error = ?, "
+            "lease_owner = NULL, lease_expires = NULL "
+            "WHERE unit_id = ? AND lease_owner = ? AND status = 'leased'",
+            (max_attempts, error, unit_id, worker_id))
+    except Exception as e:
+        logger.debug(f"jobqueue.fail: {e}")
+
+
+def run_worker(worker_id:       Optional[str]  = None,
+               cfg:             Optional[Dict] = None,
+               session_id:      Optional[str]  = None,
+               lease_s:         float          = DEFAULT_LEASE_S,
+               poll_s:          float          = 5.0,
+               exit_when_empty: bool           = True) -> int:
+    """
+    worker 主循环，返回处理完成的单元数。
+    exit_when_empty=False 时常驻等待新单元。
+    """
+    from scanner import scan_unit
+
+    worker_id = worker_id or default_worker_id()
+    cfg = cfg or storage.load_config()
+    handled = 0
+    while True:
+        unit = claim(worker_id, lease_s, session_id)
+        if unit is None:
+            if exit_when_empty:
+                return handled
+            time.sleep(poll_s)
+            continue
+
+        uid = unit["unit_id"]
+        logger.info(f"[{worker_id}] 领取 {uid}（{len(unit['tickers'])} 品种，"
+                    f"第 {unit['attempts']} 次）")
+        last_renew = time.monotonic()
+
+        def _heartbeat(force: bool = False) -> bool:
+            nonlocal last_renew
+            if not force and time.monotonic() - last_renew < lease_s / 3:
+                return True
+            last_renew = time.monotonic()
+            return renew(uid, worker_id, lease_s)
+
+        try:
+            summary, err = scan_unit(unit["session_id"], unit["tickers"],
+                                     cfg=cfg, heartbeat=_heartbeat)
+        except Exception as e:
+            summary, err = None, str(e)
+
+        if err:
+            logger.warning(f"[{worker_id}] {uid} 失败: {err}")
+            fail(uid, worker_id, err)
+            continue
+        if complete(uid, worker_id, summary):
+            handled += 1
+        else:
+            logger.warning(f"[{worker_id}] {uid} 租约已被接管，结果由新 worker 覆盖")
+
+
+def clear(session_id: Optional[str] = None) -> bool:
+    try:
+        if session_id:
+            _db().execute("DELETE FROM work_units WHERE session_id = ?", (session_id,))
+        else:
+            _db().execute("DELETE FROM work_units")
+        return True
+    except Exception:
+        return False
@@ -6,7 +6,9 @@ import pandas as pd
 import streamlit as st
 
 import storage
-from assets import CATEGORY_LABELS
+from assets import CATEGORY_LABELS, TIMEFRAME_SPECS, TIMEFRAMES
+
+_TF_LABELS = {"Daily": "日线", "Weekly": "周线", "Monthly": "月线"}
 
 
 def _safe_dist(r: dict) -> float:
@@ -149,7 +151,12 @@ def render():
     watchlist         = storage.load_watchlist()
     watchlist_tickers = {w["ticker"] for w in watchlist if isinstance(w, dict)}
 
-    TFS = ["Daily", "Weekly", "Monthly"]
+    # 列 = 结果中出现过的框架（启用日内框架后自动增加列）
+    TFS = [tf for tf in TIMEFRAME_SPECS
+           if any(tf in i["tfs"] for _, i in filtered)] or list(TIMEFRAMES)
+    tf_w  = f"{max(4, 21 // len(TFS))}%"
+    tf_th = "".join(f'<th style="text-align:center;width:{tf_w}">{_TF_LABELS.get(tf, tf)}</th>'
+                    for tf in TFS)
 
     # ── 表头 HTML ────────────────────────────────────────────────────
     # ── 先把所有行汇聚成完整 HTML 表格，确保列完全对齐 ─────────────
@@ -218,9 +225,7 @@ def render():
           <th style="text-align:left;width:18%">资产</th>
           <th style="text-align:left;width:7%">类别</th>
           <th style="text-align:right;width:11%">当前价格</th>
-          <th style="text-align:center;width:7%">日线</th>
-          <th style="text-align:center;width:7%">周线</th>
-          <th style="text-align:center;width:7%">月线</th>
+          {tf_th}
           <th style="text-align:left;width:12%">共振信号</th>
           <th style="text-align:left;width:9%">评分</th>
           <th style="text-align:left;width:6%">TV</th>
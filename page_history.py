@@ -5,6 +5,7 @@ import pandas as pd
 import streamlit as st
 
 import storage
+from assets import TIMEFRAME_SPECS
 
 
 def render():
@@ -54,12 +55,28 @@ def render():
         f"Session ID: {selected_sid[:20]}…"
     )
 
+    # 增量扫描：明细只含有变化的行，另列出状态变化事件
+    if sel_sess.get("mode") == "delta":
+        events = storage.load_events(session_id=selected_sid)
+        _KIND = {"zone_enter": "进入区间", "zone_exit": "离开区间",
+                 "fibo": "最近档位", "score": "共振评分"}
+        with st.expander(f"🔄 增量扫描：{sel_sess.get('changed', 0)} 行变化 / "
+                         f"{len(events)} 个事件"):
+            if events:
+                ev = pd.DataFrame(events)
+                ev["kind"] = ev["kind"].map(lambda k: _KIND.get(k, k))
+                ev = ev[["ticker", "name", "timeframe", "kind", "from", "to", "price"]]
+                ev.columns = ["代码", "资产名称", "框架", "变化", "原值", "新值", "价格"]
+                st.dataframe(ev, width="stretch", hide_index=True)
+            else:
+                st.caption("本次扫描没有状态变化")
+
     # ── 过滤 ────────────────────────────────────────────────────────
     col1, col2, col3 = st.columns([2,2,2])
     with col1:
         zone_only = st.checkbox("仅黄金区间", value=True)
     with col2:
-        tf_sel = st.selectbox("框架", ["全部","Daily","Weekly","Monthly"],
+        tf_sel = st.selectbox("框架", ["全部"] + list(TIMEFRAME_SPECS),
                               key="hist_tf", label_visibility="collapsed")
     with col3:
         cat_sel = st.selectbox("类别",
@@ -6,7 +6,8 @@ import streamlit as st
 
 import storage
 import scanner as sc
-from assets import ASSET_GROUPS, ASSETS, TIMEFRAMES, CATEGORY_LABELS, tv_url
+from assets import (ASSET_GROUPS, ASSETS, TIMEFRAME_SPECS, TIMEFRAMES,
+                    CATEGORY_LABELS, tv_url)
 
 
 # ════════════════════════════════════════════════════════════════════
@@ -51,7 +52,7 @@ def render():
         kw = st.text_input("🔍 搜索", placeholder="名称 / 代码…",
                            label_visibility="collapsed")
     with col_tf:
-        tf_sel = st.selectbox("框架", ["全部","Daily","Weekly","Monthly"],
+        tf_sel = st.selectbox("框架", ["全部"] + list(TIMEFRAME_SPECS),
                               label_visibility="collapsed")
     with col_cat:
         all_cat_keys = ["全部"] + sorted(set(CATEGORY_LABELS.keys()))
@@ -70,30 +71,13 @@ def render():
         _metrics(0, 0, 0, 0)
         return
 
-    rows     = storage.load_latest_results(inzone_only=False)
-    sessions = storage.load_sessions(limit=5)
-    last_s   = sessions[0] if sessions else {}
-
-    # 合并多次扫描的最新数据（同一 ticker+timeframe 取最新）
-    # sessions 已按时间倒序，第一次遇到即为最新
-    latest_map = {}
-    for sess in sessions:   # sessions[0] = 最新，直接正序遍历覆盖即可
-        sess_rows = storage.load_session_results(sess["session_id"])
-        for r in sess_rows:
-            key = (r["ticker"], r["timeframe"])
-            if key not in latest_map:
-                latest_map[key] = r
-    merged_rows = list(latest_map.values()) if latest_map else rows
-
-    total  = len(set(r["ticker"] for r in merged_rows))
-    inzone = sum(1 for r in merged_rows if r.get("in_zone"))
-    near   = sum(1 for r in merged_rows
-                 if not r.get("in_zone") and (r.get("dist_pct") or 999) < 5)
-    triple = sum(
-        1 for t in set(r["ticker"] for r in merged_rows)
-        if sum(1 for r in merged_rows
-               if r["ticker"] == t and r.get("in_zone")) == 3
-    )
+    # latest 表即各 (ticker, timeframe) 跨会话的最新结果，计数由存储层一次算出
+    view        = storage.load_latest_view(near_pct=5.0)
+    merged_rows = view["rows"]
+    sessions    = storage.load_sessions(limit=1)
+    last_s      = sessions[0] if sessions else {}
+
+    total, inzone, near, triple = view["total"], view["inzone"], view["near"], view["triple"]
     _metrics(total, inzone, near, triple)
 
     scanned_groups = storage.load_scanned_groups()
@@ -522,6 +506,7 @@ def _render_custom_scan(cfg):
             assets=custom_assets,
             note=f"custom:{final_ticker}",
             progress_callback=cb,
+            plan=False,
         )
 
     pb.empty(); msg.empty()
@@ -660,6 +645,36 @@ def _render_batch_selector(cfg):
         do_scan = st.button(f"🚀 扫描选中 {len(sel_assets)} 品种",
                             type="primary", width="stretch")
 
+    # 中断的会话（如 Streamlit 重启）→ 续扫缺失部分
+    unfinished = storage.load_unfinished_sessions(limit=1)
+    do_resume  = False
+    if unfinished and not do_scan:
+        u = unfinished[0]
+        col_u, col_r = st.columns([4, 2])
+        col_u.caption(f"⏸️ 未完成会话 {u['session_id']}（{u.get('note', '')}）："
+                      f"已完成 {u.get('total_checks', 0)} / {u.get('asset_count', 0) * u.get('tf_count', len(TIMEFRAMES))}")
+        with col_r:
+            do_resume = st.button("▶️ 续扫未完成会话", width="stretch")
+
+    if do_resume:
+        pb  = st.progress(0, "准备中…")
+        msg = st.empty()
+
+        def cb_resume(pct, text):
+            pb.progress(min(float(pct), 1.0), text)
+            msg.caption(text)
+
+        with st.spinner(""):
+            summary, err = sc.resume_scan(unfinished[0]["session_id"], cfg=cfg,
+                                          progress_callback=cb_resume)
+        pb.empty(); msg.empty()
+        if err:
+            st.error(err)
+        else:
+            st.success(f"✅ 续扫完成！黄金区 **{summary['inzone_count']}** | "
+                       f"耗时 {summary['elapsed_ms']/1000:.1f}s")
+            st.rerun()
+
     if do_scan:
         pb  = st.progress(0, "准备中…")
         msg = st.empty()
@@ -682,6 +697,9 @@ def _render_batch_selector(cfg):
         pb.empty(); msg.empty()
         if err:
             st.error(err)
+        elif summary["session_id"] is None:
+            st.info(f"⏭️ 所选品种均休市且收盘后已扫描过（跳过 {summary['skipped']} 个），"
+                    f"本次未扫描；可在设置中关闭「扫描计划」强制扫描")
         else:
             storage.save_scanned_groups(selected)
             st.success(
@@ -689,6 +707,8 @@ def _render_batch_selector(cfg):
                 f"黄金区 **{summary['inzone_count']}** | "
                 f"三框架共振 **{summary['triple_conf']}** | "
                 f"耗时 {summary['elapsed_ms']/1000:.1f}s"
+                + (f" | 休市跳过 {summary['skipped']}" if summary.get("skipped") else "")
+                + (f" | 顺延 {summary['deferred']}" if summary.get("deferred") else "")
             )
             st.rerun()
 
@@ -1,9 +1,14 @@
 """
 page_settings.py — 系统设置
 """
+import os
+
 import streamlit as st
+import bar_cache
+import datasource
 import storage
-from assets import ASSET_GROUPS, ASSETS, TIMEFRAMES
+import swing_state
+from assets import ASSET_GROUPS, ASSETS, INTRADAY_TIMEFRAMES, TIMEFRAME_SPECS, TIMEFRAMES
 
 
 def render():
@@ -27,6 +32,31 @@ def render():
                                 float(cfg.get("fibo_high", 0.618)), 0.01)
             watch_dist = st.slider("接近区间阈值 (%)", 1.0, 20.0,
                                    float(cfg.get("watch_dist", 5.0)), 0.5)
+
+        tfs = st.multiselect("扫描框架", list(TIMEFRAME_SPECS),
+                             default=[tf for tf in (cfg.get("timeframes") or TIMEFRAMES)
+                                      if tf in TIMEFRAME_SPECS],
+                             help="日内框架（15m / 1H / 4H）由 yfinance 提供，4H 由 1h 重采样")
+        ic1, ic2, ic3 = st.columns(3)
+        intraday_on = ic1.checkbox("定时日内复扫",
+                                   value=bool(cfg.get("intraday_enabled", False)),
+                                   help="只刷新日内框架，日/周/月线沿用最近结果")
+        intraday_min = ic2.number_input("复扫间隔（分钟）", 5, 240,
+                                        int(cfg.get("intraday_interval_min", 60)), 5)
+        reuse_days = ic3.number_input("高周期结果沿用天数", 0, 7,
+                                      int(cfg.get("intraday_reuse_days", 1)))
+        if intraday_on and not any(tf in INTRADAY_TIMEFRAMES for tf in tfs):
+            st.warning("⚠️ 未选择日内框架，定时日内复扫不会执行")
+        scan_delta = st.checkbox("增量写入", value=bool(cfg.get("scan_delta", False)),
+                                 help="历史只保存进出区间 / 最近档位 / 共振评分有变化的结果，"
+                                      "变化记入事件流；告警只在进入区间时发送")
+        pc1, pc2 = st.columns(2)
+        scan_plan = pc1.checkbox("扫描计划", value=bool(cfg.get("scan_plan", False)),
+                                 help="按缓存陈旧度、接近黄金区间、自选收藏排序；"
+                                      "休市且收盘后已扫描过的品种跳过")
+        budget_min = pc2.number_input("扫描时间预算（分钟，0 = 不限）", 0, 600,
+                                      int(cfg.get("scan_budget_min", 0)),
+                                      help="到时停止，未完成的品种顺延到下次扫描")
         st.markdown("""
         **公式（与 STRX Pine Script 完全一致）：**
         ```
@@ -38,7 +68,14 @@ def render():
         """)
         if st.button("💾 保存参数", type="primary"):
             cfg.update({"lookback": lookback, "fibo_low": zone_lo,
-                        "fibo_high": zone_hi, "watch_dist": watch_dist})
+                        "fibo_high": zone_hi, "watch_dist": watch_dist,
+                        "timeframes": tfs or list(TIMEFRAMES),
+                        "intraday_enabled": bool(intraday_on),
+                        "intraday_interval_min": int(intraday_min),
+                        "intraday_reuse_days": int(reuse_days),
+                        "scan_delta": bool(scan_delta),
+                        "scan_plan": bool(scan_plan),
+                        "scan_budget_min": int(budget_min)})
             if storage.save_config(cfg):
                 st.success("✅ 参数已保存")
 
@@ -76,8 +113,64 @@ def render():
             except Exception as e:
                 st.error(f"❌ 连接失败：{e}")
 
+        st.markdown("#### 🩺 数据源健康（本进程）")
+        _STATE = {"closed": "✅ 正常", "half-open": "🟡 探测中", "open": "⛔ 熔断"}
+        health = datasource.health_stats()
+        st.dataframe(
+            [{"数据源": name,
+              "状态": _STATE.get(h["state"], h["state"]),
+              "近期调用": h["calls"],
+              "成功率": f"{h['success_rate']*100:.0f}%" if h["success_rate"] is not None else "—",
+              "P50 ms": h["p50_ms"] or "—",
+              "P95 ms": h["p95_ms"] or "—",
+              "熔断次数": h["trips"],
+              "恢复倒计时": f"{h['retry_in_s']}s" if h["retry_in_s"] else "—",
+              "最近错误": h["last_error"]}
+             for name, h in health.items()],
+            hide_index=True, width="stretch")
+        if st.button("🔄 重置健康统计"):
+            datasource.reset_health()
+            st.rerun()
+
+        st.markdown("#### ⚡ 并发抓取")
+        workers = {**storage.DEFAULT_CFG["fetch_workers"],
+                   **(cfg.get("fetch_workers") or {})}
+        wc1, wc2, wc3 = st.columns(3)
+        w_ak = wc1.number_input("AKShare 线程数", 1, 32, int(workers["akshare"]),
+                                help="东方财富接口，过高易被限流")
+        w_yf = wc2.number_input("yfinance 线程数", 1, 32, int(workers["yfinance"]))
+        w_td = wc3.number_input("TwelveData 线程数", 1, 8, int(workers["twelvedata"]),
+                                help="免费版限 8 次/分钟")
+        n_proc = st.number_input("扫描进程数", 1, os.cpu_count() or 1,
+                                 min(int(cfg.get("scan_processes", 1)), os.cpu_count() or 1),
+                                 help="大于 1 时按品种分片多进程扫描；线程数与限流按进程均分")
+
+        hc1, hc2 = st.columns([1, 2])
+        hedge = hc1.checkbox("对冲抓取", value=bool(cfg.get("hedge_fetch", False)),
+                             help="首选源超时未返回时并发启动备用源，取先到的结果；"
+                                  "美股立即并发（AKShare + yfinance）")
+        hedge_delay = hc2.slider("启动备用源前等待（秒）", 0.0, 10.0,
+                                 float(cfg.get("hedge_delay", 2.0)), 0.5)
+
+        resample = {**storage.DEFAULT_CFG["resample_tf"],
+                    **(cfg.get("resample_tf") or {})}
+        st.caption("周线/月线由日线本地重采样（每品种只请求 1 次）；"
+                   "默认关闭，沿用数据源自带的复权周线 / 月线；确认与重采样结果一致后再开启。")
+        rc1, rc2, rc3 = st.columns(3)
+        r_ak = rc1.checkbox("AKShare 重采样", value=bool(resample["akshare"]))
+        r_yf = rc2.checkbox("yfinance 重采样", value=bool(resample["yfinance"]))
+        r_td = rc3.checkbox("TwelveData 重采样", value=bool(resample["twelvedata"]))
+
         if st.button("💾 保存数据源设置", type="primary"):
-            cfg.update({"data_source": ds, "twelvedata_key": tdkey})
+            cfg.update({"data_source": ds, "twelvedata_key": tdkey,
+                        "fetch_workers": {"akshare": int(w_ak),
+                                          "yfinance": int(w_yf),
+                                          "twelvedata": int(w_td)},
+                        "scan_processes": int(n_proc),
+                        "hedge_fetch": bool(hedge),
+                        "hedge_delay": float(hedge_delay),
+                        "resample_tf": {"akshare": r_ak, "yfinance": r_yf,
+                                        "twelvedata": r_td}})
             if storage.save_config(cfg): st.success("✅ 已保存")
 
     # ── Tab3: 存储 & 缓存 ────────────────────────────────────────────
@@ -92,6 +185,35 @@ def render():
         c3.metric("扫描会话数", stats["sessions"])
         c4.metric("数据大小", f"{stats['allres_kb']} KB")
 
+        h1, h2, h3 = st.columns([1, 1, 2])
+        h1.metric("历史分区(天)", stats["history_partitions"])
+        h2.metric("历史明细大小", f"{stats['history_kb']} KB")
+        with h3:
+            keep = st.number_input("历史保留天数", 0, 3650,
+                                   int(cfg.get("history_retention_days", 365)),
+                                   help="0 = 永久保留")
+            if st.button("💾 保存保留天数"):
+                cfg["history_retention_days"] = int(keep)
+                if storage.save_config(cfg): st.success("✅ 已保存")
+
+        bstats = bar_cache.stats()
+        b1, b2, b3 = st.columns([1, 1, 2])
+        b1.metric("K线缓存序列", bstats["series"])
+        b2.metric("K线缓存大小", f"{bstats['kb']} KB")
+        with b3:
+            st.markdown("<br>", unsafe_allow_html=True)
+            if st.button("🧹 清空 K 线缓存", help="下次扫描将重新下载完整历史"):
+                bar_cache.clear()
+                swing_state.clear()
+                st.success("✅ K 线缓存已清空")
+                st.rerun()
+            spot_refresh = st.checkbox("全市场行情更新日线",
+                                       value=bool(cfg.get("spot_refresh", False)),
+                                       help="扫描前每个市场请求一次行情快照，直接更新已缓存日线的最后一根")
+            if spot_refresh != bool(cfg.get("spot_refresh", False)):
+                cfg["spot_refresh"] = bool(spot_refresh)
+                storage.save_config(cfg)
+
         # 已扫描组
         scanned = stats.get("scanned_groups", [])
         unscanned = [g for g in ASSET_GROUPS if g not in scanned]
@@ -118,7 +240,7 @@ def render():
         st.markdown("---")
         st.markdown("**缓存升级路径**")
         st.markdown("""
-        当前：JSON 文件（Streamlit Cloud 临时存储）  
+        当前：SQLite（WAL）+ JSON 配置文件（Streamlit Cloud 临时存储）  
         升级：替换 `storage.py` 中 7 个函数即可切换至 Supabase / PostgreSQL，
         其他所有文件无需修改。
         """)
@@ -17,20 +17,20 @@ import pandas as pd
 
 import storage
 import scanner as sc
+import universe
+
+_MARKET = {"a_share": "a", "hk_stock": "hk", "us_stock": "us"}
 
 
 # ════════════════════════════════════════════════════════════════════
-# 带 30 分钟缓存的列表加载
+# 列表加载：磁盘快照（universe.py，每日后台刷新），进程间共享
 # ════════════════════════════════════════════════════════════════════
-@st.cache_data(ttl=1800, show_spinner=False)
 def _load_a():
     return sc.get_all_a_share_tickers()
 
-@st.cache_data(ttl=1800, show_spinner=False)
 def _load_hk():
     return sc.get_all_hk_tickers()
 
-@st.cache_data(ttl=1800, show_spinner=False)
 def _load_us():
     return sc.get_all_us_tickers()
 
@@ -92,7 +92,7 @@ def render():
 def _render_market(market_key: str, load_fn, category: str, cfg: dict, label: str):
 
     # ── 加载品种列表 ────────────────────────────────────────────
-    with st.spinner(f"📡 从 AKShare 获取{label}品种列表（约5-15秒）…"):
+    with st.spinner(f"📡 加载{label}品种列表（首次需从 AKShare 下载，约5-15秒）…"):
         try:
             raw_list: list = load_fn()
         except Exception as e:
@@ -112,7 +112,9 @@ def _render_market(market_key: str, load_fn, category: str, cfg: dict, label: st
 
     col_stat, col_tip = st.columns([3, 5])
     with col_stat:
-        st.success(f"✅ 已加载 **{total_raw:,}** 个{label}品种")
+        snap_age = universe.age(_MARKET[market_key])
+        age_txt  = f"（快照 {snap_age/3600:.0f} 小时前）" if snap_age is not None else ""
+        st.success(f"✅ 已加载 **{total_raw:,}** 个{label}品种{age_txt}")
     with col_tip:
         st.markdown(
             f'<div style="color:#6b7280;font-size:12px;padding-top:8px">'
@@ -360,6 +362,7 @@ def _run_single(ticker: str, name: str, category: str, cfg: dict):
         assets={ticker: (name, category)},
         note=f"universe_single:{ticker}",
         progress_callback=cb,
+        plan=False,
     )
     pb.empty(); msg.empty()
 
@@ -400,6 +403,9 @@ def _run_batch(assets: dict, cfg: dict):
 
     if err:
         st.error(f"批量扫描失败：{err}")
+    elif summary["session_id"] is None:
+        st.info(f"⏭️ 所选品种均休市且收盘后已扫描过（跳过 {summary['skipped']} 个），"
+                f"本次未扫描；可在设置中关闭「扫描计划」强制扫描")
     else:
         st.success(
             f"✅ 批量扫描完成！"
@@ -407,6 +413,8 @@ def _run_batch(assets: dict, cfg: dict):
             f"黄金区命中 **{summary['inzone_count']}** | "
             f"三框架共振 **{summary['triple_conf']}** | "
             f"耗时 **{summary['elapsed_ms']/1000:.1f}s**"
+            + (f" | 休市跳过 **{summary['skipped']}**" if summary.get("skipped") else "")
+            + (f" | 顺延 **{summary['deferred']}**" if summary.get("deferred") else "")
         )
         st.info("💡 本次结果已保存，可继续勾选其他品种追加扫描，结果会自动累积显示。")
     st.rerun()
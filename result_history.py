@@ -0,0 +1,230 @@
+"""
+result_history.py — 扫描明细历史（只追加，Parquet 列式存储）
+目录：
+  data_history/scan_date=YYYY-MM-DD/part-<session_id>-<uid>.parquet   — 追加写入
+  data_history/scan_date=YYYY-MM-DD/compact.parquet                     — 合并后
+
+  • 每次扫描只新增 part 文件，不重写旧数据
+  • compact() 将同一天的 part 合并为一个文件（分区锁文件 .compact.lock 防止
+    多个会话同时结束时互相覆盖 compact.parquet）
+  • prune()   按保留天数删除整天分区
+  • 读取时按分区（scan_date）和文件名（session_id）裁剪，只读需要的文件
+"""
+
+import os
+import shutil
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional
+
+import pandas as pd
+
+_BASE  = os.path.dirname(os.path.abspath(__file__))
+D_HIST = os.path.join(_BASE, "data_history")
+
+_COMPACT   = "compact.parquet"
+_LOCK      = ".compact.lock"
+_LOCK_TTL  = 600     # 锁文件超过该秒数视为进程异常退出遗留，可以接管
+
+# 固定列类型，保证不同 part 文件 schema 一致
+_FLOAT_COLS = ["current_price", "swing_high", "swing_low", "zone_top", "zone_bot",
+               "retrace_pct", "dist_pct", "nearest_fibo"]
+_INT_COLS   = ["confluence_score"]
+_BOOL_COLS  = ["in_zone"]
+
+
+def _part_dir(scan_date: str) -> str:
+    return os.path.join(D_HIST, f"scan_date={scan_date}")
+
+
+def _partitions() -> List[str]:
+    """已有分区日期（升序）。"""
+    if not os.path.isdir(D_HIST):
+        return []
+    return sorted(e.name.split("=", 1)[1] for e in os.scandir(D_HIST)
+                  if e.is_dir() and e.name.startswith("scan_date="))
+
+
+def _frame(rows: List[Dict]) -> pd.DataFrame:
+    df = pd.DataFrame(rows)
+    for c in _FLOAT_COLS:
+        if c in df.columns:
+            df[c] = pd.to_numeric(df[c], errors="coerce").astype("float64")
+    for c in _INT_COLS:
+        if c in df.columns:
+            df[c] = pd.to_numeric(df[c], errors="coerce").fillna(0).astype("int64")
+    for c in _BOOL_COLS:
+        if c in df.columns:
+            df[c] = df[c].fillna(False).astype(bool)
+    for c in df.columns:
+        if df[c].dtype == object:
+            df[c] = df[c].astype("string")
+    return df
+
+
+def _records(df: pd.DataFrame) -> List[Dict]:
+    if df.empty:
+        return []
+    df = df.astype(object).where(df.notna(), None)
+    return df.to_dict("records")
+
+
+def _write(path: str, df: pd.DataFrame) -> None:
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+
+
+# ── 写入 ─────────────────────────────────────────────────────────────
+def append(rows: List[Dict]) -> bool:
+    """按 scan_date 分区追加一批明细。"""
+    if not rows:
+        return True
+    try:
+        df = _frame(rows)
+        for c, default in (("scan_date", str(date.today())), ("session_id", "unknown")):
+            df[c] = df[c].fillna(default) if c in df.columns else default
+        for (scan_date, session_id), part in df.groupby(["scan_date", "session_id"]):
+            d = _part_dir(str(scan_date))
+            os.makedirs(d, exist_ok=True)
+            name = f"part-{session_id}-{uuid.uuid4().hex[:8]}.parquet"
+            _write(os.path.join(d, name), part)
+        return True
+    except Exception:
+        return False
+
+
+# ── 读取 ─────────────────────────────────────────────────────────────
+def _files(scan_date: str, session_id: Optional[str] = None) -> List[str]:
+    d = _part_dir(scan_date)
+    if not os.path.isdir(d):
+        return []
+    out = []
+    for e in sorted(os.scandir(d), key=lambda e: e.name):
+        if e.name == _COMPACT:
+            out.insert(0, e.path)
+        elif e.name.endswith(".parquet") and (
+                session_id is None or e.name.startswith(f"part-{session_id}-")):
+            out.append(e.path)
+    return out
+
+
+def read(scan_dates:  Optional[Iterable[str]] = None,
+         session_id:  Optional[str]           = None,
+         inzone_only: bool                    = False) -> pd.DataFrame:
+    """读取指定分区（默认全部），可按 session_id / in_zone 过滤。"""
+    dates = list(scan_dates) if scan_dates is not None else _partitions()
+    filters = [("session_id", "==", session_id)] if session_id else None
+    frames = []
+    for d in dates:
+        for path in _files(d, session_id):
+            try:
+                frames.append(pd.read_parquet(path, filters=filters))
+            except Exception:
+                continue
+    if not frames:
+        return pd.DataFrame()
+    df = pd.concat(frames, ignore_index=True)
+    if inzone_only and "in_zone" in df.columns:
+        df = df[df["in_zone"]]
+    return df
+
+
+def read_rows(scan_dates: Optional[Iterable[str]] = None,
+              session_id: Optional[str] = None,
+              inzone_only: bool = False) -> List[Dict]:
+    return _records(read(scan_dates, session_id, inzone_only))
+
+
+def latest_rows() -> List[Dict]:
+    """由全部历史物化出每个 (ticker, timeframe) 的最新一行。"""
+    df = read()
+    if df.empty:
+        return []
+    df = df.sort_values(["scan_date", "session_id"], kind="stable")
+    df = df.drop_duplicates(["ticker", "timeframe"], keep="last")
+    return _records(df)
+
+
+# ── 维护 ─────────────────────────────────────────────────────────────
+def _lock(scan_date: str) -> bool:
+    """取得分区合并锁；已被其他会话持有返回 False。"""
+    path = os.path.join(_part_dir(scan_date), _LOCK)
+    for _ in range(2):
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            try:
+                if time.time() - os.stat(path).st_mtime < _LOCK_TTL:
+                    return False
+                os.remove(path)          # 遗留锁，接管
+            except OSError:
+                return False
+        except OSError:
+            return False
+    return False
+
+
+def compact(min_parts: int = 8, skip_dates: Iterable[str] = ()) -> int:
+    """
+    part 文件数 ≥ min_parts 的分区合并为单个文件，返回合并的分区数。
+    持有分区锁期间读取、重写 compact.parquet 并删除已合并的 part；
+    锁被占用的分区本次跳过，留给下次合并。
+    """
+    skip, merged = set(skip_dates), 0
+    for d in _partitions():
+        if d in skip:
+            continue
+        pending = [f for f in _files(d) if not f.endswith(_COMPACT)]
+        if len(pending) < max(1, min_parts) or not _lock(d):
+            continue
+        try:
+            files = _files(d)
+            parts = [f for f in files if not f.endswith(_COMPACT)]
+            if len(parts) < max(1, min_parts):
+                continue
+            df = pd.concat([pd.read_parquet(f) for f in files], ignore_index=True)
+            _write(os.path.join(_part_dir(d), _COMPACT), df)
+            for f in parts:
+                os.remove(f)
+            merged += 1
+        except Exception:
+            continue
+        finally:
+            try:
+                os.remove(os.path.join(_part_dir(d), _LOCK))
+            except OSError:
+                pass
+    return merged
+
+
+def prune(keep_days: int) -> List[str]:
+    """删除早于 keep_days 天的分区，返回被删除的日期。"""
+    if keep_days <= 0:
+        return []
+    cutoff = str(date.today() - timedelta(days=keep_days))
+    dropped = [d for d in _partitions() if d < cutoff]
+    for d in dropped:
+        shutil.rmtree(_part_dir(d), ignore_errors=True)
+    return dropped
+
+
+def stats() -> Dict:
+    files, size = 0, 0
+    for d in _partitions():
+        for e in os.scandir(_part_dir(d)):
+            files += 1
+            size += e.stat().st_size
+    return {"partitions": len(_partitions()), "files": files, "kb": size // 1024}
+
+
+def clear() -> bool:
+    try:
+        if os.path.isdir(D_HIST):
+            shutil.rmtree(D_HIST)
+        return True
+    except Exception:
+        return False
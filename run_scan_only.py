@@ -1,19 +1,29 @@
 """
 run_scan_only.py
 独立扫描脚本 — 用于 GitHub Actions / 外部 Cron 触发
-不需要启动 Streamlit，直接运行即可
+不需要启动 Streamlit，直接运行即可，结果写入本地 data_scanner.db
 
 用法:
-    python run_scan_only.py
-
-环境变量:
-    SUPABASE_URL  — Supabase Project URL
-    SUPABASE_KEY  — Supabase anon key
+    python run_scan_only.py                      # 全量扫描
+    python run_scan_only.py --resume             # 续扫最近一次中断的会话
+    python run_scan_only.py --resume <session_id>
+    python run_scan_only.py --intraday           # 日内复扫（只刷新 cfg["timeframes"] 中的日内框架）
+    python run_scan_only.py --intraday --loop    # 每 intraday_interval_min 分钟循环
+    python run_scan_only.py --delta              # 增量模式：历史只写入状态变化的行
+    python run_scan_only.py --quick              # 快速复扫：全市场行情 + 缓存波段，突破时才抓历史
+    python run_scan_only.py --plan --budget 20   # 限时 20 分钟：按扫描计划先做最有价值的品种
+    python run_scan_only.py --no-plan            # 按品种表顺序全部扫描（忽略 cfg scan_plan）
+
+分布式（本地 SQLite 任务队列，见 jobqueue.py）:
+    python run_scan_only.py --coordinator                 # 按 ASSET_GROUPS 拆分并等待完成
+    python run_scan_only.py --coordinator --universe a,hk --unit-size 200
+    python run_scan_only.py --worker                      # 领取单元直到队列为空
+    python run_scan_only.py --worker --daemon             # 常驻等待新单元
 """
 
-import os
-import sys
+import argparse
 import logging
+import sys
 
 logging.basicConfig(
     level=logging.INFO,
@@ -21,75 +31,167 @@ logging.basicConfig(
     handlers=[logging.StreamHandler(sys.stdout)]
 )
 
-# ── 模拟 Streamlit secrets 环境（非 Streamlit 运行时）────────────
-class _FakeSecrets:
-    def __getitem__(self, key):
-        if key == "supabase":
-            return {
-                "url": os.environ.get("SUPABASE_URL", ""),
-                "key": os.environ.get("SUPABASE_KEY", ""),
-            }
-        raise KeyError(key)
-
-try:
-    import streamlit as st
-    # 如果 streamlit 已初始化，正常使用
-except Exception:
-    pass
-
-# 注入环境变量到 secrets
-try:
-    import streamlit as st
-    if not hasattr(st, "secrets") or not st.secrets.get("supabase"):
-        class _MockSecrets:
-            def get(self, key, default=None):
-                return {"supabase": {
-                    "url": os.environ.get("SUPABASE_URL",""),
-                    "key": os.environ.get("SUPABASE_KEY",""),
-                }}.get(key, default)
-            def __getitem__(self, key):
-                return self.get(key)
-except Exception:
-    pass
-
-
-def main():
-    logging.info("=" * 50)
-    logging.info("STRX Fibo Scanner — Standalone Run")
-    logging.info("=" * 50)
-
-    url = os.environ.get("SUPABASE_URL", "")
-    key = os.environ.get("SUPABASE_KEY", "")
 
-    if not url or not key:
-        logging.error("❌ 缺少环境变量 SUPABASE_URL / SUPABASE_KEY")
+def _parse_args(argv=None):
+    p = argparse.ArgumentParser(description="STRX Fibo Scanner — Standalone Run")
+    p.add_argument("--resume", nargs="?", const="last", metavar="SESSION_ID",
+                   help="续扫中断的会话（不带参数 = 最近一次）")
+    mode = p.add_mutually_exclusive_group()
+    mode.add_argument("--coordinator", action="store_true",
+                      help="拆分工作单元写入任务队列，并等待 worker 完成")
+    mode.add_argument("--worker", action="store_true", help="从任务队列领取单元扫描")
+    mode.add_argument("--intraday", action="store_true",
+                      help="日内复扫：只抓日内框架，高周期沿用最近结果")
+    mode.add_argument("--quick", action="store_true",
+                      help="快速复扫：每个市场一次行情请求，按缓存波段重算")
+    p.add_argument("--loop", action="store_true", help="--intraday：按间隔循环运行")
+    p.add_argument("--budget", type=float, default=None, metavar="MIN",
+                   help="全量扫描时间预算（分钟），到时其余品种顺延（同 cfg scan_budget_min）")
+    plan = p.add_mutually_exclusive_group()
+    plan.add_argument("--plan", action="store_true",
+                      help="使用扫描计划：按价值排序、跳过休市无新数据的品种（同 cfg scan_plan）")
+    plan.add_argument("--no-plan", action="store_true",
+                      help="不使用扫描计划：按品种表顺序扫描，不跳过休市品种")
+    p.add_argument("--delta", action="store_true",
+                   help="增量模式：历史只写入状态变化的行并记录 events（同 cfg scan_delta）")
+    p.add_argument("--universe", default="",
+                   help="协调者：扫描全市场而非 ASSET_GROUPS，逗号分隔 a,hk,us")
+    p.add_argument("--unit-size", type=int, default=100, help="每个工作单元的品种数")
+    p.add_argument("--no-wait", action="store_true", help="协调者：提交后立即退出")
+    p.add_argument("--session", default=None, help="worker：只处理指定会话")
+    p.add_argument("--worker-id", default=None)
+    p.add_argument("--lease", type=float, default=300, help="租约秒数")
+    p.add_argument("--daemon", action="store_true", help="worker：队列为空时继续等待")
+    return p.parse_args(argv)
+
+
+# 与 page_universe 中的类别保持一致
+_UNIVERSE = {
+    "a":  ("get_all_a_share_tickers", "a_stock"),
+    "hk": ("get_all_hk_tickers",      "cn_stock"),
+    "us": ("get_all_us_tickers",      "us_stock"),
+}
+
+
+def _coordinator_units(args):
+    """返回 (assets, units)：全市场按 unit_size 切分；默认每个 ASSET_GROUPS 组再切分。"""
+    import scanner
+    from assets import ASSET_GROUPS
+    import jobqueue
+
+    if args.universe:
+        assets = {}
+        for key in [k.strip() for k in args.universe.split(",") if k.strip()]:
+            fn_name, category = _UNIVERSE[key]
+            for ticker, name in getattr(scanner, fn_name)():
+                assets.setdefault(ticker, (name, category))
+        return assets, jobqueue.split_units(assets, args.unit_size)
+
+    assets, units = {}, []
+    for group in ASSET_GROUPS.values():
+        fresh = {t: v for t, v in group.items() if t not in assets}
+        assets.update(fresh)
+        units.extend(jobqueue.split_units(fresh, args.unit_size))
+    return assets, units
+
+
+def _run_coordinator(args, cfg, progress):
+    import jobqueue
+
+    assets, units = _coordinator_units(args)
+    if not assets:
+        logging.error("❌ 品种列表为空")
+        sys.exit(1)
+    sid = jobqueue.submit(assets, cfg, note="queue", units=units)
+    if not sid:
+        logging.error("❌ 创建任务队列失败")
+        sys.exit(1)
+    logging.info(f"已提交会话 {sid}：{len(assets)} 品种 / {len(units)} 个工作单元")
+    if args.no_wait:
+        return
+    p = jobqueue.wait(sid, progress_callback=progress)
+    if p["failed"]:
+        logging.error(f"❌ {p['failed']} 个单元失败，会话 {sid} 未结束"
+                      f"（jobqueue.requeue_failed 后可重新运行 worker）")
         sys.exit(1)
+    logging.info(f"✅ 扫描完成: {sid}")
+    logging.info(f"   区间内信号: {p['totals']['inzone_count']}")
+    logging.info(f"   三框架共振: {p['totals']['triple_conf']}")
 
-    # 初始化 Supabase
-    from supabase import create_client
-    from core import supabase_client as sc
-    sc._client = create_client(url, key)
-    logging.info("✅ Supabase 连接成功")
 
-    # 执行扫描
-    from core.scanner import run_full_scan
-    from core.supabase_client import load_config
+def _run_worker(args, cfg):
+    import jobqueue
+
+    n = jobqueue.run_worker(worker_id=args.worker_id, cfg=cfg,
+                            session_id=args.session, lease_s=args.lease,
+                            exit_when_empty=not args.daemon)
+    logging.info(f"✅ worker 退出，完成 {n} 个工作单元")
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+
+    logging.info("=" * 50)
+    logging.info("STRX Fibo Scanner — Standalone Run")
+    logging.info("=" * 50)
+
+    import storage
+    from scanner import (intraday_loop, quick_rescan, resume_scan, run_full_scan,
+                         run_intraday_scan)
 
-    cfg = load_config()
+    cfg = storage.load_config()
+    if args.delta:
+        cfg["scan_delta"] = True
     logging.info(f"配置加载完成: lookback={cfg['lookback']}, source={cfg['data_source']}")
 
     def progress(pct, msg):
         logging.info(f"[{pct*100:.0f}%] {msg}")
 
-    summary, err = run_full_scan(cfg=cfg, note="cron", progress_callback=progress)
+    if args.coordinator:
+        return _run_coordinator(args, cfg, progress)
+    if args.worker:
+        return _run_worker(args, cfg)
+    if args.intraday and args.loop:
+        logging.info(f"日内复扫循环：每 {cfg.get('intraday_interval_min', 60)} 分钟")
+        return intraday_loop(progress_callback=progress)
+
+    if args.intraday:
+        summary, err = run_intraday_scan(cfg=cfg, progress_callback=progress)
+    elif args.quick:
+        summary, err = quick_rescan(cfg=cfg, progress_callback=progress)
+    elif args.resume:
+        session_id = args.resume
+        if session_id == "last":
+            unfinished = storage.load_unfinished_sessions(limit=1)
+            if not unfinished:
+                logging.error(f"❌ 没有可续扫的会话（运行中的会话需 "
+                              f"{storage.RESUME_IDLE_S}s 无心跳才视为中断）")
+                sys.exit(1)
+            session_id = unfinished[0]["session_id"]
+        logging.info(f"续扫会话: {session_id}")
+        summary, err = resume_scan(session_id, cfg=cfg, progress_callback=progress)
+    else:
+        summary, err = run_full_scan(
+            cfg=cfg, note="cron", progress_callback=progress,
+            budget_s=args.budget * 60 if args.budget is not None else None,
+            plan=True if args.plan else False if args.no_plan else None)
 
     if err:
         logging.error(f"❌ 扫描失败: {err}")
         sys.exit(1)
+    if summary["session_id"] is None:
+        logging.info(f"⏭️ 全部品种休市且无新数据，本次未扫描"
+                     f"（跳过 {summary.get('skipped', 0)} 个品种，--no-plan 强制扫描）")
+        return
 
-    logging.info(f"✅ 扫描完成: {summary['note']}")
+    logging.info(f"✅ 扫描完成: {summary['session_id']}")
     logging.info(f"   区间内信号: {summary['inzone_count']}")
     logging.info(f"   三框架共振: {summary['triple_conf']}")
+    if summary.get("skipped") or summary.get("deferred"):
+        logging.info(f"   休市跳过: {summary.get('skipped', 0)} / "
+                     f"顺延下次: {summary.get('deferred', 0)}")
+    if "changed" in summary:
+        logging.info(f"   状态变化: {summary['changed']} 行 / {summary['events']} 个事件")
     logging.info(f"   耗时: {summary['elapsed_ms']}ms")
 
 
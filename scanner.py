@@ -23,39 +23,98 @@ AKShare 核心接口（东方财富数据源，稳定免费）：
 ================================================================
 """
 
+import math
+import multiprocessing as mp
+import queue
 import time
 import hashlib
 import logging
 import re
+import threading
 import warnings
+from concurrent.futures import (FIRST_COMPLETED, ProcessPoolExecutor,
+                                ThreadPoolExecutor, as_completed, wait)
 from datetime import datetime, timedelta
-from typing import Callable, Dict, List, Optional, Tuple
+from functools import lru_cache
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 
+import bar_cache
+import datasource
+import spot
 import storage
-from assets import ASSETS, TIMEFRAMES, tv_symbol, tv_url
+import swing_state
+import universe
+import us_codes
+from assets import (ASSETS, INTRADAY_TIMEFRAMES, TIMEFRAME_SPECS, TIMEFRAMES,
+                    tv_symbol, tv_url)
 from alerts import dispatch_alerts
 
 logger = logging.getLogger(__name__)
 
 
 # ════════════════════════════════════════════════════════════════════
-# Ticker 类型检测
+# Ticker 类型检测 / 路由表
 # ════════════════════════════════════════════════════════════════════
+_TYPE_PATTERNS: List[Tuple["re.Pattern", str]] = [
+    (re.compile(r"^\d{6}$"),               "a_bare"),
+    (re.compile(r"^\d{6}\.(SS|SH|SZ|BJ)$"), "a_share"),
+    (re.compile(r"^\d{4,5}\.HK$"),         "hk_stock"),
+    (re.compile(r"^[A-Z]{1,5}$"),          "us_stock"),
+    (re.compile(r"^[A-Z]+-[A-Z]+$"),       "crypto"),
+]
+
+
+@lru_cache(maxsize=16384)
 def _ticker_type(ticker: str) -> str:
     t = ticker.strip().upper()
-    if re.match(r"^\d{6}$", t):               return "a_bare"
-    if re.match(r"^\d{6}\.(SS|SH|SZ|BJ)$", t): return "a_share"
-    if re.match(r"^\d{4,5}\.HK$", t):         return "hk_stock"
-    if re.match(r"^[A-Z]{1,5}$", t):          return "us_stock"
-    if re.match(r"^[A-Z]+-[A-Z]+$", t):       return "crypto"
+    for pattern, kind in _TYPE_PATTERNS:
+        if pattern.match(t):
+            return kind
     if t.endswith("=X"):                       return "forex"
     if t.endswith("=F"):                       return "futures"
     if t.startswith("^"):                      return "index"
     return "other"
 
 
+class Route(NamedTuple):
+    """品种的静态路由与元数据（与配置无关的部分）。"""
+    type:      str
+    providers: Tuple[str, ...]   # 默认回退顺序（TwelveData 是否参与由配置决定）
+    tv_symbol: str
+    tv_url:    str
+
+
+_PROVIDERS: Dict[str, Tuple[str, ...]] = {
+    "a_bare":   ("akshare", "yfinance"),
+    "a_share":  ("akshare", "yfinance"),
+    "hk_stock": ("akshare", "yfinance"),
+    "us_stock": ("akshare", "yfinance", "twelvedata"),
+}
+
+
+def _build_route(ticker: str) -> Route:
+    tt = _ticker_type(ticker)
+    return Route(tt, _PROVIDERS.get(tt, ("yfinance", "twelvedata")),
+                 tv_symbol(ticker), tv_url(ticker))
+
+
+# 内置品种库启动时一次性建表；临时品种走 LRU
+_ROUTES: Dict[str, Route] = {t: _build_route(t) for t in ASSETS}
+
+
+@lru_cache(maxsize=8192)
+def _route_adhoc(ticker: str) -> Route:
+    return _build_route(ticker)
+
+
+def route(ticker: str) -> Route:
+    r = _ROUTES.get(ticker)
+    return r if r is not None else _route_adhoc(ticker)
+
+
 # ════════════════════════════════════════════════════════════════════
 # 日期辅助
 # ════════════════════════════════════════════════════════════════════
@@ -65,12 +124,24 @@ def _start_date(days_back: int) -> str:
 def _today() -> str:
     return datetime.now().strftime("%Y%m%d")
 
+def _ak_start(days_back: int, since: Optional[datetime] = None) -> str:
+    """增量请求时从 since 开始，否则按默认回溯天数。"""
+    return since.strftime("%Y%m%d") if since is not None else _start_date(days_back)
+
 _AK_PERIOD: Dict[str, Tuple[str, int]] = {
     "1d":  ("daily",   365 * 3),
     "1wk": ("weekly",  365 * 6),
     "1mo": ("monthly", 365 * 15),
 }
 
+_SPAN_YEARS: Dict[str, int] = {"1y": 1, "2y": 2, "5y": 5, "10y": 10}
+
+
+def _ak_window(interval: str, span: Optional[str] = None) -> Tuple[str, int]:
+    """AKShare 的 period 名与回溯天数；span（如 "10y"）只会拉长默认窗口。"""
+    period, days = _AK_PERIOD.get(interval, ("daily", 365 * 3))
+    return period, max(days, _SPAN_YEARS.get(span or "", 0) * 365)
+
 
 # ════════════════════════════════════════════════════════════════════
 # 通用 OHLC 标准化
@@ -114,16 +185,19 @@ def _to_ohlc(df: pd.DataFrame,
 # ════════════════════════════════════════════════════════════════════
 # AKShare — A股（东方财富，5454支）
 # ════════════════════════════════════════════════════════════════════
-def _ak_a_share(ticker: str, interval: str) -> Optional[pd.DataFrame]:
+def _ak_a_share(ticker: str, interval: str,
+                span:  Optional[str]      = None,
+                since: Optional[datetime] = None) -> Optional[pd.DataFrame]:
     try:
         import akshare as ak
         symbol = re.sub(r"\.(SS|SH|SZ|BJ)$", "", ticker.upper())
         if not re.match(r"^\d{6}$", symbol):
             return None
-        period, days = _AK_PERIOD.get(interval, ("daily", 365 * 3))
-        df = ak.stock_zh_a_hist(
+        period, days = _ak_window(interval, span)
+        df = datasource.call(
+            "akshare", ak.stock_zh_a_hist,
             symbol=symbol, period=period,
-            start_date=_start_date(days), end_date=_today(),
+            start_date=_ak_start(days, since), end_date=_today(),
             adjust="qfq"
         )
         return _to_ohlc(df)
@@ -133,35 +207,26 @@ def _ak_a_share(ticker: str, interval: str) -> Optional[pd.DataFrame]:
 
 
 def get_all_a_share_tickers() -> List[Tuple[str, str]]:
-    """返回全量 A 股 [(6位代码, 名称)]，约 5454 支。"""
-    try:
-        import akshare as ak
-        df = ak.stock_zh_a_spot_em()
-        result = []
-        for _, row in df.iterrows():
-            code = str(row.get("代码", "")).zfill(6)
-            name = str(row.get("名称", ""))
-            if code and name:
-                result.append((code, name))
-        return result
-    except Exception as e:
-        logger.warning(f"get_all_a_share_tickers: {e}")
-        return []
+    """返回全量 A 股 [(6位代码, 名称)]，约 5454 支（磁盘快照，每日刷新，见 universe.py）"""
+    return universe.get("a")
 
 
 # ════════════════════════════════════════════════════════════════════
 # AKShare — 港股（东方财富，2516支）
 # ════════════════════════════════════════════════════════════════════
-def _ak_hk_stock(ticker: str, interval: str) -> Optional[pd.DataFrame]:
+def _ak_hk_stock(ticker: str, interval: str,
+                 span:  Optional[str]      = None,
+                 since: Optional[datetime] = None) -> Optional[pd.DataFrame]:
     try:
         import akshare as ak
         # 0700.HK → 去掉 .HK → 补全5位 → "00700"（东方财富格式）
         code = re.sub(r"\.HK$", "", ticker.upper(), flags=re.IGNORECASE)
         code = code.zfill(5)
-        period, days = _AK_PERIOD.get(interval, ("daily", 365 * 3))
-        df = ak.stock_hk_hist(
+        period, days = _ak_window(interval, span)
+        df = datasource.call(
+            "akshare", ak.stock_hk_hist,
             symbol=code, period=period,
-            start_date=_start_date(days), end_date=_today(),
+            start_date=_ak_start(days, since), end_date=_today(),
             adjust="qfq"
         )
         return _to_ohlc(df)
@@ -171,53 +236,54 @@ def _ak_hk_stock(ticker: str, interval: str) -> Optional[pd.DataFrame]:
 
 
 def get_all_hk_tickers() -> List[Tuple[str, str]]:
-    """返回全量港股 [(XXXX.HK, 名称)]，约 2280 支。"""
-    try:
-        import akshare as ak
-        df = ak.stock_hk_main_board_spot_em()
-        result = []
-        for _, row in df.iterrows():
-            code = str(row.get("代码", "")).zfill(5)
-            name = str(row.get("名称", ""))
-            if code and name:
-                yf_code = f"{int(code):04d}.HK"
-                result.append((yf_code, name))
-        return result
-    except Exception as e:
-        logger.warning(f"get_all_hk_tickers: {e}")
-        return []
+    """返回全量港股 [(XXXX.HK, 名称)]，约 2280 支（磁盘快照，每日刷新，见 universe.py）"""
+    return universe.get("hk")
 
 
 # ════════════════════════════════════════════════════════════════════
 # AKShare — 美股（东方财富，16527支）
 # ════════════════════════════════════════════════════════════════════
-# 东方财富前缀：105=NASDAQ, 106=NYSE, 107=AMEX
-_US_CODE_CACHE: Dict[str, str] = {}   # ticker → "105.AAPL"
+# 东方财富前缀：105=NASDAQ, 106=NYSE, 107=AMEX，映射持久化见 us_codes.py
 
 
-def _ak_us_stock(ticker: str, interval: str) -> Optional[pd.DataFrame]:
+def _ak_us_stock(ticker: str, interval: str,
+                 span:  Optional[str]      = None,
+                 since: Optional[datetime] = None) -> Optional[pd.DataFrame]:
     try:
         import akshare as ak
         t = ticker.upper()
-        period, days = _AK_PERIOD.get(interval, ("daily", 365 * 3))
-        start, end   = _start_date(days), _today()
+        period, days = _ak_window(interval, span)
+        start, end   = _ak_start(days, since), _today()
 
-        # 优先使用缓存中已知的完整代码
-        known = _US_CODE_CACHE.get(t)
-        candidates = [known] if known else [f"{p}.{t}" for p in ["105", "106", "107"]]
+        # 优先使用持久化映射中的完整代码；已知不在东方财富的直接交给 yfinance
+        known = us_codes.lookup(t)
+        if known:
+            candidates = [known]
+        elif us_codes.is_missing(t):
+            return None
+        else:
+            candidates = [f"{p}.{t}" for p in us_codes.PREFIXES]
 
+        outage = False
         for code in candidates:
             try:
-                df = ak.stock_us_hist(
+                df = datasource.call(
+                    "akshare", ak.stock_us_hist,
                     symbol=code, period=period,
                     start_date=start, end_date=end, adjust="qfq"
                 )
                 result = _to_ohlc(df)
                 if result is not None:
-                    _US_CODE_CACHE[t] = code
+                    us_codes.record(t, code)
                     return result
-            except Exception:
+            except Exception as e:
+                # 未知代码时 stock_us_hist 通常直接抛异常，视同该前缀无数据；
+                # 只有来源故障才无法判断
+                outage = outage or datasource.is_outage(e)
                 continue
+        # 三个前缀都无数据且期间没有来源故障才记为缺失
+        if not known and not outage:
+            us_codes.record_missing(t)
         return None
     except Exception as e:
         logger.debug(f"ak_us_stock {ticker}: {e}")
@@ -225,37 +291,35 @@ def _ak_us_stock(ticker: str, interval: str) -> Optional[pd.DataFrame]:
 
 
 def get_all_us_tickers() -> List[Tuple[str, str]]:
-    """返回全量美股 [(TICKER, 名称)]，约 16527 支，同时预热代码缓存。"""
-    try:
-        import akshare as ak
-        df = ak.stock_us_spot_em()
-        result = []
-        for _, row in df.iterrows():
-            raw  = str(row.get("代码", ""))   # 例：105.AAPL
-            name = str(row.get("名称", ""))
-            if "." in raw:
-                ticker = raw.split(".", 1)[1]
-                _US_CODE_CACHE[ticker.upper()] = raw   # 预热缓存
-            else:
-                ticker = raw
-            if ticker and name:
-                result.append((ticker, name))
-        return result
-    except Exception as e:
-        logger.warning(f"get_all_us_tickers: {e}")
-        return []
+    """返回全量美股 [(TICKER, 名称)]，约 16527 支（磁盘快照，每日刷新，见 universe.py）"""
+    return universe.get("us")
 
 
 # ════════════════════════════════════════════════════════════════════
 # yfinance — 通用兜底
 # ════════════════════════════════════════════════════════════════════
-def fetch_yfinance(ticker: str, interval: str, period: str) -> Optional[pd.DataFrame]:
+def _yf_symbol(ticker: str) -> str:
+    """A 股代码转 yfinance 格式：600519 / 600519.SH → 600519.SS，000001 → 000001.SZ。"""
+    t = ticker.strip().upper()
+    kind = _ticker_type(t)
+    if kind == "a_bare":
+        return f"{t}.SS" if t[0] in "569" else f"{t}.SZ"
+    if kind == "a_share" and t.endswith(".SH"):
+        return t[:-3] + ".SS"
+    return ticker
+
+
+def fetch_yfinance(ticker: str, interval: str, period: str,
+                   since: Optional[datetime] = None) -> Optional[pd.DataFrame]:
     try:
         import yfinance as yf
+        window = ({"start": since.strftime("%Y-%m-%d")} if since is not None
+                  else {"period": period})
         with warnings.catch_warnings():
             warnings.simplefilter("ignore")
-            df = yf.download(ticker, interval=interval, period=period,
-                             progress=False, auto_adjust=True)
+            df = datasource.call("yfinance", yf.download, _yf_symbol(ticker),
+                                 interval=interval, **window,
+                                 progress=False, auto_adjust=True)
         if df is None or df.empty:
             return None
         if hasattr(df.columns, "levels"):
@@ -267,11 +331,93 @@ def fetch_yfinance(ticker: str, interval: str, period: str) -> Optional[pd.DataF
         return None
 
 
+def _split_yf(df: Optional[pd.DataFrame], ticker: str) -> Optional[pd.DataFrame]:
+    """从多品种下载结果中取出单个品种的 OHLC。"""
+    try:
+        if df is None or df.empty:
+            return None
+        if isinstance(df.columns, pd.MultiIndex):
+            if ticker in df.columns.get_level_values(0):
+                df = df[ticker]
+            elif ticker in df.columns.get_level_values(1):
+                df = df.xs(ticker, axis=1, level=1)
+            else:
+                return None
+        out = df[["Open", "High", "Low", "Close"]].dropna()
+        return out if not out.empty else None
+    except Exception:
+        return None
+
+
+def _yf_chunk(tickers: List[str], interval: str, period: str,
+              since: Optional[datetime] = None,
+              split: bool = True) -> Dict[str, Optional[pd.DataFrame]]:
+    """
+    一次请求下载一组品种；失败或缺数据的品种二分后重试，
+    最终单独下载，坏代码不会拖垮整批。
+    两半各请求一次都没有数据时视为数据源故障，不再继续二分
+    （否则 50 个品种的一块会变成约 99 次请求）。
+    since 不为空时只下载该日期之后的增量。
+    """
+    if len(tickers) == 1:
+        return {tickers[0]: fetch_yfinance(tickers[0], interval, period, since)}
+    window = ({"start": since.strftime("%Y-%m-%d")} if since is not None
+              else {"period": period})
+    try:
+        import yfinance as yf
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            df = datasource.call("yfinance", yf.download, tickers,
+                                 interval=interval, **window,
+                                 group_by="ticker", progress=False,
+                                 auto_adjust=True, threads=True)
+    except Exception as e:
+        logger.debug(f"yfinance batch {len(tickers)}: {e}")
+        df = None
+    result = {t: _split_yf(df, t) for t in tickers}
+    missing = [t for t in tickers if result[t] is None]
+    if not missing or not split:
+        return result
+    mid   = (len(missing) + 1) // 2
+    parts = [p for p in (missing[:mid], missing[mid:]) if p]
+    subs  = [_yf_chunk(p, interval, period, since, split=False) for p in parts]
+    if all(v is None for sub in subs for v in sub.values()):
+        logger.debug(f"yfinance batch {len(tickers)}: 两半均无数据，停止二分")
+        return result
+    for part, sub in zip(parts, subs):
+        result.update(sub)
+        rest = [t for t in part if sub[t] is None]
+        if rest:
+            result.update(_yf_chunk(rest, interval, period, since))
+    return result
+
+
+def fetch_yfinance_batch(tickers:    List[str],
+                         interval:   str,
+                         period:     str,
+                         chunk_size: int = 50,
+                         since:      Optional[datetime] = None,
+                         deadline:   Optional[float]    = None,
+                         ) -> Dict[str, Optional[pd.DataFrame]]:
+    """
+    按 chunk_size 分块批量下载，返回 {ticker: OHLC 或 None}。
+    deadline（time.time() 时间戳）到达后不再发起新的分块，未下载的品种不在结果中。
+    """
+    result: Dict[str, Optional[pd.DataFrame]] = {}
+    chunk_size = max(1, int(chunk_size))
+    for i in range(0, len(tickers), chunk_size):
+        if deadline is not None and time.time() >= deadline:
+            break
+        result.update(_yf_chunk(tickers[i:i + chunk_size], interval, period, since))
+    return result
+
+
 # ════════════════════════════════════════════════════════════════════
 # TwelveData — 可选付费补充
 # ════════════════════════════════════════════════════════════════════
 def fetch_twelvedata(ticker: str, interval: str, period: str,
-                     api_key: str) -> Optional[pd.DataFrame]:
+                     api_key: str,
+                     since: Optional[datetime] = None) -> Optional[pd.DataFrame]:
     if not api_key:
         return None
     try:
@@ -280,14 +426,22 @@ def fetch_twelvedata(ticker: str, interval: str, period: str,
         td_int = td_map.get(interval)
         if not td_int:
             return None
-        size = {"2y": 520, "5y": 260, "10y": 120}.get(period, 200)
-        r = requests.get(
-            "https://api.twelvedata.com/time_series",
-            params={"symbol": ticker, "interval": td_int,
-                    "outputsize": size, "apikey": api_key},
-            timeout=12,
-        )
-        data = r.json()
+        per_year = {"1d": 260, "1wk": 52, "1mo": 12}[interval]
+        size = min(per_year * _SPAN_YEARS.get(period, 0) or 200, 5000)
+        params = {"symbol": ticker, "interval": td_int,
+                  "outputsize": size, "apikey": api_key}
+        if since is not None:
+            params["start_date"] = since.strftime("%Y-%m-%d")
+
+        def _get():
+            r = requests.get("https://api.twelvedata.com/time_series",
+                             params=params, timeout=12)
+            data = r.json()
+            if r.status_code == 429 or data.get("code") == 429:
+                raise datasource.RateLimited(data.get("message", "429"))
+            return data
+
+        data = datasource.call("twelvedata", _get)
         if data.get("status") == "error":
             return None
         vals = data.get("values", [])
@@ -297,7 +451,9 @@ def fetch_twelvedata(ticker: str, interval: str, period: str,
                  "Open": float(v["open"]), "High": float(v["high"]),
                  "Low":  float(v["low"]),  "Close": float(v["close"])}
                 for v in vals]
-        return pd.DataFrame(rows).set_index("Date").sort_index()
+        df = pd.DataFrame(rows).set_index("Date").sort_index()
+        df.index = pd.to_datetime(df.index)
+        return df
     except Exception as e:
         logger.debug(f"twelvedata {ticker}: {e}")
         return None
@@ -306,43 +462,325 @@ def fetch_twelvedata(ticker: str, interval: str, period: str,
 # ════════════════════════════════════════════════════════════════════
 # 智能路由
 # ════════════════════════════════════════════════════════════════════
-def fetch_data(ticker: str, interval: str, period: str,
-               cfg: Optional[Dict] = None) -> Optional[pd.DataFrame]:
-    cfg    = cfg or {}
-    tt     = _ticker_type(ticker)
+_AK_FETCH: Dict[str, Callable] = {
+    "a_bare": _ak_a_share, "a_share": _ak_a_share,
+    "hk_stock": _ak_hk_stock, "us_stock": _ak_us_stock,
+}
+
+_INTRADAY_INTERVALS = frozenset(iv for iv, _ in INTRADAY_TIMEFRAMES.values())
+
+
+def _source_chain(ticker: str, interval: str, period: str, cfg: Dict,
+                  since: Optional[datetime] = None
+                  ) -> List[Tuple[str, Callable[[], Optional[pd.DataFrame]]]]:
+    """按优先级排列的 [(数据源, 无参抓取函数)]，默认顺序取自路由表。"""
+    r      = route(ticker)
     td_key = cfg.get("twelvedata_key", "")
+    names  = list(r.providers)
+    # 外汇/期货/指数/加密/其他：可配置 TwelveData 优先
+    if (r.type not in _AK_FETCH and cfg.get("data_source") == "twelvedata"
+            and td_key):
+        names = ["twelvedata", "yfinance"]
+    if not td_key:
+        names = [n for n in names if n != "twelvedata"]
+    # 日内 K 线只有 yfinance 提供（AKShare / TwelveData 接口仅日线族）
+    if interval in _INTRADAY_INTERVALS:
+        names = ["yfinance"]
 
-    if tt in ("a_share", "a_bare"):
-        df = _ak_a_share(ticker, interval)
-        return df if df is not None else fetch_yfinance(ticker, interval, period)
+    fetchers = {
+        "yfinance":   lambda: fetch_yfinance(ticker, interval, period, since),
+        "twelvedata": lambda: fetch_twelvedata(ticker, interval, period, td_key, since),
+    }
+    if r.type in _AK_FETCH:
+        ak_fn = _AK_FETCH[r.type]
+        fetchers["akshare"] = lambda: ak_fn(ticker, interval, period, since)
+    return [(n, fetchers[n]) for n in names]
 
-    if tt == "hk_stock":
-        df = _ak_hk_stock(ticker, interval)
-        return df if df is not None else fetch_yfinance(ticker, interval, period)
 
-    if tt == "us_stock":
-        df = _ak_us_stock(ticker, interval)
-        if df is not None:
-            return df
-        df = fetch_yfinance(ticker, interval, period)
-        if df is not None:
-            return df
-        return fetch_twelvedata(ticker, interval, period, td_key) if td_key else None
+def _hedge_delay(ticker: str, cfg: Dict) -> Optional[float]:
+    """对冲启动备用源的等待秒数；None = 关闭（顺序回退）。"""
+    if not cfg.get("hedge_fetch"):
+        return None
+    if route(ticker).type in (cfg.get("hedge_immediate") or []):
+        return 0.0
+    try:
+        return max(0.0, float(cfg.get("hedge_delay", 2.0)))
+    except (TypeError, ValueError):
+        return 2.0
+
+
+_hedge_pool: Optional[ThreadPoolExecutor] = None
+_hedge_lock = threading.Lock()
+
+
+def _get_hedge_pool() -> ThreadPoolExecutor:
+    # 所有扫描线程共享的 32 线程池。被对冲掉的在途请求无法中止，会一直占用线程
+    # 直到返回，并且已经消耗了该来源的限流令牌（datasource.call 内取令牌）；
+    # 慢源持续超时时池可能被败者占满，新的对冲请求排队——此时等同于顺序回退
+    global _hedge_pool
+    with _hedge_lock:
+        if _hedge_pool is None:
+            _hedge_pool = ThreadPoolExecutor(max_workers=32,
+                                             thread_name_prefix="fetch-hedge")
+        return _hedge_pool
+
+
+def _fetch_hedged(chain: List[Tuple[str, Callable[[], Optional[pd.DataFrame]]]],
+                  delay: float) -> Optional[pd.DataFrame]:
+    """
+    对冲抓取：先启动首选源，delay 秒内未返回（或返回失败）即启动下一个，
+    取最先返回的有效结果；尚未开始的请求取消，已在途的结果丢弃
+    （在途请求仍占用对冲线程池与限流令牌，见 _get_hedge_pool）。
+    所有来源都已启动后不再按 delay 轮询，阻塞等待剩余请求返回。
+    """
+    pool    = _get_hedge_pool()
+    pending = iter(chain)
+    futs: Dict = {}
+
+    def _launch() -> bool:
+        nxt = next(pending, None)
+        if nxt is None:
+            return False
+        futs[pool.submit(nxt[1])] = nxt[0]
+        return True
 
-    # 外汇/期货/指数/加密/其他
-    if cfg.get("data_source") == "twelvedata" and td_key:
-        df = fetch_twelvedata(ticker, interval, period, td_key)
+    more = _launch()
+    while futs:
+        done, _ = wait(list(futs), timeout=delay if more else None,
+                       return_when=FIRST_COMPLETED)
+        for f in done:
+            src = futs.pop(f)
+            try:
+                df = f.result()
+            except Exception as e:
+                logger.debug(f"hedged {src}: {e}")
+                df = None
+            if df is not None:
+                for loser in futs:
+                    loser.cancel()
+                return df
+        # 超时未返回 → 对冲；已失败 → 立即回退
+        if more:
+            more = _launch()
+    return None
+
+
+def _fetch_remote(ticker: str, interval: str, period: str, cfg: Dict,
+                  since: Optional[datetime] = None) -> Optional[pd.DataFrame]:
+    chain = _source_chain(ticker, interval, period, cfg, since)
+    # 按数据源健康状况调整顺序：熔断中的来源排到最后（调用会立即失败）
+    order = datasource.route_order([src for src, _ in chain])
+    chain.sort(key=lambda c: order.index(c[0]))
+    delay = _hedge_delay(ticker, cfg)
+    if delay is not None and len(chain) > 1:
+        return _fetch_hedged(chain, delay)
+    for _, fn in chain:
+        df = fn()
         if df is not None:
             return df
-    df = fetch_yfinance(ticker, interval, period)
+    return None
+
+
+def fetch_data(ticker: str, interval: str, period: str,
+               cfg: Optional[Dict] = None) -> Optional[pd.DataFrame]:
+    """
+    先查本地 K 线缓存：有效期内直接返回；过期则只请求重叠区之后的增量并追加；
+    检测到前复权回溯调整或缓存窗口不足时整段重新下载。
+    """
+    cfg = cfg or {}
+    if not cfg.get("bar_cache", True):
+        return _fetch_remote(ticker, interval, period, cfg)
+
+    cached = bar_cache.load(ticker, interval)
+    if cached is not None and bar_cache.covers(ticker, interval, period):
+        if bar_cache.is_fresh(ticker, interval, cfg):
+            return cached
+        since = bar_cache.overlap_start(cached).to_pydatetime()
+        fresh = _fetch_remote(ticker, interval, period, cfg, since)
+        if fresh is None:
+            return cached          # 网络失败时退回旧缓存
+        merged = bar_cache.merge(cached, fresh)
+        if merged is not None:
+            bar_cache.save(ticker, interval, merged, period)
+            return merged
+        logger.info(f"bar_cache {ticker} {interval}: 复权调整，整段重下")
+
+    df = _fetch_remote(ticker, interval, period, cfg)
     if df is not None:
+        bar_cache.save(ticker, interval, df, period)
         return df
-    return fetch_twelvedata(ticker, interval, period, td_key) if td_key else None
+    return cached
+
+
+# ════════════════════════════════════════════════════════════════════
+# 本地重采样：一次日线 → 周线 / 月线；1h → 4h
+# ════════════════════════════════════════════════════════════════════
+_RESAMPLE_RULE: Dict[str, str] = {"1wk": "W-FRI", "1mo": "MS", "4h": "4h"}
+_RESAMPLE_SPAN = "10y"   # 月线 lookback=100 需要约 8.5 年日线
+
+# 数据源不直接提供、总是由更小周期重采样的框架 → 底层序列
+_RESAMPLE_BASE: Dict[str, Tuple[str, str]] = {"4h": ("1h", INTRADAY_TIMEFRAMES["1H"][1])}
+
+
+def _resample_ohlc(df: Optional[pd.DataFrame],
+                   interval: str) -> Optional[pd.DataFrame]:
+    if df is None or interval == "1d":
+        return df
+    rule = _RESAMPLE_RULE.get(interval)
+    if not rule:
+        return None
+    out = df.resample(rule).agg({"Open": "first", "High": "max",
+                                 "Low": "min", "Close": "last"}).dropna()
+    return out if not out.empty else None
+
+
+def active_timeframes(cfg: Optional[Dict] = None) -> List[str]:
+    """本次扫描的框架名（cfg["timeframes"]，按 TIMEFRAME_SPECS 顺序），缺省为日/周/月。"""
+    chosen = set((cfg or {}).get("timeframes") or TIMEFRAMES)
+    return [tf for tf in TIMEFRAME_SPECS if tf in chosen] or list(TIMEFRAMES)
+
+
+def _use_resample(ticker: str, cfg: Dict) -> bool:
+    """按主数据源开关决定是否只拉日线再本地重采样（周线 / 月线）。"""
+    switches = cfg.get("resample_tf") or {}
+    if not switches.get(_source_of(ticker, cfg)):
+        return False
+    return all(iv == "1d" or iv in _RESAMPLE_RULE
+               for iv, _ in TIMEFRAMES.values())
+
+
+def _base_series(ticker: str, tf_name: str, cfg: Dict) -> Tuple[str, str]:
+    """该框架实际下载的 (interval, period)；与框架自身不同即为本地重采样。"""
+    interval, period = TIMEFRAME_SPECS[tf_name]
+    if interval in _RESAMPLE_BASE:
+        return _RESAMPLE_BASE[interval]
+    if tf_name in TIMEFRAMES and _use_resample(ticker, cfg):
+        return "1d", _RESAMPLE_SPAN
+    return interval, period
+
+
+def _series_needed(ticker: str, cfg: Dict) -> List[Tuple[str, str]]:
+    """扫描该品种需要下载的 (interval, period) 列表。"""
+    out: List[Tuple[str, str]] = []
+    for tf in active_timeframes(cfg):
+        base = _base_series(ticker, tf, cfg)
+        if base not in out:
+            out.append(base)
+    return out
+
+
+def _fetch_frames(ticker: str, tf_names: List[str], cfg: Dict,
+                  prefetched: Optional[Dict] = None) -> Dict[str, Optional[pd.DataFrame]]:
+    prefetched = prefetched or {}
+    got: Dict[Tuple[str, str], Optional[pd.DataFrame]] = {}
+
+    def _get(interval: str, period: str) -> Optional[pd.DataFrame]:
+        if (interval, period) not in got:
+            df = prefetched.get((ticker, interval))
+            got[(interval, period)] = (df if df is not None
+                                       else fetch_data(ticker, interval, period, cfg))
+        return got[(interval, period)]
+
+    out = {}
+    for tf in tf_names:
+        base = _base_series(ticker, tf, cfg)
+        df = _get(*base)
+        out[tf] = df if base == TIMEFRAME_SPECS[tf] else _resample_ohlc(df, TIMEFRAME_SPECS[tf][0])
+    return out
+
+
+def _prefetch_yfinance(assets: Dict, cfg: Dict,
+                       progress_callback: Optional[Callable] = None,
+                       deadline: Optional[float] = None) -> Dict:
+    """
+    yfinance 主源品种按 (interval, period, 增量起点) 分组批量下载。
+    启用 K 线缓存时写入缓存（后续 fetch_data 命中本地）：已覆盖但过期的序列
+    只下载重叠区之后的增量并 bar_cache.merge，发现前复权回溯调整时不写入，
+    留给 fetch_data 整段重下；未启用缓存时返回 {(ticker, interval): df}。
+    deadline 到达后不再发起新的批量请求（扫描时间预算），其余品种照常逐个抓取。
+    """
+    chunk = int(cfg.get("yf_batch_size", 50) or 0)
+    if chunk <= 1:
+        return {}
+    use_cache = cfg.get("bar_cache", True)
+    groups: Dict[Tuple[str, str, Optional[datetime]], List[str]] = {}
+    cached: Dict[Tuple[str, str], pd.DataFrame] = {}
+    for ticker in assets:
+        if _source_of(ticker, cfg) != "yfinance":
+            continue
+        for interval, period in _series_needed(ticker, cfg):
+            since = None
+            if use_cache and bar_cache.covers(ticker, interval, period):
+                if bar_cache.is_fresh(ticker, interval, cfg):
+                    continue
+                old = bar_cache.load(ticker, interval)
+                if old is not None:
+                    cached[(ticker, interval)] = old
+                    since = bar_cache.overlap_start(old).to_pydatetime()
+            groups.setdefault((interval, period, since), []).append(ticker)
+
+    prefetched: Dict[Tuple[str, str], pd.DataFrame] = {}
+    for (interval, period, since), tickers in groups.items():
+        if len(tickers) < 2:
+            continue
+        if deadline is not None and time.time() >= deadline:
+            break
+        if progress_callback:
+            progress_callback(0.0, f"📦 yfinance 批量下载 {len(tickers)} 个品种 · {interval}")
+        for ticker, df in fetch_yfinance_batch(tickers, interval, period, chunk,
+                                               since, deadline).items():
+            if df is None:
+                continue
+            if not use_cache:
+                prefetched[(ticker, interval)] = df
+            elif since is None:
+                bar_cache.save(ticker, interval, df, period)
+            else:
+                merged = bar_cache.merge(cached[(ticker, interval)], df)
+                if merged is not None:
+                    bar_cache.save(ticker, interval, merged, period)
+    return prefetched
 
 
 # ════════════════════════════════════════════════════════════════════
 # Fibonacci 计算
 # ════════════════════════════════════════════════════════════════════
+FIB_LEVELS: List[float] = [0.0, 0.136, 0.236, 0.382, 0.5, 0.618,
+                           0.705, 0.786, 0.886, 1.0]
+
+
+def fibo_from_swing(swing_high: float,
+                    swing_low:  float,
+                    current:    float,
+                    zone_lo:    float = 0.5,
+                    zone_hi:    float = 0.618) -> Optional[Dict]:
+    """由波段高低点与现价计算回撤区间（compute_fibo / swing_state 共用）。"""
+    if not swing_high > swing_low:
+        return None
+    rng         = swing_high - swing_low
+    retrace_pct = (swing_high - current) / rng * 100
+    zone_top    = swing_high - zone_lo * rng
+    zone_bot    = swing_high - zone_hi * rng
+    in_zone     = zone_bot <= current <= zone_top
+    fib_prices  = {r: swing_high - r * rng for r in FIB_LEVELS}
+    nearest_r   = min(FIB_LEVELS, key=lambda r: abs(fib_prices[r] - current))
+    dist_pct    = (
+        abs(current - zone_top) / rng * 100 if current > zone_top else
+        abs(current - zone_bot) / rng * 100 if current < zone_bot else 0.0
+    )
+    return {
+        "swing_high":   swing_high,
+        "swing_low":    swing_low,
+        "current":      current,
+        "retrace_pct":  round(retrace_pct, 2),
+        "zone_top":     round(zone_top, 6),
+        "zone_bot":     round(zone_bot, 6),
+        "in_zone":      in_zone,
+        "nearest_fibo": nearest_r,
+        "dist_pct":     round(dist_pct, 2),
+    }
+
+
 def compute_fibo(df:       Optional[pd.DataFrame],
                  lookback: int   = 100,
                  zone_lo:  float = 0.5,
@@ -350,50 +788,139 @@ def compute_fibo(df:       Optional[pd.DataFrame],
     try:
         if df is None or len(df) < max(10, lookback // 2):
             return None
-        window     = df.tail(lookback)
-        swing_high = float(window["High"].max())
-        swing_low  = float(window["Low"].min())
-        if swing_high <= swing_low:
-            return None
-        rng         = swing_high - swing_low
-        current     = float(df["Close"].iloc[-1])
-        retrace_pct = (swing_high - current) / rng * 100
-        zone_top    = swing_high - zone_lo * rng
-        zone_bot    = swing_high - zone_hi * rng
-        in_zone     = zone_bot <= current <= zone_top
-        fibs        = [0.0, 0.136, 0.236, 0.382, 0.5, 0.618,
-                       0.705, 0.786, 0.886, 1.0]
-        fib_prices  = {r: swing_high - r * rng for r in fibs}
-        nearest_r   = min(fibs, key=lambda r: abs(fib_prices[r] - current))
-        dist_pct    = (
-            abs(current - zone_top) / rng * 100 if current > zone_top else
-            abs(current - zone_bot) / rng * 100 if current < zone_bot else 0.0
-        )
-        return {
-            "swing_high":   swing_high,
-            "swing_low":    swing_low,
-            "current":      current,
-            "retrace_pct":  round(retrace_pct, 2),
-            "zone_top":     round(zone_top, 6),
-            "zone_bot":     round(zone_bot, 6),
-            "in_zone":      in_zone,
-            "nearest_fibo": nearest_r,
-            "dist_pct":     round(dist_pct, 2),
-        }
+        window = df.tail(lookback)
+        return fibo_from_swing(float(window["High"].max()), float(window["Low"].min()),
+                               float(df["Close"].iloc[-1]), zone_lo, zone_hi)
     except Exception as e:
         logger.debug(f"compute_fibo: {e}")
         return None
 
 
+def compute_fibo_incremental(ticker:   str,
+                             key:      str,
+                             df:       Optional[pd.DataFrame],
+                             lookback: int   = 100,
+                             zone_lo:  float = 0.5,
+                             zone_hi:  float = 0.618) -> Optional[Dict]:
+    """
+    与 compute_fibo 结果一致，但波段高低点取自 swing_state 的持久化单调队列，
+    每次只处理上次扫描后新收盘的 K 线。
+    """
+    try:
+        if df is None or len(df) < max(10, lookback // 2):
+            return None
+        hl = swing_state.swing(ticker, key, df, lookback)
+        if hl is None:
+            return None
+        return fibo_from_swing(hl[0], hl[1], float(df["Close"].iloc[-1]),
+                               zone_lo, zone_hi)
+    except Exception as e:
+        logger.debug(f"compute_fibo_incremental: {e}")
+        return None
+
+
+# ════════════════════════════════════════════════════════════════════
+# Fibonacci 批量计算（ticker × bar 面板，一次 NumPy 计算）
+# ════════════════════════════════════════════════════════════════════
+def stack_panel(frames:   List[Optional[pd.DataFrame]],
+                lookback: int = 100
+                ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    将多个 OHLC 序列的最后 lookback 根 K 线右对齐堆叠为 (N, lookback)
+    的 High/Low/Close 面板（不足部分填 NaN），并返回各序列总长度。
+    """
+    n = len(frames)
+    high  = np.full((n, lookback), np.nan)
+    low   = np.full((n, lookback), np.nan)
+    close = np.full((n, lookback), np.nan)
+    n_bars = np.zeros(n, dtype=np.int64)
+    for i, df in enumerate(frames):
+        if df is None or df.empty:
+            continue
+        tail = df.tail(lookback)
+        k = len(tail)
+        high[i, -k:]  = tail["High"].to_numpy(dtype="float64")
+        low[i, -k:]   = tail["Low"].to_numpy(dtype="float64")
+        close[i, -k:] = tail["Close"].to_numpy(dtype="float64")
+        n_bars[i] = len(df)
+    return high, low, close, n_bars
+
+
+def compute_fibo_panel(high:     np.ndarray,
+                       low:      np.ndarray,
+                       close:    np.ndarray,
+                       n_bars:   np.ndarray,
+                       lookback: int   = 100,
+                       zone_lo:  float = 0.5,
+                       zone_hi:  float = 0.618) -> List[Optional[Dict]]:
+    """compute_fibo 的向量化版本，逐行返回与 compute_fibo 相同结构的 dict。"""
+    n = high.shape[0]
+    if n == 0:
+        return []
+    with np.errstate(invalid="ignore", divide="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)   # 全 NaN 行
+        swing_high = np.nanmax(high, axis=1)
+        swing_low  = np.nanmin(low,  axis=1)
+        current    = close[:, -1]
+        rng        = swing_high - swing_low
+        retrace    = (swing_high - current) / rng * 100
+        zone_top   = swing_high - zone_lo * rng
+        zone_bot   = swing_high - zone_hi * rng
+        in_zone    = (zone_bot <= current) & (current <= zone_top)
+        levels     = np.asarray(FIB_LEVELS)
+        fib_prices = swing_high[:, None] - levels[None, :] * rng[:, None]
+        nearest_i  = np.argmin(np.abs(fib_prices - current[:, None]), axis=1)
+        dist       = np.where(current > zone_top, np.abs(current - zone_top),
+                     np.where(current < zone_bot, np.abs(current - zone_bot), 0.0)
+                     ) / rng * 100
+
+    valid = ((n_bars >= max(10, lookback // 2)) & (swing_high > swing_low)
+             & np.isfinite(current))
+    out: List[Optional[Dict]] = []
+    for i in range(n):
+        if not valid[i]:
+            out.append(None)
+            continue
+        out.append({
+            "swing_high":   float(swing_high[i]),
+            "swing_low":    float(swing_low[i]),
+            "current":      float(current[i]),
+            "retrace_pct":  round(float(retrace[i]), 2),
+            "zone_top":     round(float(zone_top[i]), 6),
+            "zone_bot":     round(float(zone_bot[i]), 6),
+            "in_zone":      bool(in_zone[i]),
+            "nearest_fibo": FIB_LEVELS[int(nearest_i[i])],
+            "dist_pct":     round(float(dist[i]), 2),
+        })
+    return out
+
+
+def compute_fibo_batch(frames:   Dict[str, Optional[pd.DataFrame]],
+                       lookback: int   = 100,
+                       zone_lo:  float = 0.5,
+                       zone_hi:  float = 0.618) -> Dict[str, Optional[Dict]]:
+    """按 key（如 ticker）批量计算，结果与逐个调用 compute_fibo 一致。"""
+    keys = list(frames)
+    try:
+        panel = stack_panel([frames[k] for k in keys], lookback)
+        fibos = compute_fibo_panel(*panel, lookback, zone_lo, zone_hi)
+    except Exception as e:
+        logger.debug(f"compute_fibo_batch: {e}")
+        fibos = [compute_fibo(frames[k], lookback, zone_lo, zone_hi) for k in keys]
+    return dict(zip(keys, fibos))
+
+
 # ════════════════════════════════════════════════════════════════════
 # 共振评分
 # ════════════════════════════════════════════════════════════════════
 def confluence_score(tf_map: Dict[str, Optional[Dict]]) -> Dict:
+    """任意数量框架的共振评分；≥3 个框架在区间内都计为多框架共振。"""
     in_tfs   = [tf for tf, f in tf_map.items() if f and f["in_zone"]]
     near_tfs = [tf for tf, f in tf_map.items()
                 if f and not f["in_zone"] and f.get("dist_pct", 999) < 5]
     score = min(len(in_tfs) * 3 + len(near_tfs), 10)
-    if len(in_tfs) == 3:   label = "🔥🔥🔥 三框架共振"
+    if len(in_tfs) > 3:    label = f"🔥🔥🔥 {len(in_tfs)}框架共振"
+    elif len(in_tfs) == 3: label = "🔥🔥🔥 三框架共振"
     elif len(in_tfs) == 2: label = "🔥🔥 双框架共振"
     elif len(in_tfs) == 1: label = "🔥 单框架黄金区"
     elif near_tfs:         label = "👀 接近区间"
@@ -403,101 +930,948 @@ def confluence_score(tf_map: Dict[str, Optional[Dict]]) -> Dict:
 
 
 # ════════════════════════════════════════════════════════════════════
-# 主扫描入口
+# 并发抓取引擎（按数据源分池，有界线程数）
+# ════════════════════════════════════════════════════════════════════
+def _source_of(ticker: str, cfg: Dict) -> str:
+    """品种的主数据源，用于选择对应的线程池。"""
+    if route(ticker).providers[0] == "akshare":
+        return "akshare"
+    if cfg.get("data_source") == "twelvedata" and cfg.get("twelvedata_key"):
+        return "twelvedata"
+    return "yfinance"
+
+
+def _worker_count(cfg: Dict, source: str) -> int:
+    default = storage.DEFAULT_CFG["fetch_workers"].get(source, 4)
+    workers = cfg.get("fetch_workers") or {}
+    try:
+        return max(1, int(workers.get(source, default)))
+    except (TypeError, ValueError):
+        return default
+
+
+_COMPUTE_BATCH = 256   # 每攒够这么多序列做一次面板计算
+_COMPUTE_WAIT  = 0.5   # 或距上次计算超过该秒数（保证结果持续流出）
+
+
+def _use_swing_state(cfg: Dict) -> bool:
+    """增量波段状态需要稳定的本地序列，只在启用 K 线缓存时使用。"""
+    return bool(cfg.get("swing_state", True)) and bool(cfg.get("bar_cache", True))
+
+
+def _scan_job(ticker: str, tf_names: List[str], cfg: Dict, lookback: int,
+              prefetched: Optional[Dict] = None,
+              zone: Tuple[float, float] = (0.5, 0.618)
+              ) -> Tuple[Dict[str, Optional[pd.DataFrame]], Dict[str, Optional[Dict]]]:
+    """
+    返回 (windows, fibos)：
+      windows — 只保留最后 lookback 根 K 线，留给主线程批量计算
+      fibos   — 启用 swing_state 时在工作线程内增量算好的结果
+    """
+    frames = _fetch_frames(ticker, tf_names, cfg, prefetched)
+    if _use_swing_state(cfg):
+        fibos = {}
+        for tf in tf_names:
+            interval = TIMEFRAME_SPECS[tf][0]
+            if _base_series(ticker, tf, cfg) != TIMEFRAME_SPECS[tf]:
+                interval += ".rs"          # 重采样序列与直接下载的序列分开保存状态
+            fibos[tf] = compute_fibo_incremental(ticker, interval, frames.get(tf),
+                                                 lookback, *zone)
+        return {}, fibos
+    return {tf: (frames[tf].tail(lookback) if frames.get(tf) is not None else None)
+            for tf in tf_names}, {}
+
+
+def _iter_scan_results(assets: Dict, cfg: Dict, lookback: int,
+                       zone_lo: float, zone_hi: float,
+                       prefetched: Optional[Dict] = None,
+                       todo: Optional[Dict[str, List[str]]] = None,
+                       deadline: Optional[float] = None
+                       ) -> Iterator[Tuple[str, str, Optional[Dict]]]:
+    """
+    将 assets × 框架分发到各数据源线程池，抓取结果攒批后用
+    compute_fibo_batch 计算，按完成顺序产出 (ticker, tf_name, fibo)。
+    todo 指定每个品种仍需扫描的框架（续扫时使用），缺省为全部框架。
+    deadline（time.time() 时间戳）到达后不再等待抓取，产出已抓到的部分，
+    排队中的任务取消。
+    迭代发生在调用线程，回调可安全更新 UI。
+    """
+    pools: Dict[str, ThreadPoolExecutor] = {}
+    futures = {}
+    pending: Dict[Tuple[str, str], Optional[pd.DataFrame]] = {}
+
+    def _flush():
+        fibos = compute_fibo_batch(pending, lookback, zone_lo, zone_hi)
+        pending.clear()
+        for (tk, tf), fibo in fibos.items():
+            yield tk, tf, fibo
+
+    try:
+        for ticker in assets:
+            tf_todo = active_timeframes(cfg) if todo is None else todo.get(ticker, [])
+            if not tf_todo:
+                continue
+            # 共用同一底层序列的框架（日线重采样周/月线、1h 重采样 4h）合为一个任务
+            groups: Dict[Tuple[str, str], List[str]] = {}
+            for tf in tf_todo:
+                groups.setdefault(_base_series(ticker, tf, cfg), []).append(tf)
+            for (interval, _), tf_names in groups.items():
+                src = ("yfinance" if interval in _INTRADAY_INTERVALS
+                       else _source_of(ticker, cfg))
+                if src not in pools:
+                    pools[src] = ThreadPoolExecutor(
+                        max_workers=_worker_count(cfg, src),
+                        thread_name_prefix=f"fetch-{src}",
+                    )
+                fut = pools[src].submit(_scan_job, ticker, tf_names, cfg,
+                                        lookback, prefetched, (zone_lo, zone_hi))
+                futures[fut] = (ticker, tf_names)
+
+        last = time.monotonic()
+        timeout = None if deadline is None else max(0.0, deadline - time.time())
+        try:
+            for fut in as_completed(futures, timeout=timeout):
+                ticker, tf_names = futures[fut]
+                try:
+                    windows, fibos = fut.result()
+                except Exception as e:
+                    logger.debug(f"scan job {ticker} {tf_names}: {e}")
+                    windows, fibos = {}, {}
+                for tf_name in tf_names:
+                    if tf_name in fibos:
+                        yield ticker, tf_name, fibos[tf_name]
+                    else:
+                        pending[(ticker, tf_name)] = windows.get(tf_name)
+                if (len(pending) >= _COMPUTE_BATCH
+                        or time.monotonic() - last >= _COMPUTE_WAIT):
+                    yield from _flush()
+                    last = time.monotonic()
+        except TimeoutError:
+            logger.info("扫描时间预算用尽，停止等待剩余抓取任务")
+        yield from _flush()
+    finally:
+        for pool in pools.values():
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+# ════════════════════════════════════════════════════════════════════
+# 多进程分片（cfg["scan_processes"] > 1 时启用）
+# 每个子进程独立运行 _iter_scan_results（自带线程池 / 限流器 / 缓存），
+# 结果经队列回传父进程；存储写入、评分、进度回调都只在父进程中进行。
+# ════════════════════════════════════════════════════════════════════
+def _process_count(cfg: Dict) -> int:
+    try:
+        return max(1, int(cfg.get("scan_processes", 1)))
+    except (TypeError, ValueError):
+        return 1
+
+
+def _shard_assets(assets: Dict, n: int) -> List[Dict]:
+    """按数据源轮转分片，使各进程的 AKShare / yfinance 负载均衡。"""
+    shards: List[Dict] = [{} for _ in range(n)]
+    i = 0
+    by_src: Dict[str, List[str]] = {}
+    for t in assets:
+        by_src.setdefault(_source_of(t, {}), []).append(t)
+    for tickers in by_src.values():
+        for t in tickers:
+            shards[i % n][t] = assets[t]
+            i += 1
+    return [sh for sh in shards if sh]
+
+
+def _shard_cfg(cfg: Dict, n: int) -> Dict:
+    """子进程配置：限流与线程数按进程数均分，整体请求速率不变。"""
+    limits = {p: {**datasource.DEFAULT_LIMITS.get(p, {}), **v}
+              for p, v in {**datasource.DEFAULT_LIMITS,
+                           **(cfg.get("rate_limits") or {})}.items()}
+    for lim in limits.values():
+        lim["rate"]        = float(lim.get("rate", 5.0)) / n
+        lim["burst"]       = max(1.0, float(lim.get("burst", 10)) / n)
+        lim["concurrency"] = max(1, math.ceil(int(lim.get("concurrency", 4)) / n))
+    workers = {**storage.DEFAULT_CFG["fetch_workers"], **(cfg.get("fetch_workers") or {})}
+    workers = {src: max(1, math.ceil(int(w) / n)) for src, w in workers.items()}
+    return {**cfg, "rate_limits": limits, "fetch_workers": workers, "scan_processes": 1}
+
+
+def _shard_worker(shard: Dict, todo: Dict[str, List[str]], cfg: Dict,
+                  lookback: int, zone_lo: float, zone_hi: float, out_q,
+                  deadline: Optional[float] = None, stop=None) -> None:
+    """子进程入口：扫描一个分片，逐条放入 out_q，结束时放入 None。stop 置位时提前退出。"""
+    try:
+        datasource.configure(cfg)
+        prefetched = _prefetch_yfinance(shard, cfg, None, deadline)
+        for item in _iter_scan_results(shard, cfg, lookback, zone_lo, zone_hi,
+                                       prefetched, todo, deadline):
+            if stop is not None and stop.is_set():
+                break
+            out_q.put(item)
+    finally:
+        out_q.put(None)
+
+
+def _iter_scan_results_mp(assets: Dict, cfg: Dict, lookback: int,
+                          zone_lo: float, zone_hi: float,
+                          todo: Dict[str, List[str]], processes: int,
+                          deadline: Optional[float] = None
+                          ) -> Iterator[Tuple[str, str, Optional[Dict]]]:
+    """
+    _iter_scan_results 的多进程版本，产出相同的 (ticker, tf_name, fibo)。
+    调用方提前关闭（租约失效、写库失败、异常）时通知子进程停止并立即返回，
+    不等待各分片扫完；子进程在途的抓取结束后自行退出。
+    """
+    shards = _shard_assets(assets, processes)
+    if not shards:
+        return
+    sub_cfg = _shard_cfg(cfg, len(shards))
+    ctx  = mp.get_context("spawn")   # 父进程可能持有线程（Streamlit），不使用 fork
+    mgr  = ctx.Manager()
+    pool = ProcessPoolExecutor(max_workers=len(shards), mp_context=ctx)
+    finished = False
+    try:
+        out_q = mgr.Queue()
+        stop  = mgr.Event()
+        futs = [pool.submit(_shard_worker, sh,
+                            {t: todo[t] for t in sh if t in todo},
+                            sub_cfg, lookback, zone_lo, zone_hi, out_q, deadline, stop)
+                for sh in shards]
+        live = len(futs)
+        while live:
+            try:
+                item = out_q.get(timeout=1.0)
+            except queue.Empty:
+                # 子进程被杀时不会放入结束标记
+                if all(f.done() for f in futs):
+                    break
+                continue
+            if item is None:
+                live -= 1
+            else:
+                yield item
+        for f in futs:
+            try:
+                f.result()
+            except Exception as e:
+                logger.warning(f"scan shard failed: {e}")
+        finished = True
+    finally:
+        if not finished:
+            try:
+                stop.set()
+            except Exception:
+                pass
+        pool.shutdown(wait=finished, cancel_futures=not finished)
+        mgr.shutdown()
+
+
+# ════════════════════════════════════════════════════════════════════
+# 主扫描入口（流式：品种三个框架齐全即评分，按微批写入存储）
 # ════════════════════════════════════════════════════════════════════
+_FLUSH_TICKERS = 50   # 每攒够这么多品种写一次库（cfg["flush_batch"] 可覆盖）
+_HEARTBEAT_S   = 60   # 会话心跳间隔（storage.RESUME_IDLE_S 内无心跳才可续扫）
+
+
+def _result_rows(ticker: str, name: str, category: str,
+                 tfs: Dict[str, Optional[Dict]], conf: Dict,
+                 session_id: str, scan_date: str) -> List[Dict]:
+    meta = route(ticker)
+    rows = []
+    for tf_name, fibo in tfs.items():
+        rows.append({
+            "session_id":       session_id,
+            "scan_date":        scan_date,
+            "ticker":           ticker,
+            "name":             name,
+            "category":         category,
+            "timeframe":        tf_name,
+            "in_zone":          bool(fibo and fibo["in_zone"]),
+            "current_price":    fibo["current"]      if fibo else None,
+            "swing_high":       fibo["swing_high"]   if fibo else None,
+            "swing_low":        fibo["swing_low"]    if fibo else None,
+            "zone_top":         fibo["zone_top"]     if fibo else None,
+            "zone_bot":         fibo["zone_bot"]     if fibo else None,
+            "retrace_pct":      fibo["retrace_pct"]  if fibo else None,
+            "dist_pct":         fibo["dist_pct"]     if fibo else None,
+            "nearest_fibo":     fibo["nearest_fibo"] if fibo else None,
+            "confluence_score": conf["score"],
+            "confluence_label": conf["label"],
+            "tv_symbol":        meta.tv_symbol,
+            "tv_url":           meta.tv_url,
+        })
+    return rows
+
+
+def _delta_rows(rows: List[Dict],
+                prev: Dict[Tuple[str, str], Dict],
+                ) -> Tuple[List[Dict], List[Dict], List[Dict]]:
+    """
+    增量模式：与上次的最新结果比较，返回 (写入 latest 的行, 写入历史的行, 状态变化事件)。
+    latest 每次都刷新（scan_date / session_id / 波段价位保持最新，日内复扫、
+    快速复扫与扫描计划依赖这些列）；历史与事件只记录状态有变化的行。
+    新出现的 (ticker, timeframe) 直接写入；本次抓取失败的行保留上次状态不写。
+    """
+    fresh, changed, events = [], [], []
+    for r in rows:
+        old = prev.get((r["ticker"], r["timeframe"]))
+        if old is None:
+            fresh.append(r)
+            changed.append(r)
+            if r["in_zone"]:
+                events.append(("zone_enter", False, True, r))
+            continue
+        if r["current_price"] is None:
+            # 抓取失败不覆盖上次的有效结果；一直无数据的行只同步评分，不产生事件
+            if old.get("current_price") is None:
+                fresh.append(r)
+                if r["confluence_score"] != old.get("confluence_score"):
+                    changed.append(r)
+            continue
+        fresh.append(r)
+        n = len(events)
+        if r["in_zone"] != bool(old.get("in_zone")):
+            events.append(("zone_enter" if r["in_zone"] else "zone_exit",
+                           bool(old.get("in_zone")), r["in_zone"], r))
+        if r["nearest_fibo"] != old.get("nearest_fibo"):
+            events.append(("fibo", old.get("nearest_fibo"), r["nearest_fibo"], r))
+        if r["confluence_score"] != old.get("confluence_score"):
+            events.append(("score", old.get("confluence_score"),
+                           r["confluence_score"], r))
+        if len(events) > n:
+            changed.append(r)
+    events_out = [{"session_id": r["session_id"], "scan_date": r["scan_date"],
+                   "ticker": r["ticker"], "name": r["name"],
+                   "timeframe": r["timeframe"], "kind": kind,
+                   "from": old_v, "to": new_v, "price": r["current_price"]}
+                  for kind, old_v, new_v, r in events]
+    return fresh, changed, events_out
+
+
+def new_session(assets: Dict, cfg: Dict,
+                note: str = "manual") -> Tuple[Dict, Dict]:
+    """生成会话行与续扫参数（品种表 + 影响计算结果的配置）。"""
+    now        = datetime.now()
+    session_id = (now.strftime("%Y%m%d_%H%M%S_") +
+                  hashlib.md5(f"{now.isoformat()}{id(assets)}".encode()).hexdigest()[:6])
+    session_row = {
+        "session_id":   session_id,
+        "scan_date":    str(now.date()),
+        "scan_time":    now.isoformat(timespec="seconds"),
+        "total_checks": 0,
+        "inzone_count": 0,
+        "triple_conf":  0,
+        "duration_ms":  0,
+        "data_source":  cfg.get("data_source", "auto"),
+        "note":         note,
+        "asset_count":  len(assets),
+        "tf_count":     len(active_timeframes(cfg)),
+        "calc":         [int(cfg.get("lookback", 100)), float(cfg.get("fibo_low", 0.5)),
+                         float(cfg.get("fibo_high", 0.618))],
+        "status":       "running",
+    }
+    if cfg.get("scan_delta"):
+        session_row.update({"mode": "delta", "changed": 0, "events": 0})
+    params = {
+        "assets":    {t: list(v) for t, v in assets.items()},
+        "lookback":  int(cfg.get("lookback", 100)),
+        "fibo_low":  float(cfg.get("fibo_low",  0.5)),
+        "fibo_high": float(cfg.get("fibo_high", 0.618)),
+        "timeframes": active_timeframes(cfg),
+        "delta":     bool(cfg.get("scan_delta")),
+    }
+    return session_row, params
+
+
+# ════════════════════════════════════════════════════════════════════
+# 扫描计划：按价值排序品种，休市且无新数据的品种跳过
+#   价值 = stale × 缓存陈旧度 + zone × 接近黄金区间程度 + watch × 自选收藏
+#   • 陈旧度：各底层序列 age / TTL 的均值（封顶 1，无缓存 = 1）
+#   • 接近程度：上次结果任一框架在区间内 = 1，否则 exp(-最小|dist_pct| / watch_dist)，
+#     从未扫描 = 0.5
+#   • 休市跳过：A 股 / 港股 / 美股不在交易时段，且上次扫描（相同 lookback / 区间）
+#     与各序列的缓存拉取都晚于最近一次收盘
+# ════════════════════════════════════════════════════════════════════
+_PLAN_WEIGHTS = {"stale": 1.0, "zone": 2.0, "watch": 3.0}
+
+
+def _session_epochs() -> Dict[str, Tuple[float, Optional[list]]]:
+    """session_id → (扫描开始时间戳, 计算参数)。"""
+    out = {}
+    for s in storage.load_sessions(limit=200):
+        try:
+            out[s["session_id"]] = (datetime.fromisoformat(s["scan_time"]).timestamp(),
+                                    s.get("calc"))
+        except Exception:
+            continue
+    return out
+
+
+def _plan_entry(ticker:   str,
+                cfg:      Dict,
+                rows:     Dict[str, Dict],
+                sessions: Dict[str, Tuple[float, Optional[list]]],
+                calc:     list,
+                watch:    bool,
+                now:      float) -> Tuple[float, Optional[str]]:
+    """返回 (价值, 跳过原因或 None)。"""
+    weights = {**_PLAN_WEIGHTS, **(cfg.get("scan_plan_weights") or {})}
+    use_cache = cfg.get("bar_cache", True)
+    series = [interval for interval, _ in _series_needed(ticker, cfg)]
+    ages   = [bar_cache.age(ticker, iv) if use_cache else None for iv in series]
+
+    market = market_of(ticker)
+    if market is not None and not spot.is_open(market):
+        close = spot.last_close(market).timestamp()
+        scans = [sessions.get(rows[tf]["session_id"]) if tf in rows else None
+                 for tf in active_timeframes(cfg)]
+        if (all(sc is not None and sc[0] >= close and sc[1] == calc for sc in scans)
+                and (not use_cache
+                     or all(a is not None and now - a >= close for a in ages))):
+            return 0.0, "closed"
+
+    stale = (sum(1.0 if a is None else min(a / bar_cache.ttl_for(iv, cfg), 1.0)
+                 for a, iv in zip(ages, series)) / max(len(series), 1))
+    if not rows:
+        zone = 0.5
+    elif any(r.get("in_zone") for r in rows.values()):
+        zone = 1.0
+    else:
+        dists = [abs(r["dist_pct"]) for r in rows.values() if r.get("dist_pct") is not None]
+        scale = max(float(cfg.get("watch_dist", 5.0)), 1e-6)
+        zone  = math.exp(-min(dists) / scale) if dists else 0.0
+    value = (weights["stale"] * stale + weights["zone"] * zone
+             + weights["watch"] * (1.0 if watch else 0.0))
+    return value, None
+
+
+def plan_scan(assets: Dict, cfg: Dict) -> Tuple[Dict, Dict[str, str]]:
+    """
+    返回 (按价值降序排列的 assets, {跳过的 ticker: 原因})。
+    扫描线程池按提交顺序领取任务，排在前面的品种先完成；
+    配合时间预算（run_full_scan 的 budget_s）可先完成最有价值的部分。
+    """
+    latest: Dict[str, Dict[str, Dict]] = {}
+    for r in storage.load_latest_results():
+        if r["ticker"] in assets:
+            latest.setdefault(r["ticker"], {})[r["timeframe"]] = r
+    sessions = _session_epochs()
+    watch    = {w["ticker"] for w in storage.load_watchlist()}
+    calc     = [int(cfg.get("lookback", 100)), float(cfg.get("fibo_low", 0.5)),
+                float(cfg.get("fibo_high", 0.618))]
+    now      = time.time()
+
+    scored: List[Tuple[float, str]] = []
+    skipped: Dict[str, str] = {}
+    for ticker in assets:
+        value, reason = _plan_entry(ticker, cfg, latest.get(ticker, {}), sessions,
+                                    calc, ticker in watch, now)
+        if reason:
+            skipped[ticker] = reason
+        else:
+            scored.append((value, ticker))
+    scored.sort(key=lambda x: -x[0])
+    return {t: assets[t] for _, t in scored}, skipped
+
+
 def run_full_scan(
     cfg:               Optional[Dict]     = None,
     assets:            Optional[Dict]     = None,
     note:              str                = "manual",
     progress_callback: Optional[Callable] = None,
+    delta:             Optional[bool]     = None,
+    budget_s:          Optional[float]    = None,
+    plan:              Optional[bool]     = None,
 ) -> Tuple[Optional[Dict], Optional[str]]:
+    """
+    全量扫描。delta=True（或 cfg["scan_delta"]）时为增量模式：仍计算全部
+    (ticker, timeframe) 并刷新 latest，但历史只写入状态有变化的行并记录 events，
+    告警只在进入区间时触发。
+    cfg["spot_refresh"] 开启时先用全市场行情更新已缓存日线，这些品种不再逐个请求。
+    plan=True（缺省 cfg["scan_plan"]）时按 plan_scan 排序并跳过休市无新数据的品种，
+    全部跳过时不创建会话，返回 session_id=None、skipped=跳过数 的摘要；
+    budget_s（缺省 cfg["scan_budget_min"] 分钟，≤0 不限）到时停止，
+    已完成的品种照常写入并结束会话，其余记为 deferred，留给下次扫描。
+    """
+    cfg    = cfg    or storage.load_config()
+    assets = assets or ASSETS
+    if delta is not None:
+        cfg = {**cfg, "scan_delta": bool(delta)}
+    if plan is None:
+        plan = bool(cfg.get("scan_plan"))
+    if budget_s is None:
+        budget_s = float(cfg.get("scan_budget_min", 0) or 0) * 60
+    if cfg.get("spot_refresh") and cfg.get("bar_cache", True):
+        if progress_callback:
+            progress_callback(0.0, "📡 全市场行情更新缓存日线…")
+        refresh_from_spot(list(assets))
+
+    skipped: Dict[str, str] = {}
+    if plan:
+        assets, skipped = plan_scan(assets, cfg)
+        logger.info(f"plan_scan: {len(assets)} 个品种按价值排序，"
+                    f"{len(skipped)} 个休市无新数据跳过")
+        if not assets:
+            return {"session_id": None, "scan_date": str(datetime.now().date()),
+                    "total_checks": 0, "inzone_count": 0, "triple_conf": 0,
+                    "elapsed_ms": 0, "asset_count": 0, "skipped": len(skipped)}, None
+
+    session_row, params = new_session(assets, cfg, note)
+    if plan:
+        session_row["skipped"] = len(skipped)
+    if not storage.begin_session(session_row, params):
+        return None, "❌ 写入本地数据库失败"
+    deadline = time.time() + budget_s if budget_s > 0 else None
+    return _run_session(cfg, assets, session_row, params, {}, progress_callback,
+                        deadline=deadline)
+
+
+def resume_scan(
+    session_id:        str,
+    cfg:               Optional[Dict]     = None,
+    progress_callback: Optional[Callable] = None,
+) -> Tuple[Optional[Dict], Optional[str]]:
+    """
+    续扫中断的会话：只抓取检查点中缺失的 (ticker, timeframe)。
+    storage.RESUME_IDLE_S 内仍有心跳的会话视为正在运行，拒绝续扫。
+    """
+    ckpt = storage.load_checkpoint(session_id)
+    if ckpt is None:
+        return None, f"❌ 会话 {session_id} 不存在或已完成"
+    if ckpt["session"].get("queue"):
+        return None, (f"❌ 会话 {session_id} 属于任务队列，"
+                      f"请用 jobqueue.requeue_failed 后重新运行 worker")
+    if not storage.session_idle(ckpt["session"]):
+        return None, f"❌ 会话 {session_id} 仍在运行，请稍后再续扫"
+    storage.touch_session(session_id)      # 立即占用，其他页面 / 进程不再列出
+    cfg    = cfg or storage.load_config()
+    params = ckpt["params"]
+    assets = {t: tuple(v) for t, v in params["assets"].items()}
+    return _run_session(cfg, assets, ckpt["session"], params, ckpt["done"],
+                        progress_callback)
+
 
+def _fibo_from_row(r: Dict) -> Optional[Dict]:
+    """latest 表中的结果行还原为 compute_fibo 的结构；无有效结果返回 None。"""
+    if r.get("current_price") is None:
+        return None
+    return {
+        "swing_high":   r["swing_high"],
+        "swing_low":    r["swing_low"],
+        "current":      r["current_price"],
+        "retrace_pct":  r["retrace_pct"],
+        "zone_top":     r["zone_top"],
+        "zone_bot":     r["zone_bot"],
+        "in_zone":      bool(r["in_zone"]),
+        "nearest_fibo": r["nearest_fibo"],
+        "dist_pct":     r["dist_pct"],
+    }
+
+
+def run_intraday_scan(
+    cfg:               Optional[Dict]     = None,
+    assets:            Optional[Dict]     = None,
+    note:              str                = "intraday",
+    progress_callback: Optional[Callable] = None,
+) -> Tuple[Optional[Dict], Optional[str]]:
+    """
+    日内复扫：只抓取 cfg["timeframes"] 中的日内框架；日 / 周 / 月线沿用 latest 表中
+    intraday_reuse_days 天内的结果参与共振评分，没有可沿用结果的高周期照常抓取。
+    """
     cfg    = cfg    or storage.load_config()
     assets = assets or ASSETS
+    tfs    = active_timeframes(cfg)
+    if not any(tf in INTRADAY_TIMEFRAMES for tf in tfs):
+        return None, "❌ 未启用日内框架（cfg[\"timeframes\"]）"
 
-    lookback = int(cfg.get("lookback", 100))
-    zone_lo  = float(cfg.get("fibo_low",  0.5))
-    zone_hi  = float(cfg.get("fibo_high", 0.618))
+    keep   = max(0, int(cfg.get("intraday_reuse_days", 1)))
+    cutoff = str((datetime.now() - timedelta(days=keep)).date())
+    reuse: Dict[str, Dict[str, Optional[Dict]]] = {}
+    for r in storage.load_latest_results():
+        tf = r.get("timeframe")
+        if (tf in tfs and tf not in INTRADAY_TIMEFRAMES and r.get("ticker") in assets
+                and (r.get("scan_date") or "") >= cutoff):
+            reuse.setdefault(r["ticker"], {})[tf] = _fibo_from_row(r)
 
-    now        = datetime.now()
-    scan_date  = str(now.date())
-    session_id = (now.strftime("%Y%m%d_%H%M%S_") +
-                  hashlib.md5(now.isoformat().encode()).hexdigest()[:6])
-
-    t0          = time.time()
-    total_items = len(assets) * len(TIMEFRAMES)
-    done        = 0
-    tf_map: Dict[str, Dict[str, Optional[Dict]]] = {t: {} for t in assets}
-
-    for ticker, (name, category) in assets.items():
-        for tf_name, (interval, period) in TIMEFRAMES.items():
-            if progress_callback:
-                progress_callback(done / total_items,
-                                  f"🔍 {name} ({ticker}) · {tf_name}")
-            df   = fetch_data(ticker, interval, period, cfg)
-            fibo = compute_fibo(df, lookback, zone_lo, zone_hi)
-            tf_map[ticker][tf_name] = fibo
-            done += 1
+    session_row, params = new_session(assets, cfg, note)
+    if not storage.begin_session(session_row, params):
+        return None, "❌ 写入本地数据库失败"
+    return _run_session(cfg, assets, session_row, params, {}, progress_callback,
+                        reuse=reuse)
+
+
+def intraday_loop(
+    cfg:               Optional[Dict]            = None,
+    stop:              Optional[threading.Event] = None,
+    progress_callback: Optional[Callable]        = None,
+) -> None:
+    """按 cfg["intraday_interval_min"] 周期执行 run_intraday_scan，直到 stop 被置位。"""
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        t0  = time.monotonic()
+        run_cfg = cfg or storage.load_config()   # 未指定时每轮重新读取配置
+        summary, err = run_intraday_scan(run_cfg, progress_callback=progress_callback)
+        if err:
+            logger.warning(f"intraday scan: {err}")
+        else:
+            logger.info(f"intraday scan {summary['session_id']}: "
+                        f"{summary['inzone_count']} in zone, {summary['elapsed_ms']}ms")
+        period = max(1.0, float(run_cfg.get("intraday_interval_min", 60))) * 60
+        stop.wait(max(0.0, period - (time.monotonic() - t0)))
+
+
+# A 股代码首位 → 交易所后缀（用于把 .SS / .SZ 品种对到全市场行情表，
+# 避免 000001.SS 上证指数误配 000001 平安银行）
+_A_EXCH = {"6": "SS", "9": "SS", "0": "SZ", "2": "SZ", "3": "SZ"}
+
+
+def _spot_key(ticker: str) -> Optional[Tuple[str, str]]:
+    """品种在 spot 行情表中的 (market, code)；无批量行情的品种返回 None。"""
+    t = ticker.strip().upper()
+    kind = _ticker_type(t)
+    if kind == "a_bare":
+        return "a", t
+    if kind == "a_share":
+        code, _, exch = t.partition(".")
+        exch = "SS" if exch == "SH" else exch
+        return ("a", code) if _A_EXCH.get(code[0]) == exch else None
+    if kind == "hk_stock":
+        return "hk", t[:-3].zfill(5)
+    if kind == "us_stock":
+        return "us", t
+    return None
 
+
+_MARKETS = {"a_bare": "a", "a_share": "a", "hk_stock": "hk", "us_stock": "us"}
+
+
+def market_of(ticker: str) -> Optional[str]:
+    """品种所属的有固定交易时段的市场（spot.MARKETS）；外汇 / 期货 / 加密等返回 None。"""
+    return _MARKETS.get(_ticker_type(ticker.strip().upper()))
+
+
+def refresh_from_spot(tickers: Optional[List[str]] = None,
+                      max_age: float = spot.DEFAULT_AGE) -> List[str]:
+    """
+    用全市场行情快照一次性更新已缓存日线的最后一根 K 线（每个市场一次请求，
+    代替逐个品种的 *_hist 增量请求）。tickers=None 表示全部已缓存日线。
+    只处理缓存已接到上一个交易日的序列，返回成功更新的品种；
+    昨收与缓存收盘价不一致（除权除息）的序列标记过期，由 fetch_data 重新下载。
+    """
+    keys = {t: _spot_key(t) for t in (tickers if tickers is not None
+                                      else bar_cache.tickers("1d"))}
+    keys = {t: k for t, k in keys.items() if k is not None}
+    markets = {m for m, _ in keys.values()}
+    quotes  = {m: spot.fetch(m, max_age) for m in markets}
+    days    = {m: spot.trade_date(m) for m in markets}
+
+    updated: List[str] = []
+    for ticker, (market, code) in keys.items():
+        table = quotes.get(market)
+        if table is None or code not in table.index:
+            continue
+        o, h, l, c, pc = (float(x) for x in
+                          table.loc[code, ["open", "high", "low", "last", "prev_close"]])
+        if math.isnan(o) or o <= 0:
+            o = c
+        if not (h >= max(o, c) and 0 < l <= min(o, c)):
+            continue
+        if bar_cache.put_last_bar(ticker, "1d", days[market], (o, h, l, c), pc):
+            updated.append(ticker)
+    logger.info(f"refresh_from_spot: {len(keys)} 个品种，更新 {len(updated)} 条日线")
+    return updated
+
+
+def quick_rescan(
+    cfg:               Optional[Dict]     = None,
+    assets:            Optional[Dict]     = None,
+    note:              str                = "quick",
+    progress_callback: Optional[Callable] = None,
+) -> Tuple[Optional[Dict], Optional[str]]:
+    """
+    快速复扫：A 股 / 港股 / 美股每个市场只请求一次全市场行情（spot.fetch），
+    用 latest 表中缓存的波段高低点和现价重算 in_zone / dist_pct。
+    以下品种照常抓取历史 K 线完整计算：
+      • 当日最高 / 最低突破缓存的波段区间（波段本身变了）
+      • 没有缓存结果、不在行情表中（外汇 / 期货 / 指数 / 加密等）
+    突破区间的品种先用同一份行情更新缓存日线（refresh_from_spot），
+    无法更新的序列标记过期，保证取到当日数据。
+    注意：缓存波段不反映旧 K 线移出 lookback 窗口的变化，需定期全量扫描校正。
+    """
+    cfg     = cfg    or storage.load_config()
+    assets  = assets or ASSETS
+    tfs     = active_timeframes(cfg)
+    zone_lo = float(cfg.get("fibo_low",  0.5))
+    zone_hi = float(cfg.get("fibo_high", 0.618))
+
+    keys = {t: _spot_key(t) for t in assets}
+    keys = {t: k for t, k in keys.items() if k is not None}
     if progress_callback:
-        progress_callback(0.95, "💾 计算共振评分并保存…")
-
-    conf_map = {t: confluence_score(tf_map[t]) for t in assets}
-
-    result_rows: List[Dict] = []
-    for ticker, (name, category) in assets.items():
-        conf = conf_map[ticker]
-        for tf_name in TIMEFRAMES:
-            fibo = tf_map[ticker].get(tf_name)
-            result_rows.append({
-                "session_id":       session_id,
-                "scan_date":        scan_date,
-                "ticker":           ticker,
-                "name":             name,
-                "category":         category,
-                "timeframe":        tf_name,
-                "in_zone":          bool(fibo and fibo["in_zone"]),
-                "current_price":    fibo["current"]      if fibo else None,
-                "swing_high":       fibo["swing_high"]   if fibo else None,
-                "swing_low":        fibo["swing_low"]    if fibo else None,
-                "zone_top":         fibo["zone_top"]     if fibo else None,
-                "zone_bot":         fibo["zone_bot"]     if fibo else None,
-                "retrace_pct":      fibo["retrace_pct"]  if fibo else None,
-                "dist_pct":         fibo["dist_pct"]     if fibo else None,
-                "nearest_fibo":     fibo["nearest_fibo"] if fibo else None,
-                "confluence_score": conf["score"],
-                "confluence_label": conf["label"],
-                "tv_symbol":        tv_symbol(ticker),
-                "tv_url":           tv_url(ticker),
-            })
-
-    elapsed_ms   = int((time.time() - t0) * 1000)
-    inzone_count = sum(1 for r in result_rows if r["in_zone"])
-    triple_conf  = sum(1 for t in assets if len(conf_map[t]["in_tfs"]) == 3)
+        progress_callback(0.0, f"📡 拉取全市场行情（{len(keys)} 个品种）…")
+    quotes = {m: spot.fetch(m) for m in {m for m, _ in keys.values()}}
+    latest = {(r["ticker"], r["timeframe"]): r for r in storage.load_latest_results()}
+
+    reuse: Dict[str, Dict[str, Optional[Dict]]] = {}
+    broken: List[str] = []
+    for ticker, (market, code) in keys.items():
+        table = quotes.get(market)
+        if table is None or code not in table.index:
+            continue
+        last, high, low = (float(x) for x in table.loc[code, ["last", "high", "low"]])
+        fibos: Dict[str, Optional[Dict]] = {}
+        for tf in tfs:
+            r = latest.get((ticker, tf))
+            if r is None or r.get("swing_high") is None:
+                break
+            if high > r["swing_high"] or low < r["swing_low"]:
+                broken.append(ticker)
+                break
+            fibos[tf] = fibo_from_swing(float(r["swing_high"]), float(r["swing_low"]),
+                                        last, zone_lo, zone_hi)
+        else:
+            reuse[ticker] = fibos
+
+    patched = set(refresh_from_spot(broken))
+    for ticker in broken:
+        for tf in tfs:
+            interval = _base_series(ticker, tf, cfg)[0]
+            if not (ticker in patched and interval == "1d"):
+                bar_cache.expire(ticker, interval)
+    logger.info(f"quick_rescan: {len(reuse)} 个品种按现价重算，"
+                f"{len(assets) - len(reuse)} 个完整抓取（其中 {len(broken)} 个突破波段）")
+
+    session_row, params = new_session(assets, cfg, note)
+    if not storage.begin_session(session_row, params):
+        return None, "❌ 写入本地数据库失败"
+    return _run_session(cfg, assets, session_row, params, {}, progress_callback,
+                        reuse=reuse)
+
+
+def scan_unit(
+    session_id: str,
+    tickers:    List[str],
+    cfg:        Optional[Dict]               = None,
+    heartbeat:  Optional[Callable[..., bool]] = None,
+) -> Tuple[Optional[Dict], Optional[str]]:
+    """
+    扫描会话中的一个工作单元（jobqueue 分布式 worker 使用）。
+    结果直接写入存储，但不更新会话行与检查点——会话计数由协调者汇总，
+    失败或租约丢失的单元会被整体重新分配。heartbeat() 返回 False 时中止；
+    每次写库前以 heartbeat(True) 强制续约，租约已被接管则不再写入。
+    """
+    ckpt = storage.load_checkpoint(session_id)
+    if ckpt is None:
+        return None, f"❌ 会话 {session_id} 不存在或已完成"
+    cfg    = cfg or storage.load_config()
+    all_assets = ckpt["params"]["assets"]
+    assets = {t: tuple(all_assets[t]) for t in tickers if t in all_assets}
+    unit_row = {**ckpt["session"], "total_checks": 0, "inzone_count": 0,
+                "triple_conf": 0, "duration_ms": 0}
+    if "changed" in unit_row:
+        unit_row.update({"changed": 0, "events": 0})
+    return _run_session(cfg, assets, unit_row, ckpt["params"], {},
+                        finish=False, heartbeat=heartbeat)
 
-    session_row = {
-        "session_id":   session_id,
-        "scan_date":    scan_date,
-        "scan_time":    now.isoformat(timespec="seconds"),
-        "total_checks": len(result_rows),
-        "inzone_count": inzone_count,
-        "triple_conf":  triple_conf,
-        "duration_ms":  elapsed_ms,
-        "data_source":  cfg.get("data_source", "auto"),
-        "note":         note,
-        "asset_count":  len(assets),
-    }
 
-    ok = storage.save_scan(session_row, result_rows)
-    if not ok:
-        return None, "❌ 写入本地 JSON 失败"
+def _run_session(cfg:               Dict,
+                 assets:            Dict,
+                 session_row:       Dict,
+                 params:            Dict,
+                 done_map:          Dict[str, Dict[str, Optional[Dict]]],
+                 progress_callback: Optional[Callable] = None,
+                 finish:            bool = True,
+                 heartbeat:         Optional[Callable[..., bool]] = None,
+                 reuse:             Optional[Dict[str, Dict[str, Optional[Dict]]]] = None,
+                 deadline:          Optional[float] = None,
+                 ) -> Tuple[Optional[Dict], Optional[str]]:
+    """
+    扫描主循环。finish=False 为工作单元模式：只写结果行，
+    不写会话行 / 检查点，也不结束会话。
+    done_map 为检查点中已落库的结果；reuse 为不需抓取、直接沿用的结果
+    （日内复扫的高周期、快速复扫的现价重算），与抓取结果一样评分、写入。
+    deadline（time.time() 时间戳）到达后不再等待抓取，已完成的品种照常写入并结束会话，
+    未完成的品种计入 deferred。
+    """
+    datasource.configure(cfg)
 
-    for ticker, (name, _) in assets.items():
-        for tf_name in TIMEFRAMES:
-            fibo = tf_map[ticker].get(tf_name)
-            if fibo and fibo["in_zone"]:
+    # 框架列表随会话保存，续扫 / 工作单元与发起时一致
+    tf_list    = params.get("timeframes") or list(TIMEFRAMES)
+    cfg        = {**cfg, "timeframes": tf_list}
+    lookback   = int(params["lookback"])
+    zone_lo    = float(params["fibo_low"])
+    zone_hi    = float(params["fibo_high"])
+    flush_n    = max(1, int(cfg.get("flush_batch", _FLUSH_TICKERS)))
+    delta      = bool(params.get("delta"))
+    session_id = session_row["session_id"]
+    scan_date  = session_row["scan_date"]
+
+    # 续扫时耗时接着上次累计
+    t0          = time.time() - session_row.get("duration_ms", 0) / 1000
+    total_items = len(assets) * len(tf_list)
+
+    batch_rows: List[Dict] = []
+    batch_latest: List[Dict] = []      # 增量模式：latest 全量刷新，历史只写变化行
+    batch_alerts: List[Tuple[str, str, str, Dict, Dict]] = []
+    batch_ckpt: List[Tuple[str, str, Optional[Dict]]] = []
+    batch_events: List[Dict] = []
+
+    # 进行中的品种：预先按框架顺序占位，齐全后评分并移出
+    # 检查点中已完成全部框架的品种已落库，只恢复部分完成的品种；
+    # 沿用的结果写入检查点，续扫时视同已完成
+    reuse = reuse or {}
+    open_tfs: Dict[str, Dict[str, Optional[Dict]]] = {}
+    remaining: Dict[str, int] = {}
+    todo: Dict[str, List[str]] = {}
+    ready: List[str] = []          # 沿用结果已齐全、无需抓取的品种
+    for ticker in assets:
+        stored  = done_map.get(ticker, {})
+        seeded  = {tf: f for tf, f in reuse.get(ticker, {}).items()
+                   if tf in tf_list and tf not in stored}
+        prev    = {**seeded, **stored}
+        missing = [tf for tf in tf_list if tf not in prev]
+        if not missing and not seeded:
+            continue
+        batch_ckpt.extend((ticker, tf, f) for tf, f in seeded.items())
+        if missing:
+            todo[ticker] = missing
+        else:
+            ready.append(ticker)
+        if prev:
+            open_tfs[ticker] = {tf: prev.get(tf) for tf in tf_list}
+            remaining[ticker] = len(missing)
+    done = total_items - sum(len(v) for v in todo.values())
+    # 增量模式的比较基准：各 (ticker, timeframe) 上次的最新结果
+    prev_state = ({(r["ticker"], r["timeframe"]): r
+                   for r in storage.load_latest_results()} if delta else {})
+    if delta:
+        session_row.setdefault("changed", 0)
+        session_row.setdefault("events", 0)
+
+    def _flush() -> Optional[str]:
+        """写入当前微批，失败返回错误信息。"""
+        if heartbeat is not None and not heartbeat(True):
+            return "❌ 工作单元租约已失效"
+        session_row["duration_ms"] = int((time.time() - t0) * 1000)
+        latest = batch_latest if delta else None
+        if finish:
+            ok = storage.append_results(batch_rows, session_row, batch_ckpt,
+                                        batch_events, latest)
+        else:
+            ok = storage.append_results(batch_rows, events=batch_events,
+                                        latest_rows=latest)
+        if ok:
+            for ticker, name, tf_name, fibo, conf in batch_alerts:
                 dispatch_alerts(ticker=ticker, name=name, timeframe=tf_name,
-                                fibo=fibo, conf=conf_map[ticker], cfg=cfg)
+                                fibo=fibo, conf=conf, cfg=cfg)
+        batch_rows.clear()
+        batch_latest.clear()
+        batch_alerts.clear()
+        batch_ckpt.clear()
+        batch_events.clear()
+        return None if ok else "❌ 写入本地数据库失败"
+
+    scan_assets = {t: assets[t] for t in todo}
+    processes   = min(_process_count(cfg), max(1, len(scan_assets)))
+    if processes > 1:
+        results = _iter_scan_results_mp(scan_assets, cfg, lookback, zone_lo,
+                                        zone_hi, todo, processes, deadline)
+    else:
+        prefetched = _prefetch_yfinance(scan_assets, cfg, progress_callback, deadline)
+        if finish:
+            storage.touch_session(session_id)
+        results = _iter_scan_results(scan_assets, cfg, lookback, zone_lo,
+                                     zone_hi, prefetched, todo, deadline)
+
+    if progress_callback:
+        msg = (f"🔍 扫描 {len(scan_assets)} 个品种（沿用已有结果 {done} 项）…" if done
+               else f"🔍 开始扫描 {len(assets)} 个品种…")
+        if processes > 1:
+            msg += f"（{processes} 进程）"
+        progress_callback(done / max(total_items, 1) * 0.95, msg)
+
+    pending_tickers = 0
+    completed: set = set()
+
+    def _complete(ticker: str) -> Optional[str]:
+        """该品种所有框架完成 → 评分、入批；到达微批大小时写库（失败返回错误信息）。"""
+        nonlocal pending_tickers
+        del remaining[ticker]
+        completed.add(ticker)
+        tfs  = open_tfs.pop(ticker)
+        conf = confluence_score(tfs)
+        name, category = assets[ticker]
+        rows = _result_rows(ticker, name, category, tfs, conf, session_id, scan_date)
+        session_row["total_checks"] += len(rows)
+        session_row["inzone_count"] += sum(1 for r in rows if r["in_zone"])
+        if len(conf["in_tfs"]) >= 3:
+            session_row["triple_conf"] += 1
+        if delta:
+            fresh, rows, events = _delta_rows(rows, prev_state)
+            batch_latest.extend(fresh)
+            session_row["changed"] += len(rows)
+            session_row["events"]  += len(events)
+            batch_events.extend(events)
+            entered = {e["timeframe"] for e in events if e["kind"] == "zone_enter"}
+            batch_alerts.extend((ticker, name, tf, f, conf)
+                                for tf, f in tfs.items() if tf in entered)
+        else:
+            batch_alerts.extend((ticker, name, tf, f, conf)
+                                for tf, f in tfs.items() if f and f["in_zone"])
+        batch_rows.extend(rows)
+        pending_tickers += 1
+        if pending_tickers >= flush_n:
+            pending_tickers = 0
+            return _flush()
+        return None
+
+    for ticker in ready:
+        err = _complete(ticker)
+        if err:
+            return None, err
+
+    touched = time.time()
+    for ticker, tf_name, fibo in results:
+        tfs = open_tfs.setdefault(ticker, {tf: None for tf in tf_list})
+        tfs[tf_name] = fibo
+        remaining[ticker] = remaining.get(ticker, len(tf_list)) - 1
+        batch_ckpt.append((ticker, tf_name, fibo))
+        done += 1
+        if finish and time.time() - touched >= _HEARTBEAT_S:
+            storage.touch_session(session_id)    # 微批之间间隔较长时保持心跳
+            touched = time.time()
+        if heartbeat is not None and not heartbeat():
+            return None, "❌ 工作单元租约已失效"
+        if progress_callback:
+            name = assets[ticker][0]
+            progress_callback(done / total_items * 0.95,
+                              f"🔍 {name} ({ticker}) · {tf_name} "
+                              f"[{done}/{total_items}]")
+        if remaining[ticker] > 0:
+            continue
+        err = _complete(ticker)
+        if err:
+            return None, err
+
+    deferred = [t for t in todo if t not in completed]
+    stopped  = bool(deferred) and deadline is not None and time.time() >= deadline
+    if stopped:
+        session_row["deferred"] = len(deferred)
+        logger.info(f"扫描时间预算用尽：{len(deferred)} 个品种顺延到下次扫描")
+
+    if progress_callback:
+        progress_callback(0.95, "💾 保存剩余结果…")
+
+    if batch_rows or batch_latest or batch_ckpt or batch_events:
+        err = _flush()
+        if err:
+            return None, err
+
+    if not stopped and (remaining or done < total_items):
+        # 分片进程异常退出：保留检查点，会话保持 running 以便续扫
+        return None, (f"❌ 部分品种未完成（{done}/{total_items}），"
+                      f"可续扫会话 {session_id}")
+
+    session_row["duration_ms"] = elapsed_ms = int((time.time() - t0) * 1000)
+    if finish:
+        storage.finish_session(session_row)
 
     if progress_callback:
         progress_callback(1.0, "✅ 扫描完成！")
@@ -505,9 +1879,12 @@ def run_full_scan(
     return {
         "session_id":   session_id,
         "scan_date":    scan_date,
-        "total_checks": len(result_rows),
-        "inzone_count": inzone_count,
-        "triple_conf":  triple_conf,
+        "total_checks": session_row["total_checks"],
+        "inzone_count": session_row["inzone_count"],
+        "triple_conf":  session_row["triple_conf"],
         "elapsed_ms":   elapsed_ms,
         "asset_count":  len(assets),
+        **({"changed": session_row["changed"], "events": session_row["events"]}
+           if delta else {}),
+        **{k: session_row[k] for k in ("skipped", "deferred") if k in session_row},
     }, None
@@ -32,14 +32,15 @@ def start_scheduler_if_needed() -> bool:
         try:
             from apscheduler.schedulers.background import BackgroundScheduler
             from apscheduler.triggers.cron import CronTrigger
+            from apscheduler.triggers.interval import IntervalTrigger
         except ImportError:
             logging.warning("APScheduler not installed: pip install apscheduler")
             return False
 
-        from core.supabase_client import load_config
+        from storage import load_config
 
         cfg = load_config()
-        if not cfg.get("scan_enabled"):
+        if not cfg.get("scan_enabled") and not cfg.get("intraday_enabled"):
             return False
 
         hour   = int(cfg.get("scan_hour",   9))
@@ -49,12 +50,22 @@ def start_scheduler_if_needed() -> bool:
             timezone="Asia/Shanghai",
             job_defaults={"misfire_grace_time": 300, "coalesce": True},
         )
-        _scheduler.add_job(
-            _run_scheduled_scan,
-            CronTrigger(hour=hour, minute=minute, timezone="Asia/Shanghai"),
-            id="daily_fibo_scan",
-            replace_existing=True,
-        )
+        if cfg.get("scan_enabled"):
+            _scheduler.add_job(
+                _run_scheduled_scan,
+                CronTrigger(hour=hour, minute=minute, timezone="Asia/Shanghai"),
+                id="daily_fibo_scan",
+                replace_existing=True,
+            )
+        if cfg.get("intraday_enabled"):
+            # 日内复扫：只刷新日内框架，高周期沿用最近结果（见 scanner.run_intraday_scan）
+            _scheduler.add_job(
+                _run_intraday_scan,
+                IntervalTrigger(minutes=int(cfg.get("intraday_interval_min", 60))),
+                id="intraday_fibo_scan",
+                replace_existing=True,
+                max_instances=1,
+            )
         _scheduler.start()
         _started = True
         logging.info(f"Scheduler started: daily at {hour:02d}:{minute:02d} CST")
@@ -91,13 +102,41 @@ def _run_scheduled_scan() -> None:
     """定时任务执行体"""
     logging.info(f"[Scheduler] 定时扫描启动: {datetime.now().strftime('%Y-%m-%d %H:%M')}")
     try:
-        from core.scanner import run_full_scan
-        from core.supabase_client import load_config
+        import universe
+        from scanner import run_full_scan
+        from storage import load_config
+
+        # 顺带刷新全市场品种快照（UI / 扫描共用，见 universe.py）
+        counts = universe.refresh_all()
+        logging.info(f"[Scheduler] 品种快照已刷新: {counts}")
+
         cfg = load_config()
         summary, err = run_full_scan(cfg=cfg, note="scheduled")
         if err:
             logging.error(f"[Scheduler] 扫描失败: {err}")
+        elif summary["session_id"] is None:
+            # 扫描计划：全部品种休市且收盘后已扫描过，不创建会话
+            logging.info(f"[Scheduler] 全部品种休市且无新数据，本次跳过 "
+                         f"({summary.get('skipped', 0)} 个品种)")
         else:
-            logging.info(f"[Scheduler] 扫描完成: {summary['note']}")
+            logging.info(f"[Scheduler] 扫描完成: {summary['session_id']} "
+                         f"(休市跳过 {summary.get('skipped', 0)}，"
+                         f"顺延 {summary.get('deferred', 0)})")
     except Exception as e:
         logging.exception(f"[Scheduler] 异常: {e}")
+
+
+def _run_intraday_scan() -> None:
+    """日内复扫任务执行体"""
+    try:
+        from scanner import run_intraday_scan
+        from storage import load_config
+
+        summary, err = run_intraday_scan(cfg=load_config(), note="intraday")
+        if err:
+            logging.error(f"[Scheduler] 日内复扫失败: {err}")
+        else:
+            logging.info(f"[Scheduler] 日内复扫完成: {summary['session_id']} "
+                         f"({summary['elapsed_ms']}ms)")
+    except Exception as e:
+        logging.exception(f"[Scheduler] 日内复扫异常: {e}")
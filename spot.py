@@ -0,0 +1,217 @@
+"""
+spot.py — 全市场实时行情快照（东方财富批量接口，每个市场一次请求）
+文件：
+  data_spot/<market>.parquet — 列 code, last, open, high, low, prev_close, volume
+  data_spot/<market>.json    — 元数据 {fetched_at, count, trade_date}
+
+  market   来源接口                          code 形式
+  ───────  ───────────────────────────────  ──────────
+  a        ak.stock_zh_a_spot_em            600519
+  hk       ak.stock_hk_main_board_spot_em   00700
+  us       ak.stock_us_spot_em              AAPL
+
+  • download(market)：请求一次并写入快照，返回原始表（universe 用同一次请求取品种列表）
+  • fetch(market)：max_age 内依次使用进程内缓存 / 磁盘快照，否则重新下载
+  • trade_date(market)：行情对应的交易日（开盘前、周末取上一个工作日）
+  • is_open / last_close：交易时段判断（扫描计划跳过休市市场用）
+  • 列提取全部向量化
+"""
+
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+import pandas as pd
+
+import datasource
+
+logger = logging.getLogger(__name__)
+
+_BASE  = os.path.dirname(os.path.abspath(__file__))
+D_SPOT = os.path.join(_BASE, "data_spot")
+
+MARKETS     = ("a", "hk", "us")
+DEFAULT_AGE = 30.0
+COLUMNS     = ["last", "open", "high", "low", "prev_close", "volume"]
+
+_API = {"a": "stock_zh_a_spot_em", "hk": "stock_hk_main_board_spot_em",
+        "us": "stock_us_spot_em"}
+
+# 市场时区与开 / 收盘时间（判断行情属于哪个交易日、是否在交易时段；
+# 不处理午休与节假日——节假日按开市处理，只会多扫、不会漏扫）
+_SESSION = {"a":  ("Asia/Shanghai",    (9, 30), (15, 0)),
+            "hk": ("Asia/Hong_Kong",   (9, 30), (16, 0)),
+            "us": ("America/New_York", (9, 30), (16, 0))}
+
+_mem: Dict[str, Tuple[float, pd.DataFrame]] = {}   # market → (取得时间, 行情)
+_lock = threading.Lock()
+
+
+def _path(market: str) -> str:
+    return os.path.join(D_SPOT, f"{market}.parquet")
+
+
+def _load_meta(market: str) -> Dict:
+    try:
+        with open(os.path.join(D_SPOT, f"{market}.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+# ── 标准化（向量化列提取）────────────────────────────────────────────
+def _col(df: pd.DataFrame, *names: str) -> pd.Series:
+    """按候选列名取数值列（各市场接口列名略有差异，如 最高 / 最高价）。"""
+    for n in names:
+        if n in df.columns:
+            return pd.to_numeric(df[n], errors="coerce").astype("float64")
+    return pd.Series(float("nan"), index=df.index, dtype="float64")
+
+
+def _codes(market: str, raw: pd.Series) -> pd.Series:
+    raw = raw.astype(str).str.strip()
+    if market == "a":
+        return raw.str.zfill(6)
+    if market == "hk":
+        return raw.str.zfill(5)
+    return raw.str.split(".", n=1).str[-1].str.upper()      # 105.AAPL → AAPL
+
+
+def normalize(market: str, df: pd.DataFrame) -> pd.DataFrame:
+    """东方财富行情表 → index=code，列 COLUMNS；停牌 / 无效行剔除。"""
+    out = pd.DataFrame({
+        "code":   _codes(market, df["代码"]),
+        "last":   _col(df, "最新价"),
+        "open":   _col(df, "今开", "开盘价"),
+        "high":   _col(df, "最高", "最高价"),
+        "low":    _col(df, "最低", "最低价"),
+        "prev_close": _col(df, "昨收", "昨收价"),     # 校验缓存日线是否需要重新复权
+        "volume": _col(df, "成交量"),
+    })
+    out = out[(out["last"] > 0) & out["high"].notna() & out["low"].notna()]
+    return out.drop_duplicates("code").set_index("code")
+
+
+def _local(market: str, now: Optional[datetime]) -> datetime:
+    tz = ZoneInfo(_SESSION[market][0])
+    return (now or datetime.now(tz)).astimezone(tz)
+
+
+def trade_date(market: str, now: Optional[datetime] = None) -> date:
+    local = _local(market, now)
+    d = local.date()
+    if (local.hour, local.minute) < _SESSION[market][1]:
+        d -= timedelta(days=1)
+    while d.weekday() >= 5:
+        d -= timedelta(days=1)
+    return d
+
+
+def is_open(market: str, now: Optional[datetime] = None) -> bool:
+    _, start, end = _SESSION[market]
+    local = _local(market, now)
+    return local.weekday() < 5 and start <= (local.hour, local.minute) < end
+
+
+def last_close(market: str, now: Optional[datetime] = None) -> datetime:
+    """最近一次收盘时刻（带时区）。"""
+    tz, _, (h, m) = _SESSION[market]
+    local = _local(market, now)
+    d = local.date()
+    if (local.hour, local.minute) < (h, m):
+        d -= timedelta(days=1)
+    while d.weekday() >= 5:
+        d -= timedelta(days=1)
+    return datetime(d.year, d.month, d.day, h, m, tzinfo=ZoneInfo(tz))
+
+
+# ── 快照读写 ─────────────────────────────────────────────────────────
+def ingest(market: str, raw: pd.DataFrame) -> Optional[pd.DataFrame]:
+    """标准化一张原始行情表并写入快照，返回标准化结果。"""
+    try:
+        df = normalize(market, raw)
+        if df.empty:
+            return None
+        os.makedirs(D_SPOT, exist_ok=True)
+        path = _path(market)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        df.reset_index().to_parquet(tmp, index=False)
+        os.replace(tmp, path)
+        now = time.time()
+        with open(os.path.join(D_SPOT, f"{market}.json"), "w", encoding="utf-8") as f:
+            json.dump({"fetched_at": now, "count": len(df),
+                       "trade_date": str(trade_date(market))}, f)
+        with _lock:
+            _mem[market] = (now, df)
+        return df
+    except Exception as e:
+        logger.warning(f"spot.ingest {market}: {e}")
+        return None
+
+
+def download(market: str) -> pd.DataFrame:
+    """请求一次全市场行情并写入快照，返回原始表（失败抛异常）。"""
+    if market not in _API:
+        raise ValueError(f"unknown market: {market}")
+    import akshare as ak
+    raw = datasource.call("akshare", getattr(ak, _API[market]))
+    ingest(market, raw)
+    return raw
+
+
+def load_snapshot(market: str) -> Optional[pd.DataFrame]:
+    try:
+        df = pd.read_parquet(_path(market), columns=["code"] + COLUMNS)
+    except Exception:
+        return None
+    df["code"] = df["code"].astype(str)
+    return df.set_index("code")
+
+
+def age(market: str) -> Optional[float]:
+    fetched = _load_meta(market).get("fetched_at")
+    return time.time() - float(fetched) if fetched else None
+
+
+def fetch(market: str, max_age: float = DEFAULT_AGE) -> Optional[pd.DataFrame]:
+    """一个市场的全部行情（index=code）；失败返回 None。"""
+    if market not in _API:
+        raise ValueError(f"unknown market: {market}")
+    hit = _mem.get(market)
+    if hit is not None and time.time() - hit[0] < max_age:
+        return hit[1]
+    a = age(market)
+    if a is not None and a < max_age:            # 其他进程（如定时任务）刚写入
+        df = load_snapshot(market)
+        if df is not None:
+            with _lock:
+                _mem[market] = (time.time() - a, df)
+            return df
+    try:
+        download(market)
+    except Exception as e:
+        logger.warning(f"spot.fetch {market}: {e}")
+        return None
+    hit = _mem.get(market)
+    return hit[1] if hit is not None else None
+
+
+def stats() -> Dict[str, Dict]:
+    return {m: {**_load_meta(m), "age_s": age(m)} for m in MARKETS}
+
+
+def clear() -> bool:
+    with _lock:
+        _mem.clear()
+    try:
+        if os.path.isdir(D_SPOT):
+            shutil.rmtree(D_SPOT)
+        return True
+    except Exception:
+        return False
@@ -1,19 +1,33 @@
 """
-storage.py — JSON 本地存储（支持分批缓存合并）
+storage.py — 本地存储（JSON 配置 + SQLite 扫描数据）
 文件：
   data_config.json   — 用户设置
-  data_history.json  — 扫描会话列表（最多 50 条）
-  data_results.json  — 最新一次扫描明细
-  data_allresults.json — 所有会话明细（合并缓存，最多 2000 条）
-  data_alerts.json   — 告警日志（最多 200 条）
+  data_scanner.db    — SQLite（WAL 模式）扫描数据：
+      sessions  扫描会话（按保留天数淘汰；status: running / done）
+      latest    每个 (ticker, timeframe) 的最新结果（upsert 物化视图，不限条数）
+      alerts    告警日志（最多 200 条）
+      session_params / checkpoints  进行中会话的参数与已完成 (ticker, timeframe)，
+                用于 resume_scan 断点续扫，会话完成后删除
+      events    增量扫描（scan_delta）的状态变化流：进入 / 离开区间、
+                最近斐波档位变化、共振评分变化（随会话按保留天数淘汰）
+  data_history/      — 全部扫描明细，按 scan_date 分区的 Parquet（见 result_history.py）
   data_groups.json   — 已扫描品种组记录
+  data_watchlist*.json — 自选收藏夹
+
+旧版 data_history.json / data_allresults.json / data_alerts.json
+在首次打开数据库时自动导入。
 """
 
 import json
 import os
+import sqlite3
+import threading
 import time
+from datetime import date, timedelta
 from typing import Any, Dict, List, Optional
 
+import result_history
+
 # ── 文件路径 ─────────────────────────────────────────────────────────
 _BASE     = os.path.dirname(os.path.abspath(__file__))
 F_CFG     = os.path.join(_BASE, "data_config.json")
@@ -22,30 +36,237 @@ F_RES     = os.path.join(_BASE, "data_results.json")
 F_ALLRES  = os.path.join(_BASE, "data_allresults.json")
 F_ALERTS  = os.path.join(_BASE, "data_alerts.json")
 F_GROUPS  = os.path.join(_BASE, "data_groups.json")
+F_DB      = os.path.join(_BASE, "data_scanner.db")
 
-_MAX_HIST   = 50
 _MAX_ALERTS = 200
-_MAX_ALLRES = 5000   # 所有品种×框架合并缓存上限
+_COMPACT_PARTS = 8   # 同一天 part 文件达到该数量时合并
+RESUME_IDLE_S  = 600  # running 会话超过该秒数无写入（updated_at）才视为中断、可续扫
 
 
 # ── 通用 IO ──────────────────────────────────────────────────────────
+# 进程内读缓存：{path: ((mtime_ns, size, gen), data)}
+# 以文件 mtime/size 判断外部修改（如 scheduler 进程写入），_save 额外递增
+# 写入代数，避免同一秒内、大小不变的覆盖写被漏判。
+# 返回的是共享对象——调用方不得原地修改，需修改时先复制。
+_cache: Dict[str, tuple] = {}
+_cache_lock = threading.Lock()
+_gen = 0
+
+
+def _stamp(path: str) -> Optional[tuple]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size, _gen
+
+
 def _load(path: str, default):
+    stamp = _stamp(path)
+    if stamp is None:
+        return default
+    hit = _cache.get(path)
+    if hit is not None and hit[0] == stamp:
+        return hit[1]
     try:
-        if os.path.exists(path):
-            with open(path, "r", encoding="utf-8") as f:
-                return json.load(f)
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
     except Exception:
-        pass
-    return default
+        return default
+    with _cache_lock:
+        _cache[path] = (stamp, data)
+    return data
 
 
 def _save(path: str, data) -> bool:
+    global _gen
     try:
         with open(path, "w", encoding="utf-8") as f:
             json.dump(data, f, ensure_ascii=False, indent=2)
         return True
     except Exception:
         return False
+    finally:
+        with _cache_lock:
+            _gen += 1
+            _cache.pop(path, None)
+
+
+# ── SQLite ───────────────────────────────────────────────────────────
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    scan_time  TEXT,
+    data       TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_sessions_time ON sessions(scan_time);
+CREATE TABLE IF NOT EXISTS latest (
+    ticker     TEXT    NOT NULL,
+    timeframe  TEXT    NOT NULL,
+    session_id TEXT    NOT NULL,
+    in_zone    INTEGER NOT NULL DEFAULT 0,
+    data       TEXT    NOT NULL,
+    PRIMARY KEY (ticker, timeframe)
+);
+CREATE INDEX IF NOT EXISTS ix_latest_session ON latest(session_id);
+CREATE INDEX IF NOT EXISTS ix_latest_in_zone ON latest(in_zone);
+CREATE TABLE IF NOT EXISTS session_params (
+    session_id TEXT PRIMARY KEY,
+    data       TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    session_id TEXT NOT NULL,
+    ticker     TEXT NOT NULL,
+    timeframe  TEXT NOT NULL,
+    data       TEXT,
+    PRIMARY KEY (session_id, ticker, timeframe)
+);
+CREATE TABLE IF NOT EXISTS alerts (
+    id     INTEGER PRIMARY KEY AUTOINCREMENT,
+    ticker TEXT,
+    data   TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    ticker     TEXT NOT NULL,
+    timeframe  TEXT NOT NULL,
+    kind       TEXT NOT NULL,
+    data       TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_events_session ON events(session_id);
+"""
+
+_tls       = threading.local()
+_init_lock = threading.Lock()
+_db_ready: set = set()     # 已完成建表 / 迁移的数据库路径
+
+
+def _db() -> sqlite3.Connection:
+    """线程内复用的连接；首次使用时建表并导入旧 JSON 数据。"""
+    conn = getattr(_tls, "conn", None)
+    if conn is not None and getattr(_tls, "path", None) == F_DB:
+        return conn
+    conn = sqlite3.connect(F_DB, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    with _init_lock:
+        if F_DB not in _db_ready:
+            conn.executescript(_SCHEMA)
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version == 0:
+                _migrate_json(conn)
+            if version < 2:
+                _migrate_results_table(conn)
+                conn.execute("PRAGMA user_version = 2")
+                conn.commit()
+            _db_ready.add(F_DB)
+    _tls.conn, _tls.path = conn, F_DB
+    return conn
+
+
+def _dumps(row: Dict) -> str:
+    return json.dumps(row, ensure_ascii=False)
+
+
+def _rows(cur) -> List[Dict]:
+    return [json.loads(r[0]) for r in cur]
+
+
+# 查询结果缓存：以 数据库/WAL 文件的 mtime、size 加本进程写入代数为版本号
+_qcache: Dict[tuple, tuple] = {}
+_db_gen = 0
+
+
+def _db_touch() -> None:
+    """本进程写库后调用，使查询缓存失效。"""
+    global _db_gen
+    with _cache_lock:
+        _db_gen += 1
+        _qcache.clear()
+
+
+def _db_stamp() -> tuple:
+    return (F_DB, _db_gen, _stamp(F_DB), _stamp(F_DB + "-wal"))
+
+
+def _cached_query(key: tuple, fn):
+    """按 _db_stamp() 缓存 fn() 的结果（fn 抛异常时不缓存）。"""
+    _db()
+    stamp = _db_stamp()
+    hit = _qcache.get(key)
+    if hit is not None and hit[0] == stamp:
+        return hit[1]
+    value = fn()
+    with _cache_lock:
+        _qcache[key] = (stamp, value)
+    return value
+
+
+def _upsert_latest(conn: sqlite3.Connection, result_rows: List[Dict]) -> None:
+    # ON CONFLICT 保留原 rowid：已存在品种位置不变，新品种追加在末尾
+    conn.executemany(
+        "INSERT INTO latest (ticker, timeframe, session_id, in_zone, data) "
+        "VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT(ticker, timeframe) DO UPDATE SET "
+        "session_id = excluded.session_id, in_zone = excluded.in_zone, "
+        "data = excluded.data",
+        [(r["ticker"], r["timeframe"], r.get("session_id", ""),
+          int(bool(r.get("in_zone"))), _dumps(r)) for r in result_rows],
+    )
+
+
+def _retention_days() -> int:
+    try:
+        return int(load_config().get("history_retention_days", 365))
+    except (TypeError, ValueError):
+        return 365
+
+
+def _apply_retention(conn: sqlite3.Connection) -> None:
+    """按保留天数淘汰会话与历史分区；最新结果视图不受影响。"""
+    days = _retention_days()
+    if days <= 0:
+        return
+    cutoff = str(date.today() - timedelta(days=days))
+    with conn:
+        conn.execute("DELETE FROM sessions WHERE scan_time < ?", (cutoff,))
+        for table in ("session_params", "checkpoints", "events"):
+            conn.execute(f"DELETE FROM {table} WHERE session_id NOT IN "
+                         "(SELECT session_id FROM sessions)")
+    result_history.prune(days)
+
+
+def _migrate_json(conn: sqlite3.Connection) -> None:
+    """一次性导入旧版 JSON 文件。"""
+    def _valid(items):
+        return [r for r in (items if isinstance(items, list) else [])
+                if isinstance(r, dict)]
+
+    hist = [s for s in _valid(_load(F_HIST, [])) if s.get("session_id")]
+    conn.executemany(
+        "INSERT OR REPLACE INTO sessions (session_id, scan_time, data) VALUES (?, ?, ?)",
+        [(s["session_id"], s.get("scan_time", ""), _dumps(s)) for s in hist])
+
+    rows = [r for r in _valid(_load(F_ALLRES, []) or _load(F_RES, []))
+            if r.get("ticker") and r.get("timeframe")]
+    result_history.append([r for r in rows if r.get("scan_date") and r.get("session_id")])
+    _upsert_latest(conn, rows)
+
+    alerts = _valid(_load(F_ALERTS, []))
+    conn.executemany("INSERT INTO alerts (ticker, data) VALUES (?, ?)",
+                     [(a.get("ticker"), _dumps(a)) for a in alerts])
+
+
+def _migrate_results_table(conn: sqlite3.Connection) -> None:
+    """v1 的 results 表迁移到 Parquet 历史后删除。"""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='results'").fetchone()
+    if not exists:
+        return
+    rows = _rows(conn.execute("SELECT data FROM results ORDER BY id"))
+    result_history.append([r for r in rows if r.get("scan_date") and r.get("session_id")])
+    conn.execute("DROP TABLE results")
 
 
 # ── 配置 ─────────────────────────────────────────────────────────────
@@ -61,12 +282,65 @@ DEFAULT_CFG = {
     "dingtalk_secret":  "",
     "telegram_token":   "",
     "telegram_chat_id": "",
+    # 并发抓取：每个数据源独立线程池的线程数
+    "fetch_workers":    {"akshare": 4, "yfinance": 8, "twelvedata": 2},
+    # 多进程分片扫描的进程数（1 = 单进程；限流与线程数按进程数均分）
+    "scan_processes":   1,
+    # 各数据源限流：rate 次/秒，burst 突发，concurrency 在途上限
+    "rate_limits":      {
+        "akshare":    {"rate": 5.0,  "burst": 10, "concurrency": 4},
+        "yfinance":   {"rate": 10.0, "burst": 20, "concurrency": 8},
+        "twelvedata": {"rate": 0.13, "burst": 8,  "concurrency": 2},
+    },
+    "fetch_retries":    3,
+    # 数据源熔断：失败率 / 连续失败超阈值后冷却 cooldown 秒（连续熔断翻倍）
+    "breaker":          {"fail_rate": 0.5, "consecutive": 5, "cooldown": 60},
+    # 对冲抓取：首选源 hedge_delay 秒未返回即并发启动备用源，取先到的有效结果
+    # hedge_immediate 中的品种类型（如 us_stock）立即并发所有来源
+    "hedge_fetch":      False,
+    "hedge_delay":      2.0,
+    "hedge_immediate":  ["us_stock"],
+    # yfinance 多品种批量下载，每批品种数（≤1 关闭）
+    "yf_batch_size":    50,
+    # 只拉一次长日线，周线/月线本地重采样（按主数据源开关）；默认关闭，
+    # 沿用数据源自带的复权周线 / 月线，确认与重采样结果一致后再按来源开启
+    "resample_tf":      {"akshare": False, "yfinance": False, "twelvedata": False},
+    # 扫描框架（assets.TIMEFRAME_SPECS 中的名字；日内框架 15m / 1H / 4H 走 yfinance）
+    "timeframes":       ["Daily", "Weekly", "Monthly"],
+    # 日内复扫：每 intraday_interval_min 分钟只刷新日内框架，
+    # 高周期沿用 intraday_reuse_days 天内的最新结果
+    "intraday_enabled":      False,
+    "intraday_interval_min": 60,
+    "intraday_reuse_days":   1,
+    # 流式写入：每完成这么多品种写一次库（扫描中途可看到部分结果）
+    "flush_batch":      50,
+    # 扫描明细历史保留天数（data_history/ 按天分区，≤0 不淘汰）
+    "history_retention_days": 365,
+    # 本地 K 线缓存（data_bars/），TTL 单位秒
+    "bar_cache":        True,
+    "bar_cache_ttl":    {"1d": 4 * 3600, "1wk": 12 * 3600, "1mo": 24 * 3600,
+                         "1h": 20 * 60, "15m": 5 * 60},
+    # 波段高低点增量状态（swing_state，随 K 线缓存持久化）
+    "swing_state":      True,
+    # 扫描计划：按缓存陈旧度 / 接近黄金区间 / 自选收藏排序，跳过休市且无新数据的品种；
+    # 默认关闭：开启后全部品种都被跳过时不创建会话（摘要 session_id 为 None）；
+    # scan_budget_min > 0 时到时停止，其余品种顺延到下次扫描（0 = 不限时）
+    "scan_plan":        False,
+    "scan_plan_weights": {"stale": 1.0, "zone": 2.0, "watch": 3.0},
+    "scan_budget_min":  0,
+    # 全量扫描前用全市场行情快照（data_spot/）更新已缓存日线的最后一根，
+    # A 股 / 港股 / 美股每个市场一次请求代替逐个品种的历史请求；
+    # 昨收与缓存不一致（除权除息）的序列改为重新下载。默认关闭
+    "spot_refresh":     False,
+    # 增量扫描：历史只写入状态有变化的行（进出区间 / 最近档位 / 共振评分），
+    # latest 仍每次刷新；变化记入 events 表，告警只在进入区间时触发
+    "scan_delta":       False,
 }
 
 
 def load_config() -> Dict:
     cfg = _load(F_CFG, {})
-    return {**DEFAULT_CFG, **cfg}
+    return {**DEFAULT_CFG, **(cfg if isinstance(cfg, dict) else {})}
 
 
 def save_config(cfg: Dict) -> bool:
@@ -74,88 +348,275 @@ def save_config(cfg: Dict) -> bool:
 
 
 # ── 扫描会话 ─────────────────────────────────────────────────────────
+# 流式写入：begin_session → append_results（多次，微批）→ finish_session
+# 扫描中途崩溃时已写入的批次保留，会话状态停留在 running。
+def _put_session(conn: sqlite3.Connection, session_row: Dict) -> None:
+    """写入会话行，附带心跳 updated_at（用于区分运行中与已中断的会话）。"""
+    conn.execute(
+        "INSERT OR REPLACE INTO sessions (session_id, scan_time, data) "
+        "VALUES (?, ?, ?)",
+        (session_row["session_id"], session_row.get("scan_time", ""),
+         _dumps({**session_row, "updated_at": time.time()})))
+
+
+def touch_session(session_id: str) -> bool:
+    """只刷新会话心跳（长时间没有结果写入的阶段调用）。"""
+    try:
+        conn = _db()
+        with conn:
+            conn.execute("UPDATE sessions SET data = json_set(data, '$.updated_at', ?) "
+                         "WHERE session_id = ?", (time.time(), session_id))
+        return True
+    except Exception:
+        return False
+
+
+def begin_session(session_row: Dict, params: Optional[Dict] = None) -> bool:
+    """写入 running 状态的会话行；params 为断点续扫所需的扫描参数。"""
+    try:
+        conn = _db()
+        with conn:
+            _put_session(conn, {**session_row, "status": "running"})
+            if params is not None:
+                conn.execute(
+                    "INSERT OR REPLACE INTO session_params (session_id, data) "
+                    "VALUES (?, ?)", (session_row["session_id"], _dumps(params)))
+        return True
+    except Exception:
+        return False
+    finally:
+        _db_touch()
+
+
+def append_results(result_rows: List[Dict],
+                   session_row: Optional[Dict] = None,
+                   checkpoint:  Optional[List[tuple]] = None,
+                   events:      Optional[List[Dict]] = None,
+                   latest_rows: Optional[List[Dict]] = None) -> bool:
+    """
+    追加一批明细：upsert latest，并在同一事务中更新会话行、
+    检查点 [(ticker, timeframe, fibo 或 None), ...] 与状态变化事件；
+    事务提交后再写 Parquet 历史（事务失败时不会留下续扫后重复的历史行）。
+    latest_rows 不为 None 时 latest 改用这批行（增量模式：latest 全量刷新，
+    历史只追加 result_rows 中的变化行）。
+    """
+    try:
+        conn = _db()
+        with conn:
+            _upsert_latest(conn, result_rows if latest_rows is None else latest_rows)
+            if events:
+                conn.executemany(
+                    "INSERT INTO events (session_id, ticker, timeframe, kind, data) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [(e["session_id"], e["ticker"], e["timeframe"], e["kind"],
+                      _dumps(e)) for e in events])
+            if session_row:
+                _put_session(conn, session_row)
+            if session_row and checkpoint:
+                sid = session_row["session_id"]
+                conn.executemany(
+                    "INSERT OR REPLACE INTO checkpoints "
+                    "(session_id, ticker, timeframe, data) VALUES (?, ?, ?, ?)",
+                    [(sid, t, tf, None if f is None else _dumps(f))
+                     for t, tf, f in checkpoint])
+        return result_history.append(result_rows)
+    except Exception:
+        return False
+    finally:
+        _db_touch()
+
+
+def load_checkpoint(session_id: str) -> Optional[Dict]:
+    """
+    读取未完成会话：{"session": 会话行, "params": 扫描参数,
+    "done": {ticker: {timeframe: fibo 或 None}}}；不存在返回 None。
+    """
+    try:
+        conn = _db()
+        row = conn.execute("SELECT data FROM sessions WHERE session_id = ?",
+                           (session_id,)).fetchone()
+        prm = conn.execute("SELECT data FROM session_params WHERE session_id = ?",
+                           (session_id,)).fetchone()
+        if not row or not prm:
+            return None
+        done: Dict[str, Dict] = {}
+        for t, tf, data in conn.execute(
+                "SELECT ticker, timeframe, data FROM checkpoints WHERE session_id = ?",
+                (session_id,)):
+            done.setdefault(t, {})[tf] = json.loads(data) if data else None
+        return {"session": json.loads(row[0]), "params": json.loads(prm[0]),
+                "done": done}
+    except Exception:
+        return None
+
+
+def session_idle(session_row: Dict, idle_s: Optional[float] = None) -> bool:
+    """会话超过 idle_s（缺省 RESUME_IDLE_S）秒没有心跳（进程已退出）。"""
+    idle_s = RESUME_IDLE_S if idle_s is None else idle_s
+    return time.time() - float(session_row.get("updated_at") or 0) >= idle_s
+
+
+def load_unfinished_sessions(limit: int = 10,
+                             idle_s: Optional[float] = None) -> List[Dict]:
+    """
+    可续扫的会话（status=running、保存了参数且 idle_s 秒内无心跳），最新在前。
+    仍在其他线程 / 进程中运行的会话不列出，避免重复扫描；
+    任务队列会话没有检查点，由 jobqueue.requeue_failed 恢复，也不列出。
+    """
+    idle_s = RESUME_IDLE_S if idle_s is None else idle_s
+    try:
+        return _rows(_db().execute(
+            "SELECT s.data FROM sessions s JOIN session_params p USING (session_id) "
+            "WHERE json_extract(s.data, '$.status') = 'running' "
+            "AND COALESCE(json_extract(s.data, '$.updated_at'), 0) < ? "
+            "AND json_extract(s.data, '$.queue') IS NULL "
+            "ORDER BY s.scan_time DESC LIMIT ?", (time.time() - idle_s, limit)))
+    except Exception:
+        return []
+
+
+def finish_session(session_row: Dict) -> bool:
+    """标记会话完成、删除检查点，执行保留期淘汰与历史合并。"""
+    try:
+        conn = _db()
+        sid  = session_row["session_id"]
+        with conn:
+            _put_session(conn, {**session_row, "status": "done"})
+            conn.execute("DELETE FROM checkpoints WHERE session_id = ?", (sid,))
+            conn.execute("DELETE FROM session_params WHERE session_id = ?", (sid,))
+        _apply_retention(conn)
+        result_history.compact(_COMPACT_PARTS)
+        return True
+    except Exception:
+        return False
+    finally:
+        _db_touch()
+
+
 def save_scan(session_row: Dict, result_rows: List[Dict]) -> bool:
-    # 保存最新明细
-    _save(F_RES, result_rows)
-
-    # 合并到全量缓存（按 ticker+timeframe 去重，保留最新）
-    allres = _load(F_ALLRES, [])
-    if not isinstance(allres, list):
-        allres = []
-    existing = {(r["ticker"], r["timeframe"]): r
-                for r in allres if isinstance(r, dict) and r.get("ticker")}
-    for r in result_rows:
-        key = (r["ticker"], r["timeframe"])
-        existing[key] = r
-    merged = list(existing.values())
-    if len(merged) > _MAX_ALLRES:
-        merged = merged[-_MAX_ALLRES:]
-    _save(F_ALLRES, merged)
-
-    # 保存会话摘要（防御：旧数据可能是dict格式，强制转为list）
-    hist = _load(F_HIST, [])
-    if not isinstance(hist, list):
-        hist = []
-    hist.append(session_row)
-    if len(hist) > _MAX_HIST:
-        hist = hist[-_MAX_HIST:]
-    return _save(F_HIST, hist)
+    """一次性保存整个会话。"""
+    return (begin_session(session_row)
+            and append_results(result_rows)
+            and finish_session(session_row))
 
 
 def load_sessions(limit: int = 10) -> List[Dict]:
-    hist = _load(F_HIST, [])
-    if not isinstance(hist, list):
-        hist = []
-    # 只保留有效的dict记录
-    hist = [s for s in hist if isinstance(s, dict) and s.get("session_id")]
-    return list(reversed(hist))[:limit]
+    def _query():
+        return _rows(_db().execute(
+            "SELECT data FROM sessions ORDER BY scan_time DESC, rowid DESC LIMIT ?",
+            (limit,)))
+    try:
+        return list(_cached_query(("sessions", limit), _query))
+    except Exception:
+        return []
 
 
 def load_latest_results(inzone_only: bool = False) -> List[Dict]:
-    # 优先返回全量合并缓存（防御：确保是list of dict）
-    allres = _load(F_ALLRES, [])
-    if not isinstance(allres, list):
-        allres = []
-    if not allres:
-        allres = _load(F_RES, [])
-        if not isinstance(allres, list):
-            allres = []
-    # 只保留有效dict记录
-    allres = [r for r in allres if isinstance(r, dict) and r.get("ticker")]
+    """最新结果（行 dict 为缓存共享对象，勿原地修改）。"""
+    sql = "SELECT data FROM latest"
     if inzone_only:
-        return [r for r in allres if r.get("in_zone")]
-    return allres
+        sql += " WHERE in_zone = 1"
+    try:
+        return list(_cached_query(("latest", inzone_only),
+                                  lambda: _rows(_db().execute(sql + " ORDER BY rowid"))))
+    except Exception:
+        return []
+
+
+def _latest_view(near_pct: float) -> Dict[str, Any]:
+    rows = _rows(_db().execute("SELECT data FROM latest ORDER BY rowid"))
+    tickers, zone_cnt = set(), {}
+    inzone = near = 0
+    for r in rows:
+        t = r["ticker"]
+        tickers.add(t)
+        if r.get("in_zone"):
+            inzone += 1
+            zone_cnt[t] = zone_cnt.get(t, 0) + 1
+        elif (r.get("dist_pct") or 999) < near_pct:
+            near += 1
+    return {
+        "rows":   rows,
+        "total":  len(tickers),
+        "inzone": inzone,
+        "near":   near,
+        "triple": sum(1 for c in zone_cnt.values() if c >= 3),
+    }
+
+
+def load_latest_view(near_pct: float = 5.0) -> Dict[str, Any]:
+    """
+    扫描页使用的合并视图：每个 (ticker, timeframe) 的最新一行，
+    以及一次遍历得到的计数 {total 品种数, inzone, near 接近区域, triple ≥3 个框架共振}。
+    """
+    try:
+        view = _cached_query(("latest_view", near_pct), lambda: _latest_view(near_pct))
+        return {**view, "rows": list(view["rows"])}
+    except Exception:
+        return {"rows": [], "total": 0, "inzone": 0, "near": 0, "triple": 0}
+
+
+def load_events(session_id: Optional[str] = None,
+                limit:      int           = 500) -> List[Dict]:
+    """增量扫描的状态变化事件，最新在前；可按会话过滤。"""
+    sql, args = "SELECT data FROM events", []
+    if session_id:
+        sql += " WHERE session_id = ?"
+        args.append(session_id)
+    try:
+        return _rows(_db().execute(sql + " ORDER BY id DESC LIMIT ?", (*args, limit)))
+    except Exception:
+        return []
 
 
 def load_session_results(session_id: str) -> List[Dict]:
-    """读取全量缓存中属于特定会话的记录"""
-    allres = _load(F_ALLRES, [])
-    if not isinstance(allres, list):
-        allres = []
-    allres = [r for r in allres if isinstance(r, dict)]
-    filtered = [r for r in allres if r.get("session_id") == session_id]
-    if not filtered:
-        # 降级：读最新明细
-        results = _load(F_RES, [])
-        if not isinstance(results, list):
-            results = []
-        filtered = [r for r in results
-                    if isinstance(r, dict) and r.get("session_id") == session_id]
-    return filtered
+    """读取特定会话的全部明细（只读该会话所在日期分区）"""
+    try:
+        row = _db().execute("SELECT data FROM sessions WHERE session_id = ?",
+                            (session_id,)).fetchone()
+        scan_date = json.loads(row[0]).get("scan_date") if row else None
+        return result_history.read_rows(
+            [scan_date] if scan_date else None, session_id=session_id)
+    except Exception:
+        return []
+
+
+def rebuild_latest() -> bool:
+    """由 Parquet 历史重建 latest 物化视图（例如误删或手动清理后）。"""
+    try:
+        rows = result_history.latest_rows()
+        conn = _db()
+        with conn:
+            conn.execute("DELETE FROM latest")
+            _upsert_latest(conn, rows)
+        return True
+    except Exception:
+        return False
+    finally:
+        _db_touch()
 
 
 def has_scan_data() -> bool:
-    if os.path.exists(F_ALLRES):
-        d = _load(F_ALLRES, [])
-        if d: return True
-    if os.path.exists(F_RES):
-        d = _load(F_RES, [])
-        if d: return True
-    return False
+    try:
+        return _cached_query(("has_data",), lambda: _db().execute(
+            "SELECT 1 FROM latest LIMIT 1").fetchone() is not None)
+    except Exception:
+        return False
 
 
 def clear_all_data() -> bool:
     ok = True
+    try:
+        conn = _db()
+        with conn:
+            for table in ("sessions", "latest", "alerts",
+                          "session_params", "checkpoints", "events"):
+                conn.execute(f"DELETE FROM {table}")
+        conn.execute("VACUUM")
+    except Exception:
+        ok = False
+    _db_touch()
+    ok = result_history.clear() and ok
     for f in [F_HIST, F_RES, F_ALLRES, F_ALERTS, F_GROUPS]:
         if os.path.exists(f):
             try: os.remove(f)
@@ -165,7 +626,7 @@ def clear_all_data() -> bool:
 
 # ── 已扫描组记录（用于标注哪些组已缓存）────────────────────────────
 def load_scanned_groups() -> List[str]:
-    return _load(F_GROUPS, [])
+    return list(_load(F_GROUPS, []))
 
 
 def save_scanned_groups(groups: List[str]) -> bool:
@@ -179,21 +640,51 @@ def clear_scanned_groups() -> bool:
 
 
 # ── 告警日志 ─────────────────────────────────────────────────────────
-def log_alert(entry: Dict) -> bool:
-    logs: List[Dict] = _load(F_ALERTS, [])
-    logs.append(entry)
-    if len(logs) > _MAX_ALERTS:
-        logs = logs[-_MAX_ALERTS:]
-    return _save(F_ALERTS, logs)
+def log_alert(entry, name: str = "", timeframe: str = "", channel: str = "",
+              status: str = "", message: str = "") -> bool:
+    """记录一条告警；兼容 log_alert(dict) 与 log_alert(ticker, name, ...) 两种调用。"""
+    if not isinstance(entry, dict):
+        entry = {"time": time.strftime("%Y-%m-%d %H:%M:%S"), "ticker": entry,
+                 "name": name, "timeframe": timeframe, "channel": channel,
+                 "status": status, "message": message}
+    try:
+        conn = _db()
+        with conn:
+            conn.execute("INSERT INTO alerts (ticker, data) VALUES (?, ?)",
+                         (entry.get("ticker"), _dumps(entry)))
+            conn.execute(
+                "DELETE FROM alerts WHERE id NOT IN ("
+                " SELECT id FROM alerts ORDER BY id DESC LIMIT ?)", (_MAX_ALERTS,))
+        return True
+    except Exception:
+        return False
+    finally:
+        _db_touch()
 
 
 def load_alerts(limit: int = 100) -> List[Dict]:
-    logs = _load(F_ALERTS, [])
-    return list(reversed(logs))[:limit]
+    try:
+        return _rows(_db().execute(
+            "SELECT data FROM alerts ORDER BY id DESC LIMIT ?", (limit,)))
+    except Exception:
+        return []
 
 
 def clear_alerts() -> bool:
-    return _save(F_ALERTS, [])
+    try:
+        conn = _db()
+        with conn:
+            conn.execute("DELETE FROM alerts")
+        return True
+    except Exception:
+        return False
+    finally:
+        _db_touch()
+
+
+# 告警页使用的旧名称
+load_alert_log  = load_alerts
+clear_alert_log = clear_alerts
 
 
 # ── 自选收藏夹 ──────────────────────────────────────────────────────
@@ -247,7 +738,7 @@ def add_to_watchlist(ticker: str, name: str = "", note: str = "",
     restored = next((a for a in archive if a["ticker"].upper() == ticker), None)
 
     if restored:
-        entry = restored.copy()
+        entry = {**restored, "notes": list(restored.get("notes") or [])}
         entry["deleted_at"] = None
         # 更新名称（如有）
         if name.strip():
@@ -332,13 +823,15 @@ def add_watchlist_note(ticker: str, note_text: str,
     if not note_text.strip():
         return False
     items = load_watchlist()
-    for item in items:
+    for idx, item in enumerate(items):
         if item["ticker"].upper() == ticker:
-            item.setdefault("notes", []).append({
+            # 读缓存返回共享对象，复制后再修改
+            notes = list(item.get("notes") or []) + [{
                 "text":    note_text.strip(),
                 "img_url": img_url.strip(),
                 "ts":      _now_str(),
-            })
+            }]
+            items[idx] = {**item, "notes": notes}
             return save_watchlist(items)
     return False
 
@@ -354,14 +847,22 @@ def storage_stats() -> Dict[str, Any]:
         try: return os.path.getsize(p) if os.path.exists(p) else 0
         except: return 0
 
-    allres = _load(F_ALLRES, [])
-    hist   = _load(F_HIST, [])
+    try:
+        conn = _db()
+        total, tickers = conn.execute(
+            "SELECT COUNT(*), COUNT(DISTINCT ticker) FROM latest").fetchone()
+        sessions = conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+    except Exception:
+        total = tickers = sessions = 0
+    hstats = result_history.stats()
     return {
-        "total_cached_results": len(allres),
-        "unique_tickers": len(set(r["ticker"] for r in allres)),
-        "sessions": len(hist),
-        "allres_kb": fsize(F_ALLRES) // 1024,
+        "total_cached_results": total,
+        "unique_tickers": tickers,
+        "sessions": sessions,
+        "allres_kb": (fsize(F_DB) + fsize(F_DB + "-wal")) // 1024,
         "config_kb": fsize(F_CFG) // 1024,
         "alerts_kb": fsize(F_ALERTS) // 1024,
+        "history_partitions": hstats["partitions"],
+        "history_kb": hstats["kb"],
         "scanned_groups": load_scanned_groups(),
     }
@@ -0,0 +1,193 @@
+"""
+swing_state.py — 波段高低点增量状态（单调队列，逐根 K 线 O(1) 均摊更新）
+文件：
+  data_bars/<ticker>__<key>.swing.json — 与 bar_cache 同目录
+    {lookback, count, last_ts, last_bar: [High, Low, Close],
+     maxq: [[idx, High], …], minq: [[idx, Low], …]}
+
+  compute_fibo 的窗口 = 最后 lookback 根 K 线 = 已收盘的 lookback-1 根 + 最后一根
+  （可能未收盘、每次扫描都在变）。因此：
+  • 单调队列只收录已收盘 K 线（df 除最后一根外），窗口长度 lookback-1
+  • 计算时再与最后一根合并：swing_high = max(队首, 最后一根 High)
+  • 每次扫描只把上次之后新收盘的 K 线入队，队尾弹出被支配元素、队首弹出过期元素
+  • lookback 变化、上次最后收盘 K 线不在序列中、或其数值变化（前复权回溯）→ 重建
+  • 进程内缓存 + 有新收盘 K 线时落盘，下次扫描 / 重启后继续增量
+"""
+
+import json
+import logging
+import math
+import os
+import threading
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+import pandas as pd
+
+import bar_cache
+
+logger = logging.getLogger(__name__)
+
+_EXT     = ".swing.json"
+_ADJ_TOL = 1e-4   # 与 bar_cache 一致：最后收盘 K 线数值相对误差容忍度
+
+_mem: Dict[Tuple[str, str], Dict] = {}   # (ticker, key) → 状态
+_lock = threading.Lock()
+
+
+# ── 持久化 ───────────────────────────────────────────────────────────
+def _path(ticker: str, key: str) -> str:
+    return bar_cache.sidecar_path(ticker, key, _EXT)
+
+
+def _load(ticker: str, key: str) -> Optional[Dict]:
+    with _lock:
+        st = _mem.get((ticker, key))
+    if st is not None:
+        return st
+    try:
+        with open(_path(ticker, key), "r", encoding="utf-8") as f:
+            raw = json.load(f)
+        st = {**raw,
+              "maxq": deque(tuple(x) for x in raw["maxq"]),
+              "minq": deque(tuple(x) for x in raw["minq"])}
+    except Exception:
+        return None
+    with _lock:
+        _mem[(ticker, key)] = st
+    return st
+
+
+def _save(ticker: str, key: str, st: Dict) -> None:
+    with _lock:
+        _mem[(ticker, key)] = st
+    try:
+        os.makedirs(bar_cache.D_BARS, exist_ok=True)
+        path = _path(ticker, key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({**st, "maxq": list(st["maxq"]), "minq": list(st["minq"])},
+                      f, separators=(",", ":"))
+        os.replace(tmp, path)
+    except Exception as e:
+        logger.debug(f"swing_state.save {ticker} {key}: {e}")
+
+
+# ── 单调队列 ─────────────────────────────────────────────────────────
+def _push(st: Dict, high: float, low: float, width: int) -> None:
+    """入队一根已收盘 K 线，保留最近 width 根。"""
+    i = st["count"]
+    st["count"] = i + 1
+    maxq, minq = st["maxq"], st["minq"]
+    if not math.isnan(high):
+        while maxq and maxq[-1][1] <= high:
+            maxq.pop()
+        maxq.append((i, high))
+    if not math.isnan(low):
+        while minq and minq[-1][1] >= low:
+            minq.pop()
+        minq.append((i, low))
+    oldest = i + 1 - width
+    while maxq and maxq[0][0] < oldest:
+        maxq.popleft()
+    while minq and minq[0][0] < oldest:
+        minq.popleft()
+
+
+def _new_state(lookback: int) -> Dict:
+    return {"lookback": lookback, "count": 0, "last_ts": None, "last_bar": None,
+            "maxq": deque(), "minq": deque()}
+
+
+def _bar(row) -> list:
+    return [float(row["High"]), float(row["Low"]), float(row["Close"])]
+
+
+def _same_bar(a, b) -> bool:
+    for x, y in zip(a, b):
+        if math.isnan(x) or math.isnan(y):
+            if not (math.isnan(x) and math.isnan(y)):
+                return False
+        elif abs(x - y) > _ADJ_TOL * max(abs(x), 1e-12):
+            return False
+    return True
+
+
+def _advance(st: Optional[Dict], closed: pd.DataFrame,
+             lookback: int) -> Tuple[Dict, bool]:
+    """把 closed 中尚未入队的 K 线推入状态，返回 (状态, 是否变化)。"""
+    width = lookback - 1
+    new = None
+    if st is not None and st["lookback"] == lookback and st["last_ts"] is not None:
+        last_ts = pd.Timestamp(st["last_ts"])
+        if last_ts in closed.index and _same_bar(_bar(closed.loc[last_ts]),
+                                                 st["last_bar"]):
+            new = closed[closed.index > last_ts]
+    if new is None or len(new) >= width:
+        st, new = _new_state(lookback), closed.tail(width)
+    if new.empty:
+        return st, False
+    for h, l in zip(new["High"].to_numpy(dtype="float64"),
+                    new["Low"].to_numpy(dtype="float64")):
+        _push(st, float(h), float(l), width)
+    st["last_ts"]  = new.index[-1].isoformat()
+    st["last_bar"] = _bar(new.iloc[-1])
+    return st, True
+
+
+# ════════════════════════════════════════════════════════════════════
+# 公开接口
+# ════════════════════════════════════════════════════════════════════
+def swing(ticker:   str,
+          key:      str,
+          df:       Optional[pd.DataFrame],
+          lookback: int = 100,
+          persist:  bool = True) -> Optional[Tuple[float, float]]:
+    """
+    返回 df 最后 lookback 根 K 线的 (swing_high, swing_low)，
+    结果与 df.tail(lookback) 的 High.max() / Low.min() 一致。
+    key 区分同一品种的不同序列（如 "1d"、重采样的 "1wk.rs"）。
+    """
+    try:
+        if df is None or df.empty:
+            return None
+        lookback = max(1, int(lookback))
+        live = df.iloc[-1]
+        hi, lo = float(live["High"]), float(live["Low"])
+        if lookback > 1 and len(df) > 1:
+            st, changed = _advance(_load(ticker, key), df.iloc[:-1], lookback)
+            if changed and persist:
+                _save(ticker, key, st)
+            elif changed:
+                with _lock:
+                    _mem[(ticker, key)] = st
+            if st["maxq"]:
+                hi = st["maxq"][0][1] if math.isnan(hi) else max(hi, st["maxq"][0][1])
+            if st["minq"]:
+                lo = st["minq"][0][1] if math.isnan(lo) else min(lo, st["minq"][0][1])
+        if math.isnan(hi) or math.isnan(lo):
+            return None
+        return hi, lo
+    except Exception as e:
+        logger.debug(f"swing_state.swing {ticker} {key}: {e}")
+        return None
+
+
+def stats() -> Dict:
+    files = 0
+    if os.path.isdir(bar_cache.D_BARS):
+        files = sum(1 for e in os.scandir(bar_cache.D_BARS) if e.name.endswith(_EXT))
+    return {"series": files, "in_memory": len(_mem)}
+
+
+def clear() -> bool:
+    with _lock:
+        _mem.clear()
+    try:
+        if os.path.isdir(bar_cache.D_BARS):
+            for e in os.scandir(bar_cache.D_BARS):
+                if e.name.endswith(_EXT):
+                    os.remove(e.path)
+        return True
+    except Exception:
+        return False
@@ -0,0 +1,42 @@
+"""jobqueue 租约与重试上限。"""
+
+import json
+import time
+
+import pytest
+
+import jobqueue
+
+
+@pytest.fixture
+def jobs_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobqueue, "F_JOBS", str(tmp_path / "jobs.db"))
+    conn = jobqueue._db()
+    conn.execute("INSERT INTO work_units (unit_id, session_id, seq, tickers) "
+                 "VALUES ('s:0', 's', 0, ?)", (json.dumps(["AAPL"]),))
+    return conn
+
+
+def _expire(conn, unit_id):
+    conn.execute("UPDATE work_units SET lease_expires = ? WHERE unit_id = ?",
+                 (time.time() - 1, unit_id))
+
+
+def test_expired_lease_fails_after_max_attempts(jobs_db):
+    # worker 每次领取后都崩溃：租约过期 MAX_ATTEMPTS 次后单元标记为 failed
+    for n in range(1, jobqueue.MAX_ATTEMPTS + 1):
+        unit = jobqueue.claim(f"crash-{n}", lease_s=60)
+        assert unit is not None and unit["attempts"] == n
+        _expire(jobs_db, unit["unit_id"])
+
+    assert jobqueue.claim("next", lease_s=60) is None
+    p = jobqueue.progress("s")
+    assert (p["failed"], p["leased"], p["pending"]) == (1, 0, 0)
+
+
+def test_expired_lease_is_reclaimed_below_limit(jobs_db):
+    first = jobqueue.claim("crash", lease_s=60)
+    _expire(jobs_db, first["unit_id"])
+    again = jobqueue.claim("other", lease_s=60)
+    assert again["unit_id"] == first["unit_id"] and again["attempts"] == 2
+    assert jobqueue.progress("s")["leased"] == 1
@@ -0,0 +1,185 @@
+"""
+universe.py — 全市场品种列表快照（磁盘缓存，每日刷新）
+文件：
+  data_universe/<market>.parquet — 列 ticker, name
+  data_universe/<market>.json    — 元数据 {fetched_at, count}
+
+  market   来源接口                          ticker 形式
+  ───────  ───────────────────────────────  ──────────────
+  a        ak.stock_zh_a_spot_em            600519
+  hk       ak.stock_hk_main_board_spot_em   0700.HK
+  us       ak.stock_us_spot_em              AAPL（同时刷新 us_codes 前缀映射）
+
+  • get(market)：有快照直接返回（过期则后台刷新，先返回旧快照）；
+    无快照时同步下载一次
+  • 行情表经 spot.download 下载：同一次请求同时写入 spot 行情快照
+  • 列提取全部向量化，不使用 iterrows
+  • 进程内按文件 mtime 缓存，scanner / scheduler / UI 共用
+"""
+
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+import spot
+import us_codes
+
+logger = logging.getLogger(__name__)
+
+_BASE      = os.path.dirname(os.path.abspath(__file__))
+D_UNIVERSE = os.path.join(_BASE, "data_universe")
+
+MARKETS     = ("a", "hk", "us")
+DEFAULT_TTL = 24 * 3600
+
+_mem: Dict[str, Tuple[int, List[Tuple[str, str]]]] = {}   # market → (mtime_ns, rows)
+_refreshing: set = set()
+_lock = threading.Lock()
+
+
+def _path(market: str) -> str:
+    return os.path.join(D_UNIVERSE, f"{market}.parquet")
+
+
+def _load_meta(market: str) -> Dict:
+    try:
+        with open(os.path.join(D_UNIVERSE, f"{market}.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+# ── 远程拉取（向量化列提取）────────────────────────────────────────────
+def _names(df: pd.DataFrame) -> pd.Series:
+    return df["名称"].astype(str).str.strip()
+
+
+def _fetch_a() -> pd.DataFrame:
+    df = spot.download("a")
+    return pd.DataFrame({"ticker": df["代码"].astype(str).str.strip().str.zfill(6),
+                         "name":   _names(df)})
+
+
+def _fetch_hk() -> pd.DataFrame:
+    df = spot.download("hk")
+    code = pd.to_numeric(df["代码"], errors="coerce")
+    out = pd.DataFrame({"code": code, "name": _names(df)}).dropna(subset=["code"])
+    out["ticker"] = out["code"].astype("int64").astype(str).str.zfill(4) + ".HK"
+    return out[["ticker", "name"]]
+
+
+def _fetch_us() -> pd.DataFrame:
+    df = spot.download("us")
+    raw = df["代码"].astype(str)                # 例：105.AAPL
+    us_codes.update_from_spot(raw)
+    parts = raw.str.split(".", n=1, expand=True)
+    ticker = parts[1].fillna(parts[0]) if parts.shape[1] > 1 else parts[0]
+    return pd.DataFrame({"ticker": ticker.str.strip(), "name": _names(df)})
+
+
+_FETCHERS = {"a": _fetch_a, "hk": _fetch_hk, "us": _fetch_us}
+
+
+# ── 快照读写 ─────────────────────────────────────────────────────────
+def refresh(market: str) -> List[Tuple[str, str]]:
+    """同步下载并写入快照；失败返回空列表（旧快照保留）。"""
+    try:
+        df = _FETCHERS[market]()
+        df = df[(df["ticker"] != "") & (df["name"] != "") & (df["name"] != "nan")]
+        df = df.drop_duplicates("ticker").reset_index(drop=True)
+        if df.empty:
+            return []
+        os.makedirs(D_UNIVERSE, exist_ok=True)
+        path = _path(market)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, path)
+        with open(os.path.join(D_UNIVERSE, f"{market}.json"), "w", encoding="utf-8") as f:
+            json.dump({"fetched_at": time.time(), "count": len(df)}, f)
+        return list(zip(df["ticker"], df["name"]))
+    except Exception as e:
+        logger.warning(f"universe.refresh {market}: {e}")
+        return []
+
+
+def load_snapshot(market: str) -> Optional[List[Tuple[str, str]]]:
+    path = _path(market)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    hit = _mem.get(market)
+    if hit is not None and hit[0] == mtime:
+        return hit[1]
+    try:
+        df = pd.read_parquet(path, columns=["ticker", "name"])
+    except Exception:
+        return None
+    rows = list(zip(df["ticker"].astype(str), df["name"].astype(str)))
+    with _lock:
+        _mem[market] = (mtime, rows)
+    return rows
+
+
+def age(market: str) -> Optional[float]:
+    fetched = _load_meta(market).get("fetched_at")
+    return time.time() - float(fetched) if fetched else None
+
+
+def _refresh_background(market: str) -> None:
+    with _lock:
+        if market in _refreshing:
+            return
+        _refreshing.add(market)
+
+    def _run():
+        try:
+            refresh(market)
+        finally:
+            with _lock:
+                _refreshing.discard(market)
+
+    threading.Thread(target=_run, name=f"universe-{market}", daemon=True).start()
+
+
+def get(market: str, max_age: float = DEFAULT_TTL,
+        force: bool = False) -> List[Tuple[str, str]]:
+    """
+    返回 [(ticker, 名称)]。快照过期时后台刷新并先返回旧快照；
+    force=True 或无快照时同步下载。
+    """
+    if market not in _FETCHERS:
+        raise ValueError(f"unknown market: {market}")
+    if not force:
+        rows = load_snapshot(market)
+        if rows is not None:
+            a = age(market)
+            if a is None or a >= max_age:
+                _refresh_background(market)
+            return rows
+    return refresh(market) or load_snapshot(market) or []
+
+
+def refresh_all() -> Dict[str, int]:
+    """同步刷新全部市场（定时任务使用），返回各市场条数。"""
+    return {m: len(refresh(m)) for m in MARKETS}
+
+
+def stats() -> Dict[str, Dict]:
+    return {m: {**_load_meta(m), "age_s": age(m)} for m in MARKETS}
+
+
+def clear() -> bool:
+    try:
+        if os.path.isdir(D_UNIVERSE):
+            shutil.rmtree(D_UNIVERSE)
+        _mem.clear()
+        return True
+    except Exception:
+        return False
@@ -0,0 +1,198 @@
+"""
+us_codes.py — 美股东方财富交易所前缀映射（持久化）
+文件：
+  data_us_codes.json — {"listed_at": 全量列表刷新时间,
+                        "codes":   {"105": "AAPL,MSFT,…", "106": "…", "107": "…"},
+                        "missing": {"XYZ": 记录时间, …}}
+
+  • 导入时加载到内存（按前缀存逗号串，文件小、解析快）
+  • lookup(ticker) → "105.AAPL"；未知返回 None
+  • is_missing(ticker)：东方财富没有该品种 → 直接走 yfinance
+      - 三个前缀都探测无数据时记录（有效期 _MISSING_TTL）
+      - 全量列表较新且不含该品种时同样视为缺失
+  • 超过 _LIST_TTL 未刷新时，首次查询触发后台线程拉取 stock_us_spot_em
+"""
+
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+
+logger = logging.getLogger(__name__)
+
+_BASE = os.path.dirname(os.path.abspath(__file__))
+F_US_CODES = os.path.join(_BASE, "data_us_codes.json")
+
+PREFIXES     = ("105", "106", "107")   # NASDAQ / NYSE / AMEX
+_LIST_TTL    = 24 * 3600               # 全量列表刷新周期
+_MISSING_TTL = 7 * 24 * 3600           # 负缓存有效期
+_SAVE_EVERY  = 30.0                    # 零散写入的落盘间隔（秒）
+
+_codes:   Dict[str, str]   = {}        # TICKER → 前缀
+_missing: Dict[str, float] = {}        # TICKER → 记录时间
+_listed_at = 0.0
+_dirty     = False
+_saved_at  = 0.0
+_lock      = threading.Lock()
+_refreshing = False
+_retry_at   = 0.0                      # 刷新失败后的下次重试时间
+
+
+# ── 持久化 ───────────────────────────────────────────────────────────
+def load() -> None:
+    global _listed_at
+    try:
+        with open(F_US_CODES, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception:
+        return
+    codes = {}
+    for prefix, joined in (data.get("codes") or {}).items():
+        for t in joined.split(","):
+            if t:
+                codes[t] = prefix
+    with _lock:
+        _codes.clear()
+        _codes.update(codes)
+        _missing.clear()
+        _missing.update({t: float(ts) for t, ts in (data.get("missing") or {}).items()})
+        _listed_at = float(data.get("listed_at", 0) or 0)
+
+
+def save() -> bool:
+    global _dirty, _saved_at
+    with _lock:
+        by_prefix: Dict[str, list] = {}
+        for t, p in _codes.items():
+            by_prefix.setdefault(p, []).append(t)
+        now = time.time()
+        data = {
+            "listed_at": _listed_at,
+            "codes":     {p: ",".join(sorted(ts)) for p, ts in by_prefix.items()},
+            "missing":   {t: ts for t, ts in _missing.items() if now - ts < _MISSING_TTL},
+        }
+        _dirty, _saved_at = False, now
+    try:
+        tmp = f"{F_US_CODES}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, F_US_CODES)
+        return True
+    except Exception as e:
+        logger.debug(f"us_codes.save: {e}")
+        return False
+
+
+def _maybe_save() -> None:
+    if _dirty and time.time() - _saved_at >= _SAVE_EVERY:
+        save()
+
+
+# ── 查询 / 记录 ──────────────────────────────────────────────────────
+def lookup(ticker: str) -> Optional[str]:
+    """已知完整代码（如 "105.AAPL"），未知返回 None。"""
+    _refresh_if_stale()
+    t = ticker.upper()
+    prefix = _codes.get(t)
+    return f"{prefix}.{t}" if prefix else None
+
+
+def is_missing(ticker: str) -> bool:
+    t = ticker.upper()
+    if t in _codes:
+        return False
+    ts = _missing.get(t)
+    if ts is not None and time.time() - ts < _MISSING_TTL:
+        return True
+    # 全量列表较新且不含该品种
+    return bool(_codes) and time.time() - _listed_at < _LIST_TTL
+
+
+def record(ticker: str, code: str) -> None:
+    """记录探测成功的完整代码（"106.BABA"）。"""
+    global _dirty
+    prefix = code.split(".", 1)[0]
+    t = ticker.upper()
+    with _lock:
+        if _codes.get(t) == prefix:
+            return
+        _codes[t] = prefix
+        _missing.pop(t, None)
+        _dirty = True
+    _maybe_save()
+
+
+def record_missing(ticker: str) -> None:
+    global _dirty
+    with _lock:
+        _missing[ticker.upper()] = time.time()
+        _dirty = True
+    _maybe_save()
+
+
+def update_from_spot(raw_codes: Iterable[str]) -> int:
+    """用全量列表（"105.AAPL" 形式）整体更新映射，返回条数。"""
+    global _listed_at, _dirty
+    codes = {}
+    for raw in raw_codes:
+        prefix, _, t = str(raw).partition(".")
+        if t and prefix in PREFIXES:
+            codes[t.upper()] = prefix
+    if not codes:
+        return 0
+    with _lock:
+        _codes.clear()
+        _codes.update(codes)
+        for t in codes:
+            _missing.pop(t, None)
+        _listed_at = time.time()
+        _dirty = True
+    save()
+    return len(codes)
+
+
+# ── 后台刷新 ─────────────────────────────────────────────────────────
+def refresh() -> int:
+    """同步拉取 stock_us_spot_em 并更新映射（同时写入 spot 行情快照）。"""
+    try:
+        import spot
+        df = spot.download("us")
+        return update_from_spot(df["代码"].astype(str))
+    except Exception as e:
+        logger.debug(f"us_codes.refresh: {e}")
+        return 0
+
+
+def _refresh_if_stale() -> None:
+    global _refreshing
+    now = time.time()
+    if now - _listed_at < _LIST_TTL or now < _retry_at or _refreshing:
+        return
+    with _lock:
+        if _refreshing:
+            return
+        _refreshing = True
+
+    def _run():
+        global _refreshing, _retry_at
+        try:
+            if refresh() == 0:
+                # 失败时推迟一小时再试，避免每次查询都重新触发
+                _retry_at = time.time() + 3600
+        finally:
+            _refreshing = False
+
+    threading.Thread(target=_run, name="us-codes-refresh", daemon=True).start()
+
+
+def stats() -> Dict:
+    return {"codes": len(_codes), "missing": len(_missing),
+            "listed_at": _listed_at}
+
+
+load()
+atexit.register(lambda: _dirty and save())